@@ -16,10 +16,13 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.8',
+    entry_points={
+        'console_scripts': ['real-estate=real_estate.cli:main', 'real-estate-server=real_estate.server:main'],
+    },
     install_requires=[
         # Add your package's dependencies here
         'plotly',
-        'kaleido',
+        'kaleido>=1.0',
     ],
 )
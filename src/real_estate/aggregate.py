@@ -1,18 +1,28 @@
-import pandas as pd
 import numpy as np
-from IPython.display import display
 
 from real_estate.constants import yearly_months
+from real_estate.mortgage import yearly_balance
 
 
-def format_with_sig_figs(x):
-    if x == 0:
-        return "0"
-    else:
-        return "{:,.2f}".format(round(x, 2 - int(np.floor(np.log10(abs(x))))))
+def contribution_factor(rate, g, months):
+    """
+    Future value after `months` of monthly contributions starting at 1 and growing by g a month,
+    invested at rate a month: sum_k (1+rate)**(months-1-k) * (1+g)**k.
+
+    Evaluated as (1+rate)**(months-1) * n * expm1(n*L)/(n*L) * L/d with d = (g-rate)/(1+rate) and
+    L = log1p(d), which has no pole at any pair of rates (both ratios tend to 1 as their arguments
+    go to 0), unlike ((1+rate)**n - (1+g)**n) / (rate-g).
+    """
+    rate, g, n = np.asarray(rate, dtype=float), np.asarray(g, dtype=float), np.asarray(months, dtype=float)
+    d = (g - rate) / (1 + rate)
+    L = np.log1p(d)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = n * L
+        series = np.where(x == 0, 1., np.expm1(x) / x) * np.where(d == 0, 1., L / d)
+    return (1 + rate)**(n - 1) * n * series
 
 def FV_monthly_contrib(monthly_cont, rate=0.03/12, g=0, num_contrib=360, downsamp=12):
-    FV = monthly_cont * ((1 + rate)**np.arange(1,num_contrib+1) - (1+g)**np.arange(1,num_contrib+1)) / (rate+g)
+    FV = monthly_cont * contribution_factor(rate, g, np.arange(1,num_contrib+1))
     FV = FV[downsamp-1::downsamp]
     return FV
 
@@ -27,6 +37,108 @@ def FV_initial_and_monthly(single_cont, monthly_cont, rate=0.03, num_contrib=360
     FV_monthly = FV_monthly_contrib(monthly_cont, rate, g=g, num_contrib=num_contrib, downsamp=downsamp)
     return FV_single+FV_monthly
 
+def applicable_months(total_months, total_years):
+    """ Months of a phase lasting `total_months` that fall in each year, as a (..., total_years) array """
+    years = np.arange(total_years)
+    return np.clip(np.asarray(total_months)[..., None] - yearly_months*years, 0, yearly_months)
+
+def growth_factors(rate, total_years):
+    """ (1+rate)**year for each year, as a (..., total_years) array """
+    return (1 + np.asarray(rate)[..., None])**np.arange(total_years)
+
+def equity_accounting(cashflow, equity, initial_investment):
+    """ Columns derived from yearly cashflow and equity. Year 0 is measured against the initial investment """
+    initial_investment = np.asarray(initial_investment)[..., None]
+    prev_equity = np.concatenate([np.broadcast_to(initial_investment, equity[..., :1].shape), equity[..., :-1]], axis=-1)
+    equity_gain = equity - prev_equity
+    annual_profit = equity_gain + cashflow
+    cummulative_profit = np.cumsum(annual_profit, axis=-1)
+    return {
+        'Equity Gain': equity_gain,
+        'Annual Profit': annual_profit,
+        'Return on Equity': annual_profit / prev_equity,
+        'Cummulative Profit': cummulative_profit,
+        'Return on Initial Investment': cummulative_profit / initial_investment,
+    }
+
+def realestate_annual_columns(monthly_rent, rent_growth, pre_refi_opex, pre_refi_opex_growth, refi_opex, refi_opex_growth,
+                              home_value, acq_value_growth, after_repair_value, refi_value_growth, rehab_cost,
+                              rehab_months, pre_refi_months, refinance_months,
+                              acq_PI, refi_PI, loan_balance, cash_required, mortgage_payment=None):
+    """
+    Columns of the real estate performance table, computed for every year at once.
+
+    Scalar inputs broadcast over a leading batch shape; the growth factors and loan balance are
+    (..., total_years) arrays. mortgage_payment optionally gives the yearly loan payments as a
+    (..., total_years) array instead of level acq_PI and refi_PI payments. Returns a dict of
+    (..., total_years) arrays keyed by column name.
+    """
+    total_years = loan_balance.shape[-1]
+    years = np.arange(total_years)
+    col = lambda x: np.asarray(x)[..., None]
+
+    rehab_per_year = applicable_months(rehab_months, total_years)
+    rental_per_year = yearly_months - rehab_per_year
+    acq_per_year = applicable_months(refinance_months, total_years)
+    refi_per_year = yearly_months - acq_per_year
+    pre_refi_per_year = applicable_months(pre_refi_months, total_years)
+
+    income = col(monthly_rent) * rent_growth * rental_per_year
+    opex = col(pre_refi_opex) * pre_refi_per_year * pre_refi_opex_growth + col(refi_opex) * refi_per_year * refi_opex_growth
+    if mortgage_payment is None:
+        mortgage_payment = col(acq_PI) * acq_per_year + col(refi_PI) * refi_per_year
+    expenses = opex + mortgage_payment + col(rehab_cost) * rehab_per_year / col(rehab_months)
+    cashflow = income - expenses
+    property_value = ((col(home_value) * acq_value_growth + col(rehab_cost)) * acq_per_year / yearly_months
+                      + col(after_repair_value) * refi_value_growth * refi_per_year / yearly_months)
+    equity = property_value - loan_balance
+
+    shape = np.broadcast_shapes(cashflow.shape, equity.shape)
+    columns = {
+        'Year': np.broadcast_to(years, shape),
+        'Month': np.broadcast_to(years * yearly_months, shape),
+        'Renting Months': np.broadcast_to(rental_per_year, shape),
+        'Total Annual Income': income,
+        'Operating Expenses': opex,
+        'Mortgage Payment': mortgage_payment,
+        'Total Annual Expenses': expenses,
+        'Total Annual Cashflow': cashflow,
+        'Cash on Cash ROI': cashflow / col(cash_required),
+        'Property Value': property_value,
+        'Loan Balance': loan_balance,
+        'Equity': equity,
+    }
+    columns.update(equity_accounting(cashflow, equity, cash_required))
+    return columns
+
+def stocks_annual_columns(external_income, opex, rent_payment, stock_value, loan_balance, downpayment):
+    """
+    Columns of the stocks + rent performance table from (..., total_years) yearly series.
+    Returns a dict of (..., total_years) arrays keyed by column name.
+    """
+    shape = np.broadcast_shapes(external_income.shape, opex.shape, rent_payment.shape, stock_value.shape, loan_balance.shape)
+    stock_income = np.zeros(shape)
+    income = stock_income + external_income
+    expenses = opex + rent_payment
+    cashflow = income - expenses
+    equity = stock_value - loan_balance
+    columns = {
+        'Year': np.broadcast_to(np.arange(shape[-1]), shape),
+        'Stock Annual Income': stock_income,
+        'External Annual Income': np.broadcast_to(external_income, shape),
+        'Total Annual Income': income,
+        'Operating Expenses': np.broadcast_to(opex, shape),
+        'Rent Payment': np.broadcast_to(rent_payment, shape),
+        'Total Annual Expenses': expenses,
+        'Total Annual Cashflow': cashflow,
+        'Cash on Cash ROI': cashflow / np.asarray(downpayment)[..., None],
+        'Stock Value': np.broadcast_to(stock_value, shape),
+        'Loan Balance': np.broadcast_to(loan_balance, shape),
+        'Equity': equity,
+    }
+    columns.update(equity_accounting(cashflow, equity, downpayment))
+    return columns
+
 class YearlySummary:
     def __init__(self, acq, rehab, pre_refi, refi, total_years):
         self.acq = acq
@@ -48,71 +160,42 @@ class YearlySummary:
         self.refi_months = 12 - self.acq_months
         self.pre_refi_months = self.applicable_months_per_year(self.pre_refi.time['total_months'], total_years) #- self.rehab_months
 
-        print(f'\nInitial real estate cash required {self.cash_required}')
-        print(f'Monthly real estate cash required {self.monthly_required}')
+    def __str__(self):
+        return (
+            f'\nInitial real estate cash required {self.cash_required}\n'
+            f'Monthly real estate cash required {self.monthly_required}'
+        )
+
     def calculate_annual_data(self):
-        data = []
-        for year in range(0, self.total_years):
-            annual_data = {}
-            annual_data['Year'] = year
-            annual_data['Month'] = year * yearly_months
-            annual_data['Renting Months'] = self.rental_months[year]
-            annual_data['Total Annual Income'] = self.pre_refi.price['monthly_rent']*(1+self.pre_refi.exponent['yearly_rent_apprec'])**year * annual_data['Renting Months']
-            
-            annual_data['Operating Expenses'] = self.operating_expenses(year)
-            annual_data['Mortgage Payment'] = self.acq.price['monthly_PI'] * self.acq_months[year] + self.refi.price['monthly_PI'] * self.refi_months[year]
-            annual_data['Total Annual Expenses'] = annual_data['Operating Expenses'] + annual_data['Mortgage Payment'] + self.rehab.price['total_cost'] * self.rehab_months[year]/self.rehab.time['total_months']
-            
-            annual_data['Total Annual Cashflow'] = annual_data['Total Annual Income'] - annual_data['Total Annual Expenses']
-            annual_data['Cash on Cash ROI'] = annual_data['Total Annual Cashflow'] / self.cash_required
-            annual_data['Property Value'] = self.property_value(year)
-            
-            annual_data['Loan Balance'] = self.acq.mort.df.iloc[year]['Remaining Balance'] 
-            annual_data['Equity'] = annual_data['Property Value'] - annual_data['Loan Balance']
-
-            if year == 0:
-                equity_gain = annual_data['Equity'] - self.cash_required
-            else:
-                equity_gain = annual_data['Equity'] - data[year-1]['Equity']
-            
-            annual_data['Equity Gain'] = equity_gain
-            annual_data['Annual Profit'] = annual_data['Equity Gain'] + annual_data['Total Annual Cashflow']
-
-            if year == 0:
-                annual_data['Return on Equity'] = annual_data['Annual Profit'] / self.cash_required
-            else:
-                annual_data['Return on Equity'] = annual_data['Annual Profit'] / data[year-1]['Equity']
-
-            annual_data['Cummulative Profit'] = np.sum([d['Annual Profit'] for d in data]) + annual_data['Annual Profit']
-            annual_data['Return on Initial Investment'] = annual_data['Cummulative Profit'] / self.cash_required
-
-            data.append(annual_data)
-
-        return data
+        """ Returns a dict of yearly columns (numpy arrays of length total_years) """
+        return realestate_annual_columns(
+            monthly_rent=self.pre_refi.price['monthly_rent'],
+            rent_growth=growth_factors(self.pre_refi.exponent['yearly_rent_apprec'], self.total_years),
+            pre_refi_opex=self.pre_refi.price['monthly_OpEx'],
+            pre_refi_opex_growth=growth_factors(self.pre_refi.exponent['yearly_opex_inflation'], self.total_years),
+            refi_opex=self.refi.price['monthly_OpEx'],
+            refi_opex_growth=growth_factors(self.refi.exponent['yearly_opex_inflation'], self.total_years),
+            home_value=self.acq.price['home_value'],
+            acq_value_growth=growth_factors(self.acq.exponent['yearly_val_apprec'], self.total_years),
+            after_repair_value=self.refi.price['home_value'],
+            refi_value_growth=growth_factors(self.refi.exponent['yearly_val_apprec'], self.total_years),
+            rehab_cost=self.rehab.price['total_cost'],
+            rehab_months=self.rehab.time['total_months'],
+            pre_refi_months=self.pre_refi.time['total_months'],
+            refinance_months=self.refi.time['total_months'],
+            acq_PI=self.acq.price['monthly_PI'],
+            refi_PI=self.refi.price['monthly_PI'],
+            loan_balance=yearly_balance(self.acq.mort.yearly_interest, self.acq.mort.loan_amount, self.acq.mort.monthly_PI,
+                                        self.total_years, self.acq.mort.num_payments),
+            cash_required=self.cash_required,
+        )
 
     def to_dataframe(self):
-        data = self.calculate_annual_data()
-        columns = data[0].keys()
-        df = pd.DataFrame(data, columns=columns)
-        df.style.set_table_styles([dict(selector="th",props=[('max-width', '50px')])])
-        pretty_df = df.applymap(format_with_sig_figs)
-        print('Real Estate Performance')
-        display(pretty_df.head())
-
-        return df
+        import pandas as pd
+        return pd.DataFrame(self.calculate_annual_data())
     
     def applicable_months_per_year(self, total_months, total_years):
-        rental_months = []
-        for year in range(1, total_years + 1):
-            if total_months >= 12:
-                rental_months.append(12)
-                total_months -= 12
-            elif total_months > 0:
-                rental_months.append(total_months)
-                total_months = 0
-            else:
-                rental_months.append(0)
-        return np.array(rental_months)
+        return applicable_months(total_months, total_years)
     
     def property_value(self, year):
         acq_period_value = (self.acq.price['home_value']*(1+self.acq.exponent['yearly_val_apprec'])**year + self.rehab.price['total_cost'])*self.acq_months[year]/12 
@@ -139,6 +222,7 @@ def stocks_rent_performance(margi, renter, job, total_years=30):
         A pandas DataFrame with columns 'Year' and 'Value' representing the stock value for each year.
     """
 
+    import pandas as pd
     years = np.arange(total_years)
     df = pd.DataFrame(
         {
@@ -183,8 +267,4 @@ def stocks_rent_performance(margi, renter, job, total_years=30):
     df['Cummulative Profit'] = df['Annual Profit'].cumsum()
     df['Return on Initial Investment'] = df['Cummulative Profit'] / margi.price['downpayment']
 
-    pretty_df = df.applymap(format_with_sig_figs)
-    print('Stock Performance')
-    display(pretty_df.head())
-
     return df 
\ No newline at end of file
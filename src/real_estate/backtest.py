@@ -0,0 +1,123 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from real_estate.batch import scenario_arrays
+from real_estate.montecarlo import simulate_paths
+from real_estate.constants import yearly_months
+
+# Historical series read by load_history. Indices are levels whose growth is used; mortgage_rate is
+# the yearly rate of a new 30 year loan
+SERIES = ['home_price', 'rent', 'mortgage_rate', 'stock_total_return']
+# Optional series; without them the drivers they replace keep their property_performance values
+OPTIONAL_SERIES = ['cpi', 'wages']
+
+# Growth drivers of montecarlo.simulate_paths and the index series they are taken from
+DRIVER_SERIES = {
+    'value_appreciation': 'home_price',
+    'rent_appreciation': 'rent',
+    'opex_inflation': 'cpi',
+    'stock_value_appreciation': 'stock_total_return',
+    'yearly_pay_appreciation': 'wages',
+}
+
+
+def load_history(paths, date_column='date'):
+    """
+    Reads historical market series from local CSV files and aligns them on calendar months.
+
+    Args:
+        paths: Path of one CSV holding a column per series, or a dict of series names to paths of
+            CSVs holding the date and that one series (in their only other column).
+        date_column: Name of the date column in every file.
+
+    Returns:
+        A dict holding 'month' (datetime64[M] array) and one float array per series, covering the
+        longest run of consecutive months where every series has a value, so that month i + 12 is
+        always a year after month i. Mortgage rates are monthly averages, indices the last value of
+        each month; rates above 1 are taken to be percentages.
+    """
+    import pandas as pd
+
+    if isinstance(paths, dict):
+        frames = []
+        for name, path in paths.items():
+            df = pd.read_csv(path, parse_dates=[date_column]).set_index(date_column)
+            if df.shape[1] != 1:
+                raise ValueError(f'{path} should hold {date_column} and one value column, found {list(df.columns)}')
+            frames.append(df.iloc[:, 0].rename(name))
+        df = pd.concat(frames, axis=1)
+    else:
+        df = pd.read_csv(paths, parse_dates=[date_column]).set_index(date_column)
+    missing = set(SERIES) - set(df.columns)
+    if missing:
+        raise ValueError(f'Missing historical series: {sorted(missing)}')
+    df = df[[name for name in SERIES + OPTIONAL_SERIES if name in df.columns]].astype(float)
+
+    monthly = df.resample('MS').last()
+    monthly['mortgage_rate'] = df['mortgage_rate'].resample('MS').mean()
+    complete = np.concatenate([[False], monthly.notna().all(axis=1).to_numpy(), [False]])
+    edges = np.flatnonzero(complete[1:] != complete[:-1])
+    if not edges.size:
+        raise ValueError('No month has a value for every historical series')
+    first, end = edges[::2], edges[1::2]
+    longest = np.argmax(end - first)
+    monthly = monthly.iloc[first[longest]:end[longest]]
+    history = {'month': monthly.index.values.astype('datetime64[M]')}
+    history.update({name: monthly[name].to_numpy() for name in monthly.columns})
+    if np.nanmedian(history['mortgage_rate']) > 1:
+        history['mortgage_rate'] = history['mortgage_rate'] / 100
+    return history
+
+def backtest(history, total_years=30, metrics=None, **params):
+    """
+    Evaluates one scenario entered at every possible start month of history, in one vectorized pass.
+
+    The deal itself (prices, rent, costs) is the same at every start; what changes is the market it
+    meets. For a start month, year y of the simulation takes its home price, rent, stock total return
+    and, when present, cpi and wage growth from the 12 months following month 12*y, and the
+    acquisition and refinance loans take the mortgage rate of the months they are made in. The
+    yearly rates of all start months are strided views of the same 12-month growth series
+    (numpy.lib.stride_tricks.sliding_window_view), fed to montecarlo.simulate_paths as one path
+    per start month.
+
+    Args:
+        history: Dict from load_history.
+        total_years: Number of years to simulate. History must cover more than 12*total_years months.
+        metrics: Optional list of columns to keep.
+        params: Scalar keyword parameters of property_performance. The rate parameters replaced by
+            history are ignored.
+
+    Returns:
+        The (n_starts,) start months, and two dicts (real estate, stocks + rent) of
+        (n_starts, total_years) arrays, one row per start month.
+    """
+    p = scenario_arrays(params)
+    if p['purchase_price'].size != 1:
+        raise ValueError('backtest takes a single scenario; use scalar parameters')
+    months = len(history['month'])
+    n_starts = months - yearly_months * total_years
+    if n_starts < 1:
+        raise ValueError(f'History covers {months} months; a {total_years} year backtest needs more than {yearly_months * total_years}')
+    refinance_month = int(p['refinance_months'][0])
+    if refinance_month >= yearly_months * total_years:
+        raise ValueError('refinance_months must fall within the backtest')
+
+    rates = {}
+    for driver, series in DRIVER_SERIES.items():
+        if series in history:
+            rates[driver] = _yearly_windows(history[series], total_years)
+        else:
+            rates[driver] = np.full((n_starts, total_years), p[driver][0])
+    # simulate_paths compounds the stock rate monthly; this reproduces the yearly total return exactly
+    rates['stock_value_appreciation'] = yearly_months * ((1 + rates['stock_value_appreciation'])**(1 / yearly_months) - 1)
+
+    starts = {name: np.broadcast_to(values, n_starts) for name, values in p.items()}
+    starts['acq_yearly_interest'] = history['mortgage_rate'][:n_starts]
+    starts['ref_yearly_interest'] = history['mortgage_rate'][refinance_month:refinance_month + n_starts]
+    realestate, stocks = simulate_paths(starts, rates, metrics)
+    return history['month'][:n_starts], realestate, stocks
+
+def _yearly_windows(index, total_years):
+    """ (n_starts, total_years) growth of index over year y after each start month, as a strided view """
+    growth = index[yearly_months:] / index[:-yearly_months] - 1
+    return sliding_window_view(growth, yearly_months * (total_years - 1) + 1)[:, ::yearly_months]
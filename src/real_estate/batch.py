@@ -0,0 +1,243 @@
+import inspect
+
+import numpy as np
+
+from real_estate.mortgage import monthly_payment, remaining_balance, yearly_balance, first_month_PMI
+from real_estate.aggregate import growth_factors, contribution_factor, realestate_annual_columns, stocks_annual_columns
+from real_estate.loans import calendar
+from real_estate.analysis import compute_performance
+from real_estate.constants import yearly_months
+
+# Keyword parameters of property_performance that describe a scenario, with their defaults
+PARAMETERS = {name: param.default for name, param in inspect.signature(compute_performance).parameters.items()}
+# Acquisition costs that compute_performance leaves at the Acquisition defaults
+MONTHLY_HOA = 0
+MONTHLY_UTILITIES = 200
+
+
+def scenario_grid(**axes):
+    """
+    Cartesian product of parameter axes, flattened so there is one entry per scenario.
+
+    Args:
+        axes: Parameter names of property_performance mapped to the values to sweep.
+
+    Returns:
+        A dict of equal length 1-d arrays that can be passed straight to batch_performance.
+    """
+    unknown = set(axes) - set(PARAMETERS)
+    if unknown:
+        raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+    mesh = np.meshgrid(*[np.atleast_1d(v) for v in axes.values()], indexing='ij')
+    return {name: m.ravel() for name, m in zip(axes, mesh)}
+
+def batch_performance(grid=None, total_years=30, acq_loan=None, refi_loan=None, **params):
+    """
+    Vectorized equivalent of property_performance over many scenarios at once.
+
+    Every keyword parameter of property_performance can be given as a scalar or an array; arrays are
+    broadcast against each other. Parameters that are not given take property_performance's defaults.
+    Nothing is printed or plotted.
+
+    Args:
+        grid: Optional dict of parameter axes, expanded with scenario_grid and broadcast with params.
+        total_years: Number of years to simulate.
+        acq_loan, refi_loan: Optional loans.LoanTerms (ARMs, interest-only periods, extra principal,
+            recasts) replacing the fixed rate acquisition or refinance mortgage; see derive_scenarios.
+        params: Keyword parameters of property_performance.
+
+    Returns:
+        Two dicts (real estate, stocks + rent) keyed by the column names of property_performance's
+        DataFrames. Each value is an (n_scenarios, total_years) array.
+    """
+    if grid is not None:
+        params = {**scenario_grid(**grid), **params}
+    p = scenario_arrays(params)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = derive_scenarios(p, acq_loan, refi_loan)
+        return _realestate(p, d, total_years), _stocks(p, d, total_years)
+
+def scenario_arrays(params):
+    """ Every scenario parameter as a float array, filled in with defaults and broadcast to one shape """
+    unknown = set(params) - set(PARAMETERS)
+    if unknown:
+        raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+    names = list(PARAMETERS)
+    values = np.broadcast_arrays(*[np.asarray(params.get(n, PARAMETERS[n]), dtype=float) for n in names])
+    return {n: np.atleast_1d(v) for n, v in zip(names, values)}
+
+def derive_scenarios(p, acq_loan=None, refi_loan=None):
+    """
+    Per-scenario quantities of every phase of compute_performance (Acquisition, Rehab, PreReFi_Rent,
+    Refinance, Margin and Employment) as arrays; ScenarioBatch labels them with the metadata keys.
+
+    acq_loan and refi_loan are optional loans.LoanTerms for the acquisition and refinance loans, with
+    one row per scenario or one for all. Their schedules are kept as 'acq_schedule' and
+    'refi_schedule'; the monthly P&I becomes the first scheduled payment and the acquisition
+    payoff comes from the schedule, while the acquisition and refinance rates in p only set PMI.
+    """
+    return derive_refinance(p, derive_acquisition(p, acq_loan), refi_loan)
+
+def derive_acquisition(p, acq_loan=None):
+    """
+    The quantities of derive_scenarios that do not depend on the refinance month, rate or loan:
+    acquisition, rehab, the rental expenses and the margin account of the stocks + rent strategy.
+    """
+    d = {}
+    d['acq_loan_fees'] = 0.01 * (p['purchase_price'] - p['downpayment'])
+    d['acq_mortgage'] = p['purchase_price'] - p['downpayment'] + d['acq_loan_fees']
+    d['closing'] = p['purchase_price'] * 0.01
+    d['yearly_taxes'] = np.where(p['yearly_taxes'] == 0, p['purchase_price'] * 0.0111, p['yearly_taxes'])
+    d['monthly_taxes'] = d['yearly_taxes']/yearly_months
+    d['monthly_insurance'] = p['yearly_insurance']/yearly_months
+    d['acq_PI'] = monthly_payment(p['acq_yearly_interest'], d['acq_mortgage'])
+    if acq_loan is not None:
+        d['acq_schedule'] = _schedule(acq_loan, d['acq_mortgage'])
+        d['acq_PI'] = _first_payment(d['acq_schedule'], d['acq_mortgage'].shape)
+    d['monthly_PMI'] = first_month_PMI(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], p['purchase_price'], d['acq_loan_fees'])
+    d['owning_expenses'] = d['monthly_taxes'] + d['monthly_insurance'] + MONTHLY_HOA + MONTHLY_UTILITIES + d['monthly_PMI']
+
+    d['monthly_rehab'] = p['rehab_cost']*p['rehab_months']/yearly_months
+    d['holding_cost'] = (d['acq_PI'] + d['owning_expenses']) * p['rehab_months']
+    d['monthly_total'] = d['monthly_rehab'] + d['owning_expenses'] + d['acq_PI']
+
+    rent = p['monthly_rent_income']
+    d['monthly_vacancy'] = rent*p['vacancy_frac']
+    d['monthly_repairs'] = rent*p['repairs_frac']
+    d['monthly_capex'] = rent*p['capex_frac']
+    d['monthly_OpEx'] = d['monthly_vacancy'] + d['monthly_capex'] + d['owning_expenses'] + d['monthly_repairs']
+    d['pre_refi_expenses'] = d['monthly_OpEx'] + d['acq_PI']
+    d['pre_refi_cashflow'] = rent - d['pre_refi_expenses']
+    d['pre_refi_NOI'] = (d['pre_refi_cashflow'] + d['acq_PI']) * yearly_months
+    d['cash_required'] = p['downpayment'] + p['rehab_cost'] + d['closing']
+
+    d['margin_stock_value'] = p['margin_multiplier'] * d['cash_required']
+    d['margin_amount'] = d['margin_stock_value'] - d['cash_required']
+    d['margin_PI'] = monthly_payment(p['stock_yearly_interest'], d['margin_amount'])
+    return d
+
+def derive_refinance(p, d, refi_loan=None):
+    """
+    Adds the refinance dependent quantities of derive_scenarios to d, the output of
+    derive_acquisition. p may carry extra trailing axes of refinance months, rates or loan
+    fractions, against which d broadcasts.
+    """
+    d = dict(d)
+    rent = p['monthly_rent_income']
+    d['pre_refi_months'] = p['refinance_months'] - p['rehab_months']
+    d['refi_loan_fees'] = 0.01 * (p['refi_loan_frac'] * p['after_repair_value'])
+    d['refi_mortgage'] = p['refi_loan_frac'] * p['after_repair_value'] + d['refi_loan_fees']
+    d['refi_PI'] = monthly_payment(p['ref_yearly_interest'], d['refi_mortgage'])
+    if refi_loan is not None:
+        d['refi_schedule'] = _schedule(refi_loan, d['refi_mortgage'])
+        d['refi_PI'] = _first_payment(d['refi_schedule'], d['refi_mortgage'].shape)
+    d['refi_expenses'] = d['monthly_OpEx'] + d['refi_PI']
+    d['refi_cashflow'] = rent - d['refi_expenses']
+    d['refi_NOI'] = (d['refi_cashflow'] + d['refi_PI']) * yearly_months
+    # cash left from the refinance loan after its fees and paying off the acquisition loan
+    if 'acq_schedule' not in d:
+        d['acq_payoff'] = remaining_balance(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], p['refinance_months'])
+    else:
+        balance = d['acq_schedule']['Remaining Balance']
+        months = np.broadcast_to(p['refinance_months'], d['acq_mortgage'].shape).ravel().astype(int)
+        d['acq_payoff'] = np.where(months > 0, balance[np.arange(len(balance)), np.clip(months - 1, 0, balance.shape[1] - 1)],
+                                   d['acq_mortgage'].ravel()).reshape(d['acq_mortgage'].shape)
+    d['refi_cash_out'] = d['refi_mortgage'] - d['refi_loan_fees'] - d['acq_payoff']
+
+    turnaround_time = p['rehab_months'] + 2 * d['pre_refi_months']
+    d['monthly_required'] = (d['holding_cost'] + d['pre_refi_cashflow']*d['pre_refi_months']
+                             + d['refi_cashflow']*p['refinance_months']) / turnaround_time
+    # what the stocks + rent strategy invests each month
+    d['job_monthly_income'] = d['monthly_required'] - p['monthly_rent_expense']
+    return d
+
+def _schedule(terms, loan_amount):
+    schedule = terms.amortize(loan_amount.ravel())
+    if len(schedule['Payment']) != loan_amount.size:
+        raise ValueError(f'Loan terms for {len(schedule["Payment"])} loans cannot be applied to {loan_amount.size} scenarios')
+    return schedule
+
+def _first_payment(schedule, shape):
+    return (schedule['Principal'][:, 0] + schedule['Interest'][:, 0]).reshape(shape)
+
+def _loan_columns(p, d, total_years):
+    """ Yearly mortgage payments and loan balance when acquisition or refinance LoanTerms are plugged in """
+    shape = d['acq_mortgage'].shape
+    total_months = total_years * yearly_months
+    month = np.arange(total_months)
+    refinance = np.broadcast_to(p['refinance_months'], shape).reshape(-1, 1)
+    if 'acq_schedule' in d:
+        acq = calendar(d['acq_schedule']['Payment'], 0, total_months)
+        balance = calendar(d['acq_schedule']['Remaining Balance'], 0, total_months)[:, yearly_months - 1::yearly_months]
+    else:
+        acq = np.broadcast_to(d['acq_PI'].reshape(-1, 1), (refinance.size, total_months))
+        balance = yearly_balance(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], total_years).reshape(-1, total_years)
+    if 'refi_schedule' in d:
+        refi = calendar(d['refi_schedule']['Payment'], np.ceil(refinance).ravel(), total_months)
+    else:
+        refi = d['refi_PI'].reshape(-1, 1)
+    payment = np.where(month < refinance, acq, refi)
+    yearly = payment.reshape(-1, total_years, yearly_months).sum(axis=-1)
+    return yearly.reshape(shape + (total_years,)), balance.reshape(shape + (total_years,))
+
+def _realestate(p, d, total_years, loan_balance=None):
+    """ Real estate columns; loan_balance optionally replaces the yearly balance of the acquisition loan """
+    opex_growth = growth_factors(p['opex_inflation'], total_years)
+    value_growth = growth_factors(p['value_appreciation'], total_years)
+    mortgage_payment = None
+    if 'acq_schedule' in d or 'refi_schedule' in d:
+        mortgage_payment, acq_balance = _loan_columns(p, d, total_years)
+    else:
+        acq_balance = yearly_balance(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], total_years)
+    loan_balance = acq_balance if loan_balance is None else loan_balance
+    return realestate_annual_columns(
+        monthly_rent=p['monthly_rent_income'],
+        rent_growth=growth_factors(p['rent_appreciation'], total_years),
+        pre_refi_opex=d['monthly_OpEx'],
+        pre_refi_opex_growth=opex_growth,
+        refi_opex=d['monthly_OpEx'],
+        refi_opex_growth=opex_growth,
+        home_value=p['purchase_price'],
+        acq_value_growth=value_growth,
+        after_repair_value=p['after_repair_value'],
+        refi_value_growth=value_growth,
+        rehab_cost=p['rehab_cost'],
+        rehab_months=p['rehab_months'],
+        pre_refi_months=d['pre_refi_months'],
+        refinance_months=p['refinance_months'],
+        acq_PI=d['acq_PI'],
+        refi_PI=d['refi_PI'],
+        loan_balance=loan_balance,
+        cash_required=d['cash_required'],
+        mortgage_payment=mortgage_payment,
+    )
+
+def _stocks(p, d, total_years):
+    col = lambda x: x[..., None]
+    downpayment = d['cash_required']
+    stock_value = d['margin_stock_value']
+    monthly_income = d['job_monthly_income']
+
+    months = yearly_months * np.arange(1, total_years + 1)
+    rate = col(p['stock_value_appreciation'] / yearly_months)
+    g = col(p['yearly_pay_appreciation'] / yearly_months)
+    stock_value = col(stock_value) * (1 + rate)**months + col(monthly_income) * contribution_factor(rate, g, months)
+
+    monthly_opex_growth = 1 + col(p['opex_inflation'] / yearly_months)
+    opex_year_sum = (monthly_opex_growth[..., None]**np.arange(yearly_months)).sum(axis=-1)
+    opex = col(p['renter_monthly_opex']) * monthly_opex_growth**(months - yearly_months) * opex_year_sum
+
+    return stocks_annual_columns(
+        external_income=col(monthly_income) * growth_factors(p['yearly_pay_appreciation'], total_years) * yearly_months,
+        opex=opex,
+        rent_payment=col(p['monthly_rent_expense']) * growth_factors(p['rent_appreciation'], total_years) * yearly_months,
+        stock_value=stock_value,
+        loan_balance=yearly_balance(p['stock_yearly_interest'], d['margin_amount'], d['margin_PI'], total_years),
+        downpayment=downpayment,
+    )
+
+def scenario_dataframe(columns, index):
+    """ DataFrame of one scenario from the columns returned by batch_performance """
+    import pandas as pd
+    return pd.DataFrame({name: values[index] for name, values in columns.items()})
@@ -0,0 +1,238 @@
+"""
+Benchmarks of the hot paths with tracked baselines, plus a differential check of the fast paths
+against golden outputs of the original loop implementation and the single-scenario model.
+
+    python -m real_estate.benchmark                 # compare with the baseline, exit 1 on regression
+    python -m real_estate.benchmark --update        # record a new baseline
+    python -m real_estate.benchmark --quick         # small sizes only
+
+Scalar APIs (one object or DataFrame per scenario) are timed at 1 and 1k calls; the vectorized
+equivalents at 1, 1k and 100k scenarios (monthly_performance, which holds 360 months per scenario,
+at 1, 1k and 10k). Import cases time a fresh interpreter importing a module,
+and the model modules are checked to import without pandas, plotly or IPython.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from real_estate.analysis import compute_performance
+from real_estate.aggregate import stocks_rent_performance
+from real_estate.plots import timeseries_figure
+from real_estate.mortgage import Mortgage, monthly_payment, yearly_balance, clear_schedule_cache
+from real_estate.batch import batch_performance, scenario_arrays, derive_scenarios
+from real_estate.monthly import monthly_performance, downsample
+
+# benchmarks/ at the root of the repository, wherever the command is run from
+BENCHMARKS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'benchmarks'))
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+# Real estate tables of random_scenarios(200, seed=1) from the original YearlySummary.calculate_annual_data
+# loop, before any of it was vectorized
+GOLDEN_REALESTATE = os.path.join(BENCHMARKS_DIR, 'golden_realestate.npz')
+
+# Changes smaller than this are timer noise, whatever the relative threshold
+NOISE_FLOOR = {'seconds': 2e-3, 'peak_mb': 1.}
+
+# Modules that should import with NumPy alone, and the dependencies they must only load when used
+CORE_MODULES = ['real_estate.mortgage', 'real_estate.metadata', 'real_estate.aggregate', 'real_estate.analysis',
+                'real_estate.batch', 'real_estate.monthly', 'real_estate.scenarios']
+HEAVY_DEPENDENCIES = ['pandas', 'plotly', 'IPython', 'kaleido']
+
+
+def random_scenarios(n, seed=0):
+    """ n plausible scenarios around the property_performance defaults """
+    rng = np.random.default_rng(seed)
+    purchase_price = rng.uniform(1e5, 5e5, n)
+    return {
+        'purchase_price': purchase_price,
+        'downpayment': purchase_price * rng.uniform(0.05, 0.3, n),
+        'rehab_cost': rng.uniform(0, 6e4, n),
+        'after_repair_value': purchase_price * rng.uniform(1., 1.4, n),
+        'monthly_rent_income': purchase_price * rng.uniform(0.006, 0.012, n),
+        'acq_yearly_interest': rng.uniform(0.04, 0.08, n),
+        'ref_yearly_interest': rng.uniform(0.04, 0.08, n),
+        'rehab_months': rng.integers(1, 9, n).astype(float),
+        'refinance_months': rng.integers(9, 24, n).astype(float),
+    }
+
+def _scalar(params, i):
+    return {name: float(values[i]) for name, values in params.items()}
+
+def _mortgages(n):
+    p = random_scenarios(n)
+    return [Mortgage(r, L) for r, L in zip(p['acq_yearly_interest'], p['purchase_price'])]
+
+def _models(params, n):
+    return [compute_performance(**_scalar(params, i)) for i in range(n)]
+
+def _cold_import(module):
+    subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+
+def cases(quick=False):
+    """ Dict of case name to (setup, run). setup() builds the inputs, run(inputs) is timed """
+    loop_sizes = [1, 100] if quick else [1, 1000]
+    batch_sizes = [1, 1000] if quick else [1, 1000, 100_000]
+    monthly_sizes = [1, 1000] if quick else [1, 1000, 10_000]
+    out = {}
+    for module in ['real_estate.mortgage', 'real_estate.batch', 'real_estate.analysis', 'real_estate.cli']:
+        out[f'import {module} (cold start)'] = (lambda module=module: module, _cold_import)
+    for n in loop_sizes:
+        out[f'Mortgage construction x{n}'] = (lambda n=n: n, _mortgages)
+        out[f'Mortgage.amortization_df x{n}'] = (lambda n=n: _mortgages(n), lambda ms: [m.amortization_df() for m in ms])
+        out[f'YearlySummary.to_dataframe x{n}'] = (
+            lambda n=n: [m['year_sum'] for _, _, m in _models(random_scenarios(n), n)],
+            lambda sums: [s.to_dataframe() for s in sums])
+        out[f'stocks_rent_performance x{n}'] = (
+            lambda n=n: [(m['margi'], m['renter'], m['job']) for _, _, m in _models(random_scenarios(n), n)],
+            lambda args: [stocks_rent_performance(*a) for a in args])
+        out[f'plot_timeseries (figure) x{n}'] = (
+            lambda n=n: [(r, s) for r, s, _ in _models(random_scenarios(n), n)],
+            lambda dfs: [timeseries_figure(['Total Annual Cashflow', ('Cummulative Value', ('Property Value', 'Stock Value')),
+                                            'Return on Equity', 'Return on Initial Investment'], r, s, df_titles=['a', 'b'])
+                         for r, s in dfs])
+        out[f'property_performance (compute) x{n}'] = (
+            lambda n=n: random_scenarios(n),
+            lambda p: _models(p, len(p['purchase_price'])))
+    for n in batch_sizes:
+        out[f'mortgage closed form batch {n}'] = (
+            lambda n=n: random_scenarios(n),
+            lambda p: yearly_balance(p['acq_yearly_interest'], p['purchase_price'],
+                                     monthly_payment(p['acq_yearly_interest'], p['purchase_price'])))
+        out[f'batch_performance {n}'] = (lambda n=n: random_scenarios(n), lambda p: batch_performance(**p))
+    # (n, 360) arrays per column: 100k scenarios would peak at several GB
+    for n in monthly_sizes:
+        out[f'monthly_performance {n}'] = (lambda n=n: random_scenarios(n), lambda p: monthly_performance(**p))
+    return out
+
+def measure(setup, run, repeat=3, budget=2.):
+    """ Best wall time over up to repeat runs (fewer once budget seconds are spent) and the peak traced memory of one run """
+    inputs = setup()
+    times = []
+    while len(times) < repeat and sum(times) < budget:
+        clear_schedule_cache()
+        start = time.perf_counter()
+        run(inputs)
+        times.append(time.perf_counter() - start)
+    clear_schedule_cache()
+    tracemalloc.start()
+    run(inputs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'peak_mb': peak / 1e6}
+
+def load_golden(path=GOLDEN_REALESTATE):
+    """ Parameters and real estate columns of the golden scenarios, as dicts of arrays """
+    with np.load(path) as golden:
+        params = {key.split(':', 1)[1]: golden[key] for key in golden.files if key.startswith('params:')}
+        columns = {key.split(':', 1)[1]: golden[key] for key in golden.files if key.startswith('realestate:')}
+    return params, columns
+
+def differential_check(n=200, rtol=1e-9, atol=1e-6, golden_path=GOLDEN_REALESTATE):
+    """
+    Compares the real estate tables of batch_performance and compute_performance with the golden
+    outputs of the original loop implementation, and the stocks + rent tables and mortgage schedules
+    of the fast paths with compute_performance, on n random scenarios.
+
+    Returns:
+        A list of failure messages; empty when everything matches.
+    """
+    params, golden = load_golden(golden_path)
+    params = {name: values[:n] for name, values in params.items()}
+    n = len(params['purchase_price'])
+    realestate, stocks = batch_performance(**params)
+    monthly_re, monthly_stocks = monthly_performance(**params)
+    d = derive_scenarios(scenario_arrays(params))
+    yearly_stocks = downsample(monthly_stocks, 12, initial_investment=d['cash_required'])
+    monthly_names = {'Total Annual Income': 'Total Income', 'Total Annual Expenses': 'Total Expenses',
+                     'Total Annual Cashflow': 'Total Cashflow'}
+
+    failures = []
+    def compare(label, fast, reference):
+        if not np.allclose(fast, reference, rtol=rtol, atol=atol, equal_nan=True):
+            failures.append(f'{label}: max abs diff {np.nanmax(np.abs(fast - reference)):.3g}')
+    for i, (ref_re, ref_stocks, models) in enumerate(_models(params, n)):
+        for name, values in golden.items():
+            compare(f'batch_performance realestate {name!r} scenario {i}', realestate[name][i], values[i])
+            compare(f'compute_performance realestate {name!r} scenario {i}', ref_re[name].values, values[i])
+        for name in ref_stocks.columns:
+            compare(f'batch_performance stocks {name!r} scenario {i}', stocks[name][i], ref_stocks[name].values)
+            monthly_name = monthly_names.get(name, name)
+            if monthly_name in yearly_stocks:
+                compare(f'monthly_performance stocks {name!r} scenario {i}', yearly_stocks[monthly_name][i], ref_stocks[name].values)
+        mort = models['acq'].mort
+        groupby = mort.monthly_df.groupby('year')
+        compare(f'Mortgage.df scenario {i}', mort.df.values,
+                np.column_stack([groupby[['Payment', 'Principal', 'Interest', 'Mortgage Insurance']].sum().values,
+                                 groupby['Remaining Balance'].last().values]))
+        if len(failures) > 20:
+            break
+    return failures
+
+def import_check(modules=CORE_MODULES, heavy=HEAVY_DEPENDENCIES):
+    """
+    Imports the modules in a fresh interpreter and lists the heavy dependencies that came with them.
+
+    Returns:
+        A list of failure messages; empty when every heavy dependency stayed unloaded.
+    """
+    code = f'import sys, {", ".join(modules)}; print(*[m for m in {heavy!r} if m in sys.modules])'
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    return [f'importing {", ".join(modules)} loads {name}' for name in loaded]
+
+def run(baseline_path=DEFAULT_BASELINE, update=False, threshold=0.25, quick=False):
+    """ Runs every case, compares it with the baseline and returns the list of regressions """
+    results = {}
+    for name, (setup, fn) in cases(quick).items():
+        results[name] = measure(setup, fn)
+        print(f"{name:45s} {results[name]['seconds']*1e3:10.2f} ms {results[name]['peak_mb']:10.1f} MB", flush=True)
+
+    failures = differential_check()
+    for failure in failures:
+        print('MISMATCH', failure)
+    for failure in import_check():
+        failures.append(failure)
+        print('EAGER IMPORT', failure)
+
+    if update:
+        os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'results': results}, f, indent=1)
+        print(f'Baseline written to {baseline_path}')
+        return failures
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            for key, floor in NOISE_FLOOR.items():
+                old, new = baseline[name][key], result[key]
+                if new > old * (1 + threshold) and new - old > floor:
+                    failures.append(f'{name}: {key} {old:.4g} -> {new:.4g}')
+                    print('REGRESSION', failures[-1])
+    else:
+        print(f'No baseline at {baseline_path}; run with --update to record one')
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--update', action='store_true', help='Record the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative slowdown or memory growth')
+    parser.add_argument('--quick', action='store_true', help='Only the small sizes')
+    args = parser.parse_args(argv)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        failures = run(args.baseline, args.update, args.threshold, args.quick)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
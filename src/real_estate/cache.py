@@ -0,0 +1,146 @@
+import os
+import json
+import pickle
+import numbers
+import hashlib
+import importlib
+
+from real_estate import profiling
+
+# Modules whose code determines the results; editing any of them changes MODEL_VERSION
+MODEL_MODULES = ['real_estate.constants', 'real_estate.mortgage', 'real_estate.metadata', 'real_estate.aggregate',
+                 'real_estate.analysis']
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'real_estate')
+
+_model_version = None
+
+
+def model_version():
+    """ Hash of the source of MODEL_MODULES """
+    global _model_version
+    if _model_version is None:
+        digest = hashlib.sha256()
+        for name in MODEL_MODULES:
+            with open(importlib.import_module(name).__file__, 'rb') as f:
+                digest.update(f.read())
+        _model_version = digest.hexdigest()[:16]
+    return _model_version
+
+def scenario_key(kind, inputs):
+    """
+    Content hash of a dict of inputs. Real numbers, numpy scalars included, are written as exact
+    floats, so equal values give equal keys whatever their type.
+    """
+    canonical = {name: float(value).hex() if isinstance(value, numbers.Real) else repr(value)
+                 for name, value in sorted(inputs.items())}
+    payload = json.dumps([kind, model_version(), canonical], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache():
+    """
+    Content-addressed on-disk cache of model results.
+
+    Results are pickled under the hash of their function, every input (defaults filled in) and the
+    model version, so changing any model module invalidates them without clearing anything by hand;
+    entries of older versions are simply never hit again and age out. When the cache grows past
+    max_bytes the least recently used entries are deleted.
+
+        cache = ResultCache()
+        realestate_df, stocks_df, models = cache.compute_performance(purchase_price=250e3)
+        cache.stats()   # {'hits': ..., 'misses': ..., 'evictions': ..., 'entries': ..., 'bytes': ...}
+
+    Args:
+        path: Cache directory, by default ~/.cache/real_estate.
+        max_bytes: Size above which least recently used entries are evicted.
+    """
+    def __init__(self, path=DEFAULT_DIR, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+        self._sizes = {entry.path: entry.stat().st_size for entry in self._entries()}
+
+    def compute_performance(self, **params):
+        """ Cached analysis.compute_performance """
+        from real_estate.analysis import compute_performance
+        from real_estate.batch import PARAMETERS
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+        return self.get_or_compute('compute_performance', {**PARAMETERS, **params}, lambda: compute_performance(**params))
+
+    def stocks_rent_performance(self, margi, renter, job, total_years=30):
+        """ Cached aggregate.stocks_rent_performance, keyed on the fields of the three model objects """
+        from real_estate.aggregate import stocks_rent_performance
+        inputs = {'total_years': total_years}
+        for name, model in (('margi', margi), ('renter', renter), ('job', job)):
+            for table in ('time', 'price', 'exponent'):
+                inputs.update({f'{name}.{table}.{key}': value for key, value in getattr(model, table).items()})
+        return self.get_or_compute('stocks_rent_performance', inputs, lambda: stocks_rent_performance(margi, renter, job, total_years))
+
+    def get_or_compute(self, kind, inputs, compute):
+        """ The cached result for (kind, inputs), or compute() stored under that key """
+        path = self._path(scenario_key(kind, inputs))
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            # the modification time orders entries for eviction; another process may have evicted it
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+        else:
+            self.hits += 1
+            profiling.count('result cache hits')
+            return result
+
+        self.misses += 1
+        profiling.count('result cache misses')
+        result = compute()
+        self._store(path, result)
+        return result
+
+    def stats(self):
+        """ Hit and miss counts of this object, and the current size of the cache """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._sizes), 'bytes': sum(self._sizes.values())}
+
+    def clear(self):
+        for entry in self._entries():
+            os.remove(entry.path)
+        self._sizes = {}
+
+    def _path(self, key):
+        return os.path.join(self.path, key[:2], key[2:] + '.pkl')
+
+    def _entries(self):
+        for sub in os.scandir(self.path):
+            if sub.is_dir():
+                yield from (entry for entry in os.scandir(sub.path) if entry.name.endswith('.pkl'))
+
+    def _store(self, path, result):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write under a temporary name so concurrent readers never see a partial entry
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._sizes[path] = os.path.getsize(path)
+        if sum(self._sizes.values()) > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """ Deletes least recently used entries until the cache is back under 90% of max_bytes """
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self._sizes = {entry.path: entry.stat().st_size for entry in entries}
+        total = sum(self._sizes.values())
+        for entry in entries:
+            if total <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            total -= self._sizes.pop(entry.path)
+            self.evictions += 1
@@ -0,0 +1,217 @@
+"""
+Streams scenarios through the model as a batch job.
+
+    real-estate listings.csv -o results.parquet
+    cat listings.jsonl | real-estate --input-format jsonl --mode yearly --workers 8 > yearly.csv
+
+Every input row is one scenario. Columns named after property_performance parameters set them
+(others take their defaults); the remaining columns, such as a listing id, are copied to the output.
+Rows are read, evaluated and written batch_size at a time, so memory stays bounded however long
+the input is.
+"""
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from real_estate.batch import batch_performance, PARAMETERS
+
+FORMATS = ['csv', 'jsonl', 'parquet']
+DEFAULT_METRICS = ['Total Annual Cashflow', 'Equity', 'Return on Initial Investment']
+DEFAULT_YEARS = [0, 4, 9, 29]
+
+
+class OutputError(ValueError):
+    """ The output cannot be written as asked: a bad format or path, or a batch that does not fit the first """
+
+
+def read_batches(path, fmt, batch_size):
+    """ DataFrames of up to batch_size input rows from a CSV or JSONL file, or stdin for '-' """
+    import pandas as pd
+    source = sys.stdin if path == '-' else path
+    if fmt == 'csv':
+        return pd.read_csv(source, chunksize=batch_size)
+    elif fmt == 'jsonl':
+        return pd.read_json(source, lines=True, chunksize=batch_size)
+    raise ValueError(f'Cannot read {fmt}; use csv or jsonl')
+
+def evaluate(rows, mode='summary', metrics=DEFAULT_METRICS, years=DEFAULT_YEARS, total_years=30):
+    """
+    Results of one batch of input rows.
+
+    Args:
+        rows: DataFrame of scenarios.
+        mode: 'summary' for one output row per scenario with every metric at every year in years,
+            or 'yearly' for one output row per scenario and year with every column of both tables.
+        metrics: Columns reported in summary mode, for both strategies.
+        years: Years reported in summary mode.
+
+    Returns:
+        A DataFrame starting with the input columns that are not parameters.
+    """
+    import pandas as pd
+    params = {name: rows[name].to_numpy(dtype=float) for name in rows.columns if name in PARAMETERS}
+    n = len(rows)
+    params['purchase_price'] = np.broadcast_to(params.get('purchase_price', PARAMETERS['purchase_price']), n)
+    realestate, stocks = batch_performance(total_years=total_years, **params)
+    passthrough = rows[[name for name in rows.columns if name not in PARAMETERS]].reset_index(drop=True)
+
+    if mode == 'summary':
+        out = {f'{label} {metric} year {year}': table[metric][:, year]
+               for label, table in (('realestate', realestate), ('stocks', stocks))
+               for metric in metrics for year in years}
+        return pd.concat([passthrough, pd.DataFrame(out)], axis=1)
+    elif mode == 'yearly':
+        out = {'scenario': np.repeat(rows.index.to_numpy(), total_years), 'year': realestate['Year'].ravel()}
+        out.update({f'realestate {name}': values.ravel() for name, values in realestate.items() if name != 'Year'})
+        out.update({f'stocks {name}': values.ravel() for name, values in stocks.items() if name != 'Year'})
+        passthrough = passthrough.loc[passthrough.index.repeat(total_years)].reset_index(drop=True)
+        return pd.concat([passthrough, pd.DataFrame(out)], axis=1)
+    raise ValueError(f'Unknown mode {mode}; use summary or yearly')
+
+
+class ResultWriter():
+    """
+    Appends DataFrames to one CSV, JSONL or Parquet file (or stdout for '-'). The first DataFrame
+    fixes the columns and dtypes: later ones get the columns they lack as missing values and are
+    cast to the first dtypes, and an OutputError is raised for new columns or values that do not fit.
+    """
+    def __init__(self, path, fmt):
+        if fmt == 'parquet' and path == '-':
+            raise OutputError('Parquet output needs a file path')
+        if fmt not in FORMATS:
+            raise OutputError(f'Cannot write {fmt}; use one of {FORMATS}')
+        if fmt == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError('Parquet output needs pyarrow: pip install pyarrow') from None
+        self.fmt = fmt
+        self.path = path
+        self.file = None
+        self.parquet = None
+        self.dtypes = None
+
+    def write(self, df):
+        if self.dtypes is None:
+            self.dtypes = df.dtypes
+        else:
+            df = self._conform(df)
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.parquet is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self.parquet = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self.parquet.schema, preserve_index=False)
+            self.parquet.write_table(table)
+            return
+        first = self.file is None
+        if first:
+            self.file = sys.stdout if self.path == '-' else open(self.path, 'w', newline='')
+        if self.fmt == 'csv':
+            df.to_csv(self.file, header=first, index=False)
+        else:
+            df.to_json(self.file, orient='records', lines=True)
+
+    def _conform(self, df):
+        """ df with the columns and dtypes of the first DataFrame written """
+        extra = [name for name in df.columns if name not in self.dtypes.index]
+        if extra:
+            raise OutputError(f'Columns {extra} are not in the first batch written')
+        df = df.reindex(columns=self.dtypes.index)
+        for name, dtype in self.dtypes.items():
+            if df[name].dtype != dtype:
+                try:
+                    df[name] = df[name].astype(dtype)
+                except (TypeError, ValueError):
+                    raise OutputError(f'Column {name!r} cannot be written as {dtype}, its type in the first batch') from None
+        return df
+
+    def close(self):
+        if self.parquet is not None:
+            self.parquet.close()
+        if self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+
+def run(input='-', output='-', input_format=None, output_format=None, mode='summary', metrics=DEFAULT_METRICS,
+        years=DEFAULT_YEARS, total_years=30, batch_size=10_000, workers=1):
+    """
+    Streams scenario rows from input to output through the model.
+
+    Args:
+        workers: Number of worker processes evaluating batches; 1 evaluates in-process. At most two
+            batches per worker are in flight, and results are written in input order.
+
+    Returns:
+        The number of scenarios processed.
+    """
+    input_format = input_format or _format_of(input, 'csv')
+    output_format = output_format or _format_of(output, 'csv')
+    batches = read_batches(input, input_format, batch_size)
+    writer = ResultWriter(output, output_format)
+    kwargs = dict(mode=mode, metrics=metrics, years=years, total_years=total_years)
+    n = 0
+    try:
+        if workers == 1:
+            for rows in batches:
+                writer.write(evaluate(rows, **kwargs))
+                n += len(rows)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = []
+                for rows in batches:
+                    pending.append(pool.submit(evaluate, rows, **kwargs))
+                    n += len(rows)
+                    if len(pending) >= 2 * workers:
+                        writer.write(pending.pop(0).result())
+                for future in pending:
+                    writer.write(future.result())
+    finally:
+        writer.close()
+    return n
+
+def _format_of(path, default):
+    for fmt, suffixes in (('csv', ('.csv',)), ('jsonl', ('.jsonl', '.json', '.ndjson')), ('parquet', ('.parquet', '.pq'))):
+        if path.endswith(suffixes):
+            return fmt
+    return default
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='real-estate', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', default='-', help='Scenario file (CSV or JSONL); - or nothing for stdin')
+    parser.add_argument('-o', '--output', default='-', help='Result file (CSV, JSONL or Parquet); - for stdout')
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'], help='Defaults to the file extension, else csv')
+    parser.add_argument('--output-format', choices=FORMATS, help='Defaults to the file extension, else csv')
+    parser.add_argument('--mode', choices=['summary', 'yearly'], default='summary',
+                        help='One row per scenario with chosen metrics and years, or one row per scenario and year')
+    parser.add_argument('--metrics', default=','.join(DEFAULT_METRICS), help='Comma separated columns for summary mode')
+    parser.add_argument('--years', default=','.join(map(str, DEFAULT_YEARS)), help='Comma separated years for summary mode')
+    parser.add_argument('--total-years', type=int, default=30, help='Years to simulate')
+    parser.add_argument('--batch-size', type=int, default=10_000, help='Scenarios per batch')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes')
+    args = parser.parse_args(argv)
+
+    years = [int(y) for y in args.years.split(',')]
+    if args.mode == 'summary' and max(years) >= args.total_years:
+        parser.error(f'--years must be below --total-years ({args.total_years})')
+    metrics = args.metrics.split(',')
+    realestate, stocks = batch_performance(total_years=1)
+    unknown = [name for name in metrics if name not in realestate or name not in stocks]
+    if args.mode == 'summary' and unknown:
+        parser.error(f'--metrics {unknown} are not columns of both tables: {[name for name in realestate if name in stocks]}')
+
+    import pandas as pd
+    # reader and writer errors are usage errors; errors of the model itself keep their traceback
+    try:
+        n = run(args.input, args.output, args.input_format, args.output_format, args.mode, metrics,
+                years, args.total_years, args.batch_size, args.workers)
+    except (ImportError, OSError, OutputError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        parser.error(str(e))
+    print(f'{n} scenarios', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+import json
+
+import numpy as np
+
+from real_estate.sweep import read_manifest, chunk_params, shard_path
+
+
+class ResultCube():
+    """
+    Memory-mapped (scenario x year x metric) store of performance columns with a parameter index,
+    for sweeps larger than memory.
+
+    A cube is a directory holding:
+        index.json   names of the metrics and parameters, total_years and n_scenarios
+        cube.npy     the results; `data` views them as (n_scenarios, total_years, n_metrics)
+        params.npy   (n_parameters, n_scenarios) parameter values, one contiguous row per parameter
+
+    cube.npy is stored metric by metric, so reading one metric, even for every scenario, only
+    touches that metric's part of the file. Metrics are named 'realestate:<column>' and
+    'stocks:<column>' after the two tables of batch_performance.
+
+        cube = ResultCube('runs/grid')
+        rich = cube.where(downpayment=(None, 50e3))
+        cube.get('Return on Equity', year=10, scenarios=rich)
+    """
+    def __init__(self, path, mode='r'):
+        """ Opens an existing cube; mode 'r+' allows writing """
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+        self.metrics = index['metrics']
+        self.parameters = index['parameters']
+        self.total_years = index['total_years']
+        self.n_scenarios = index['n_scenarios']
+        self._values = np.load(os.path.join(path, 'cube.npy'), mmap_mode=mode)
+        self._params = np.load(os.path.join(path, 'params.npy'), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, path, n_scenarios, parameters, metrics, total_years=30):
+        """
+        Creates an empty cube (filled with nan) to be filled with write.
+
+        Args:
+            path: New directory for the cube.
+            n_scenarios: Number of scenarios.
+            parameters: Names of the parameters to index the scenarios by.
+            metrics: List of metric names, 'realestate:<column>' or 'stocks:<column>'.
+            total_years: Number of years per scenario.
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({'metrics': list(metrics), 'parameters': list(parameters), 'total_years': total_years,
+                       'n_scenarios': n_scenarios}, f)
+        for name, shape in (('cube.npy', (len(metrics), n_scenarios, total_years)), ('params.npy', (len(parameters), n_scenarios))):
+            values = np.lib.format.open_memmap(os.path.join(path, name), mode='w+', dtype=np.float64, shape=shape)
+            values[:] = np.nan
+            values.flush()
+            del values
+        return cls(path, mode='r+')
+
+    def __len__(self):
+        return self.n_scenarios
+
+    @property
+    def data(self):
+        """ The whole cube as a memory-mapped (n_scenarios, total_years, n_metrics) view """
+        return self._values.transpose(1, 2, 0)
+
+    def write(self, start, realestate, stocks, params):
+        """
+        Stores the scenarios start:start+n: their batch_performance columns and their parameters
+        (a dict of scalars or (n,) arrays holding at least the cube's parameters).
+        """
+        stop = start + len(next(iter({**realestate, **stocks}.values())))
+        for i, metric in enumerate(self.metrics):
+            table, name = metric.split(':', 1)
+            values = (realestate if table == 'realestate' else stocks)[name]
+            self._values[i, start:stop] = values[:, :self.total_years]
+        for i, name in enumerate(self.parameters):
+            self._params[i, start:stop] = params[name]
+
+    def flush(self):
+        self._values.flush()
+        self._params.flush()
+
+    def param(self, name, scenarios=slice(None)):
+        """ Values of one parameter for the given scenarios (indices, a boolean mask or a slice) """
+        return np.asarray(self._params[self.parameters.index(name)][scenarios])
+
+    def where(self, chunk_size=1 << 20, **conditions):
+        """
+        Indices of the scenarios whose parameters meet every condition. Only the parameters named
+        are read, chunk_size scenarios at a time.
+
+        Args:
+            conditions: Parameter names mapped to a value (equality), a (low, high) tuple meaning
+                low <= value < high with None for an open end, or a function of an array of values
+                returning a boolean mask.
+        """
+        unknown = set(conditions) - set(self.parameters)
+        if unknown:
+            raise TypeError(f'Unknown cube parameters: {sorted(unknown)}')
+        out = []
+        for start in range(0, self.n_scenarios, chunk_size):
+            stop = min(start + chunk_size, self.n_scenarios)
+            keep = np.ones(stop - start, dtype=bool)
+            for name, condition in conditions.items():
+                keep &= _matches(self.param(name, slice(start, stop)), condition)
+            out.append(start + np.flatnonzero(keep))
+        return np.concatenate(out) if out else np.zeros(0, dtype=int)
+
+    def get(self, metric, year=None, scenarios=slice(None), table='realestate'):
+        """
+        Values of one metric.
+
+        Args:
+            metric: Column name, looked up in `table`, or a full 'table:column' name.
+            year: A year, a list of years or a slice; every year by default.
+            scenarios: Indices (e.g. from where), a boolean mask or a slice; every scenario by default.
+
+        Returns:
+            An in-memory array of shape (n_selected,) for a single year, else (n_selected, n_years).
+        """
+        if ':' not in metric:
+            metric = f'{table}:{metric}'
+        values = self._values[self.metrics.index(metric)]
+        years = slice(None) if year is None else year
+        if isinstance(scenarios, slice):
+            return np.asarray(values[scenarios, years])
+        # index the scenarios first so a list of years is not paired up with them
+        return np.asarray(values[scenarios])[:, years]
+
+def cube_from_sweep(out_dir, path, columns=None):
+    """
+    Copies a finished run_sweep into a ResultCube one shard at a time, so neither the sweep nor the
+    cube has to fit in memory.
+
+    Args:
+        out_dir: Directory of the sweep.
+        path: New directory for the cube.
+        columns: Optional list of column names to keep. Defaults to every column of the sweep.
+    """
+    manifest = read_manifest(out_dir)
+    n_chunks = -(-manifest['n_scenarios'] // manifest['chunk_size'])
+    with np.load(shard_path(out_dir, 0)) as shard:
+        metrics = [key for key in shard.files if columns is None or key.split(':', 1)[1] in columns]
+    parameters = list(manifest['grid']) + list(manifest['params'])
+    cube = ResultCube.create(path, manifest['n_scenarios'], parameters, metrics, manifest['total_years'])
+    for chunk in range(n_chunks):
+        start = chunk * manifest['chunk_size']
+        stop = min(start + manifest['chunk_size'], manifest['n_scenarios'])
+        with np.load(shard_path(out_dir, chunk)) as shard:
+            tables = {'realestate': {}, 'stocks': {}}
+            for metric in metrics:
+                table, name = metric.split(':', 1)
+                tables[table][name] = shard[metric]
+        cube.write(start, tables['realestate'], tables['stocks'], chunk_params(manifest, start, stop))
+    cube.flush()
+    return cube
+
+def _matches(values, condition):
+    if callable(condition):
+        return np.asarray(condition(values), dtype=bool)
+    if isinstance(condition, tuple):
+        low, high = condition
+        keep = np.ones(values.shape, dtype=bool)
+        if low is not None:
+            keep &= values >= low
+        if high is not None:
+            keep &= values < high
+        return keep
+    return values == condition
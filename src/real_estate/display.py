@@ -0,0 +1,115 @@
+import queue
+import asyncio
+import threading
+from pathlib import Path
+from concurrent.futures import Future
+
+import numpy as np
+
+from real_estate import profiling
+
+
+def format_with_sig_figs(x):
+    if x == 0:
+        return "0"
+    else:
+        return "{:,.2f}".format(round(x, 2 - int(np.floor(np.log10(abs(x))))))
+
+def pretty_table(df):
+    """ Copy of df with every value formatted as a string with 3 significant figures """
+    return df.applymap(format_with_sig_figs)
+
+def show_table(df, title='', rows=5):
+    """ Prints a title and displays the first rows of df in pretty format """
+    from IPython.display import display
+    print(title)
+    with profiling.stage('table formatting'):
+        table = pretty_table(df).head(rows)
+    display(table)
+
+def show_figure(fig, dynamic=False):
+    """ Displays a plotly figure interactively, or as a static PNG rendered with kaleido """
+    from IPython.display import display, Image
+    if dynamic:
+        fig.show()
+    else:
+        with profiling.stage('figure export'):
+            image_bytes = fig.to_image(format='png')
+        display(Image(image_bytes))
+
+
+class FigureExporter():
+    """
+    Writes plotly figures to image files from a background thread. One kaleido renderer (a headless
+    browser with `tabs` pages rendering in parallel) is started for the lifetime of the exporter, so
+    the browser start-up is paid once instead of once per figure.
+
+        with FigureExporter(tabs=4) as exporter:
+            for i, fig in enumerate(figures):
+                exporter.submit(fig, f'plots/scenario_{i}.png')
+
+    Args:
+        tabs: Number of figures rendered at the same time.
+        batch_size: Largest number of queued figures handed to the renderer at once.
+        opts: Image options passed to kaleido for every figure (width, height, scale). The format
+            is taken from the file extension.
+    """
+    def __init__(self, tabs=4, batch_size=32, **opts):
+        self.tabs = tabs
+        self.batch_size = batch_size
+        self.opts = opts
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True)
+        self.thread.start()
+
+    def submit(self, fig, path):
+        """ Queues fig for export to path. Returns a Future that is done once the file is written """
+        future = Future()
+        spec = {'fig': fig.to_dict(), 'path': Path(path), 'opts': {'format': Path(path).suffix.lstrip('.') or 'png', **self.opts}}
+        self.queue.put((spec, future))
+        return future
+
+    def close(self):
+        """ Waits for every queued figure to be written and stops the renderer """
+        self.queue.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def _serve(self):
+        import kaleido
+        loop = asyncio.get_running_loop()
+        done = False
+        try:
+            async with kaleido.Kaleido(n=self.tabs) as renderer:
+                while not done:
+                    batch, done = await self._next_batch(loop)
+                    results = await asyncio.gather(*[renderer.write_fig_from_object(spec, cancel_on_error=True)
+                                                     for spec, _ in batch], return_exceptions=True)
+                    for (spec, future), result in zip(batch, results):
+                        if isinstance(result, BaseException):
+                            future.set_exception(result)
+                        else:
+                            future.set_result(spec['path'])
+        except Exception as error:
+            # e.g. no browser to render with: every figure fails, but the queue is still drained so close() returns
+            while not done and (item := await loop.run_in_executor(None, self.queue.get)) is not None:
+                item[1].set_exception(error)
+
+    async def _next_batch(self, loop):
+        """ Waits for at least one figure and takes up to batch_size; done once close() was called """
+        batch = []
+        item = await loop.run_in_executor(None, self.queue.get)
+        while item is not None:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                return batch, False
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
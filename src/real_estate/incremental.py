@@ -0,0 +1,179 @@
+import inspect
+
+import numpy as np
+
+from real_estate.batch import PARAMETERS
+from real_estate.metadata import Acquisition, Rehab, PreReFi_Rent, Refinance, Margin, Renter, Employment, refinance_mortgage
+from real_estate.aggregate import YearlySummary, stocks_rent_performance
+
+
+def _acq(purchase_price, downpayment, acq_yearly_interest, value_appreciation, yearly_taxes, yearly_insurance):
+    return Acquisition(purchase_price=purchase_price, downpayment=downpayment, yearly_interest=acq_yearly_interest,
+                       value_appreciation=value_appreciation, yearly_taxes=yearly_taxes, yearly_insurance=yearly_insurance)
+
+def _acq_PI(acq):
+    return acq.price['monthly_PI']
+
+def _owning_expenses(acq):
+    return acq.price['owning_expenses']
+
+def _rehab(rehab_months, rehab_cost, acq_PI, owning_expenses):
+    return Rehab(rehab_months=rehab_months, total_cost=rehab_cost, monthly_PI=acq_PI, owning_expenses=owning_expenses)
+
+def _pre_refi(monthly_rent_income, vacancy_frac, repairs_frac, capex_frac, refinance_months, rehab_months,
+              acq_PI, rent_appreciation, opex_inflation, owning_expenses):
+    return PreReFi_Rent(monthly_rent=monthly_rent_income, vacancy_frac=vacancy_frac, repairs_frac=repairs_frac,
+                        capex_frac=capex_frac, total_time=refinance_months-rehab_months, monthly_PI=acq_PI,
+                        rent_appreciation=rent_appreciation, opex_inflation=opex_inflation, owning_expenses=owning_expenses)
+
+def _refi_mort(after_repair_value, refi_loan_frac, ref_yearly_interest):
+    return refinance_mortgage(ref_yearly_interest, after_repair_value, refi_loan_frac)
+
+def _refi(monthly_rent_income, after_repair_value, vacancy_frac, repairs_frac, capex_frac, refinance_months,
+          ref_yearly_interest, value_appreciation, rent_appreciation, opex_inflation, owning_expenses, refi_loan_frac, refi_mort):
+    return Refinance(monthly_rent=monthly_rent_income, home_value=after_repair_value, vacancy_frac=vacancy_frac,
+                     repairs_frac=repairs_frac, capex_frac=capex_frac, refinance_months=refinance_months,
+                     yearly_interest=ref_yearly_interest, value_appreciation=value_appreciation,
+                     rent_appreciation=rent_appreciation, opex_inflation=opex_inflation,
+                     owning_expenses=owning_expenses, loan_frac=refi_loan_frac, mort=refi_mort)
+
+def _year_sum(acq, rehab, pre_refi, refi):
+    return YearlySummary(acq, rehab, pre_refi, refi, 30)
+
+def _cash_required(acq, rehab):
+    # as YearlySummary.cash_required, but without depending on the rental phases
+    return acq.price['downpayment'] + rehab.price['total_cost'] + acq.price['closing']
+
+def _monthly_required(year_sum):
+    return year_sum.monthly_required
+
+def _realestate_df(year_sum):
+    return year_sum.to_dataframe()
+
+def _margi(cash_required, margin_multiplier, stock_yearly_interest, stock_value_appreciation):
+    return Margin(purchase_price=margin_multiplier * cash_required, downpayment=cash_required,
+                  yearly_interest=stock_yearly_interest, value_appreciation=stock_value_appreciation)
+
+def _renter(monthly_rent_expense, renter_monthly_opex, rent_appreciation, opex_inflation):
+    return Renter(monthly_rent=monthly_rent_expense, monthly_opex=renter_monthly_opex,
+                  rent_appreciation=rent_appreciation, opex_inflation=opex_inflation)
+
+def _job(monthly_required, monthly_rent_expense, yearly_pay_appreciation):
+    return Employment(monthly_income=monthly_required-monthly_rent_expense, yearly_pay_appreciation=yearly_pay_appreciation)
+
+def _stocks_df(margi, renter, job):
+    return stocks_rent_performance(margi, renter, job)
+
+# Derived quantities of compute_performance. Each is computed from the inputs or derived quantities
+# named by the arguments of its function
+NODES = {
+    'acq': _acq,
+    'acq_PI': _acq_PI,
+    'owning_expenses': _owning_expenses,
+    'rehab': _rehab,
+    'pre_refi': _pre_refi,
+    'refi_mort': _refi_mort,
+    'refi': _refi,
+    'year_sum': _year_sum,
+    'cash_required': _cash_required,
+    'monthly_required': _monthly_required,
+    'realestate_df': _realestate_df,
+    'margi': _margi,
+    'renter': _renter,
+    'job': _job,
+    'stocks_df': _stocks_df,
+}
+DEPENDENCIES = {name: list(inspect.signature(f).parameters) for name, f in NODES.items()}
+
+
+def depends_on(name):
+    """ The scenario parameters a derived quantity depends on, directly or through other quantities """
+    if name in PARAMETERS:
+        return {name}
+    return set().union(*[depends_on(dep) for dep in DEPENDENCIES[name]])
+
+
+class Scenario():
+    """
+    One property_performance scenario that recomputes only what an update affects.
+
+    Derived quantities (the model objects, the scalars linking them and the two performance
+    DataFrames) are computed on first access and kept. Each remembers the version of every input it
+    was computed from; update bumps the versions of the changed parameters, and on the next access
+    a quantity is recomputed only if one of its inputs changed. A recomputed float that comes out
+    equal to its previous value keeps its version, so for example changing the rent rebuilds the
+    rental phases, the YearlySummary and the stocks income but not the acquisition, refinance or
+    margin loans.
+
+        s = Scenario(purchase_price=250e3)
+        realestate_df, stocks_df, models = s.performance()
+        s.update(monthly_rent_income=3.2e3)
+        s['realestate_df']
+    """
+    def __init__(self, **params):
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+        self.params = {**PARAMETERS, **params}
+        self.version = {name: 0 for name in list(PARAMETERS) + list(NODES)}
+        self.values = {}
+        self.seen = {}
+        # quantities already brought up to date since the last update
+        self.fresh = set()
+        self.computed = {name: 0 for name in NODES}
+
+    def update(self, **changes):
+        """ Changes some parameters; dependent quantities are recomputed when next accessed """
+        unknown = set(changes) - set(PARAMETERS)
+        if unknown:
+            raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+        for name, value in changes.items():
+            if not np.array_equal(value, self.params[name]):
+                self.params[name] = value
+                self.version[name] += 1
+                self.fresh.clear()
+        return self
+
+    def __getitem__(self, name):
+        if name in PARAMETERS:
+            return self.params[name]
+        if name not in NODES:
+            raise KeyError(name)
+        if name in self.fresh:
+            return self.values[name]
+        deps = DEPENDENCIES[name]
+        args = [self[dep] for dep in deps]
+        seen = tuple(self.version[dep] for dep in deps)
+        if name in self.values and self.seen[name] == seen:
+            self.fresh.add(name)
+            return self.values[name]
+
+        value = NODES[name](*args)
+        self.computed[name] += 1
+        if not (name in self.values and _same(self.values[name], value)):
+            self.version[name] += 1
+        self.values[name] = value
+        self.seen[name] = seen
+        self.fresh.add(name)
+        return value
+
+    def stale(self):
+        """ Names of the derived quantities that the next access may recompute """
+        out = []
+        for name in NODES:
+            deps = DEPENDENCIES[name]
+            if (name not in self.values or any(dep in out for dep in deps)
+                    or self.seen[name] != tuple(self.version[dep] for dep in deps)):
+                out.append(name)
+        return out
+
+    def performance(self):
+        """ The return value of compute_performance for the current parameters """
+        models = {name: self[name] for name in ('acq', 'rehab', 'pre_refi', 'refi', 'year_sum', 'margi', 'renter', 'job')}
+        return self['realestate_df'], self['stocks_df'], models
+
+def _same(old, new):
+    """ Whether a recomputed value equals the previous one; only numbers are compared """
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return old == new
+    return False
@@ -0,0 +1,141 @@
+import numpy as np
+
+from real_estate.batch import batch_performance, scenario_arrays, derive_scenarios, PARAMETERS
+from real_estate.montecarlo import DEFAULT_VOLATILITY
+from real_estate.constants import yearly_months
+
+# Columns of margin_call_risk that stocks_with_margin_risk adds to the stocks + rent table as they are
+RISK_COLUMNS = ['Margin Call Probability', 'Cumulative Margin Call Probability', 'Wipeout Probability', 'Forced Sales']
+
+
+def margin_call_risk(n_paths=10_000, seed=0, maintenance_margin=0.25, liquidation_margin=None,
+                     volatility=DEFAULT_VOLATILITY['stock_value_appreciation'], percentiles=(5, 50, 95),
+                     total_months=360, monthly=False, **params):
+    """
+    Path-dependent simulation of the margin loan of the stocks + rent strategy for one scenario.
+
+    stocks_rent_performance grows the stocks deterministically and amortizes the margin loan like a
+    mortgage, so leverage never fails. Here the stocks follow n_paths random paths of lognormal
+    monthly returns whose mean is stock_value_appreciation, and the loan behaves like a broker
+    margin loan: interest is added to the balance every month, and whenever equity falls below
+    maintenance_margin of the stock value, stock is sold to repay the loan until equity is back to
+    liquidation_margin of it. A path whose equity reaches zero is wiped out: all its stock is sold
+    and the account closes with whatever debt is left. The monthly contributions are the external
+    income less rent of stocks_rent_performance, stepping up with yearly_pay_appreciation.
+
+    All paths advance together one month at a time with masked array operations on (n_paths,)
+    state, so memory does not grow with total_months.
+
+    Args:
+        n_paths: Number of simulated return paths.
+        seed: Seed of the random generator.
+        maintenance_margin: Fraction of the stock value that equity must stay above.
+        liquidation_margin: Fraction of the stock value that a forced sale restores equity to.
+            Defaults to maintenance_margin, i.e. selling just enough.
+        volatility: Yearly standard deviation of the stock returns.
+        percentiles: Percentiles (0-100) of equity to report.
+        total_months: Number of months to simulate.
+        monthly: Report every month rather than every year.
+        params: Scalar keyword parameters of property_performance.
+
+    Returns:
+        A dict of (n_periods,) arrays, one entry per year (or month):
+            'Year' or 'Month'
+            'Stock Value', 'Loan Balance', 'Equity': means over the paths at the end of the period
+            'Margin Call Probability': fraction of paths with a margin call during the period
+            'Cumulative Margin Call Probability': fraction with at least one margin call so far
+            'Wipeout Probability': fraction of paths wiped out so far
+            'Forced Sales': mean value of stock sold in forced liquidations during the period
+        and 'Equity Percentiles', a (len(percentiles), n_periods) array.
+    """
+    liquidation_margin = maintenance_margin if liquidation_margin is None else liquidation_margin
+    if not 0 < maintenance_margin < 1:
+        raise ValueError(f'maintenance_margin must be between 0 and 1, got {maintenance_margin}')
+    if not maintenance_margin <= liquidation_margin < 1:
+        raise ValueError(f'liquidation_margin must be between maintenance_margin and 1, got {liquidation_margin}')
+    p = scenario_arrays(params)
+    if p['purchase_price'].size != 1:
+        raise ValueError('margin_call_risk takes a single scenario; use scalar parameters')
+    p = {name: values[0] for name, values in p.items()}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = derive_scenarios(p)
+
+    # lognormal monthly growth with mean 1 + stock_value_appreciation/12
+    sigma = volatility / np.sqrt(yearly_months)
+    drift = np.log1p(p['stock_value_appreciation'] / yearly_months) - sigma**2 / 2
+    loan_growth = 1 + p['stock_yearly_interest'] / yearly_months
+    monthly_income = d['job_monthly_income']
+
+    rng = np.random.default_rng(seed)
+    stock = np.full(n_paths, d['margin_stock_value'])
+    loan = stock - d['cash_required']
+    open_ = np.ones(n_paths, dtype=bool)
+    ever_called = np.zeros(n_paths, dtype=bool)
+    called = np.zeros(n_paths, dtype=bool)
+    sold = 0.
+
+    months_per_period = 1 if monthly else yearly_months
+    n_periods = -(-total_months // months_per_period)
+    out = {'Month' if monthly else 'Year': np.arange(n_periods)}
+    names = ['Stock Value', 'Loan Balance', 'Equity', 'Margin Call Probability', 'Cumulative Margin Call Probability',
+             'Wipeout Probability', 'Forced Sales']
+    out.update({name: np.zeros(n_periods) for name in names})
+    out['Equity Percentiles'] = np.zeros((len(percentiles), n_periods))
+
+    for month in range(total_months):
+        contribution = monthly_income * (1 + p['yearly_pay_appreciation'])**(month // yearly_months)
+        stock *= np.exp(drift + sigma * rng.standard_normal(n_paths))
+        loan *= np.where(open_, loan_growth, 1.)
+        stock += np.where(open_, contribution, 0.)
+        # withdrawals beyond the stock value are borrowed
+        shortfall = np.minimum(stock, 0.)
+        stock -= shortfall
+        loan -= shortfall
+
+        equity = stock - loan
+        call = open_ & (equity < maintenance_margin * stock)
+        wipeout = call & (equity <= 0)
+        sale = np.where(wipeout, stock, np.where(call, stock - equity / liquidation_margin, 0.))
+        stock -= sale
+        loan -= sale
+        sold += sale.sum()
+        open_ &= ~wipeout
+        called |= call
+        ever_called |= call
+
+        if month % months_per_period == months_per_period - 1 or month == total_months - 1:
+            period = month // months_per_period
+            equity = stock - loan
+            out['Stock Value'][period] = stock.mean()
+            out['Loan Balance'][period] = loan.mean()
+            out['Equity'][period] = equity.mean()
+            out['Margin Call Probability'][period] = called.mean()
+            out['Cumulative Margin Call Probability'][period] = ever_called.mean()
+            out['Wipeout Probability'][period] = 1 - open_.mean()
+            out['Forced Sales'][period] = sold / n_paths
+            out['Equity Percentiles'][:, period] = np.percentile(equity, percentiles)
+            called[:] = False
+            sold = 0.
+    return out
+
+
+def stocks_with_margin_risk(total_years=30, **kwargs):
+    """
+    The stocks + rent table of batch_performance for one scenario, with the yearly margin call
+    columns of margin_call_risk next to its columns: RISK_COLUMNS, and the simulated mean
+    'Stock Value', 'Loan Balance' and 'Equity' as 'Simulated Stock Value' and so on.
+
+    Args:
+        total_years: Number of years of both the table and the simulation.
+        kwargs: Keyword arguments of margin_call_risk, scenario parameters included.
+
+    Returns:
+        A dict of (total_years,) arrays.
+    """
+    params = {name: value for name, value in kwargs.items() if name in PARAMETERS}
+    _, stocks = batch_performance(total_years=total_years, **params)
+    risk = margin_call_risk(total_months=total_years * yearly_months, **kwargs)
+    columns = {name: values[0] for name, values in stocks.items()}
+    columns.update({name: risk[name] for name in RISK_COLUMNS})
+    columns.update({f'Simulated {name}': risk[name] for name in ('Stock Value', 'Loan Balance', 'Equity')})
+    return columns
@@ -0,0 +1,239 @@
+import numpy as np
+
+from real_estate.mortgage import monthly_payment, remaining_balance
+from real_estate.constants import yearly_months
+
+# Columns of LoanTerms.amortize, each an (n_loans, total_months) array
+SCHEDULE_COLUMNS = ['Payment', 'Principal', 'Extra Principal', 'Interest', 'Remaining Balance']
+
+
+def arm_rates(initial_rate, index_rates, margin, fixed_months=60, adjust_every=12, initial_cap=0.02,
+              periodic_cap=0.02, lifetime_cap=0.05, total_months=360):
+    """
+    Monthly rate schedules of adjustable rate mortgages, e.g. a 5/1 ARM with 2/2/5 caps by default.
+
+    The rate stays at initial_rate for fixed_months, then resets every adjust_every months to the
+    index plus margin, moving at most initial_cap at the first reset and periodic_cap at later
+    ones, and staying between margin and initial_rate + lifetime_cap.
+
+    Args:
+        initial_rate: Yearly starting rate, scalar or (n_loans,).
+        index_rates: Yearly index rate (e.g. SOFR) by month, scalar, (total_months,) or (n_loans, total_months).
+        margin: Yearly margin over the index, scalar or (n_loans,).
+
+    Returns:
+        An (n_loans, total_months) array of yearly rates for LoanTerms.
+    """
+    initial_rate, margin = np.broadcast_arrays(np.atleast_1d(np.asarray(initial_rate, dtype=float)),
+                                               np.atleast_1d(np.asarray(margin, dtype=float)))
+    index_rates = np.broadcast_to(np.asarray(index_rates, dtype=float)[..., None] if np.ndim(index_rates) == 0
+                                  else index_rates, (initial_rate.size, total_months))
+    rates = np.empty((initial_rate.size, total_months))
+    rate = initial_rate.copy()
+    rates[:, :fixed_months] = rate[:, None]
+    for reset, month in enumerate(range(fixed_months, total_months, adjust_every)):
+        cap = initial_cap if reset == 0 else periodic_cap
+        target = index_rates[:, month] + margin
+        rate = np.clip(np.clip(target, rate - cap, rate + cap), margin, initial_rate + lifetime_cap)
+        rates[:, month:month + adjust_every] = rate[:, None]
+    return rates
+
+
+class LoanTerms():
+    """
+    Terms of a batch of heterogeneous loans: rate schedules (fixed or adjustable), terms,
+    interest-only periods, extra principal and recasts, held as padded (n_loans, total_months) arrays.
+    amortize runs them all at once for given loan amounts.
+
+    The payment is level, as for Mortgage, and is re-levelled over the remaining term whenever the
+    rate changes, when an interest-only period ends and in recast months. Extra principal without
+    a recast shortens the loan instead of lowering the payment.
+
+        terms = LoanTerms(arm_rates(0.055, index_rates=0.045, margin=0.0275), io_months=[0, 120])
+        schedule = terms.amortize([250e3, 400e3])
+        schedule['Remaining Balance'][:, 59]
+
+    Args:
+        yearly_interest: Yearly rate, scalar, (n_loans,) or (n_loans, total_months) from arm_rates.
+        term_months: Months over which each loan is repaid, scalar or (n_loans,).
+        io_months: Initial months in which only interest is paid, scalar or (n_loans,).
+        extra_principal: Principal paid on top of the payment each month, scalar, (n_loans,) or
+            (n_loans, total_months).
+        recast_months: Months in which the payment is re-levelled on the balance, as a list of
+            months for every loan or an (n_loans, total_months) boolean mask.
+        total_months: Number of months held; at least the longest term.
+    """
+    def __init__(self, yearly_interest, term_months=360, io_months=0, extra_principal=0., recast_months=None, total_months=360):
+        self.total_months = total_months
+        self.term_months = np.atleast_1d(np.asarray(term_months, dtype=int))
+        if self.term_months.max() > total_months:
+            raise ValueError(f'term_months must be at most total_months ({total_months})')
+        self.io_months = np.atleast_1d(np.asarray(io_months, dtype=int))
+        io, term = np.broadcast_arrays(self.io_months, self.term_months)
+        if np.any((io > 0) & (io >= term)):
+            raise ValueError('io_months must be shorter than term_months')
+        self.yearly_interest = _monthly(yearly_interest, total_months)
+        self.extra_principal = _monthly(extra_principal, total_months)
+        if recast_months is None:
+            self.recast = np.zeros((1, total_months), dtype=bool)
+        elif np.ndim(recast_months) == 2:
+            self.recast = np.asarray(recast_months, dtype=bool)
+        else:
+            self.recast = np.zeros((1, total_months), dtype=bool)
+            self.recast[:, recast_months] = True
+
+    def __len__(self):
+        return max(len(self.term_months), len(self.io_months), len(self.yearly_interest), len(self.extra_principal), len(self.recast))
+
+    def amortize(self, loan_amount):
+        """
+        Monthly schedules of every loan; loan_amount is a scalar or (n_loans,) array and broadcasts
+        with the terms.
+
+        Loans with a constant nonzero rate, no interest-only period, no extra principal and no
+        recast use the closed form of Mortgage; the others are stepped month by month together.
+
+        Returns:
+            A dict of (n_loans, total_months) arrays keyed by SCHEDULE_COLUMNS, with payment number
+            k+1 in column k and zeros once a loan is repaid, and 'Active', the mask of months in
+            which a payment is due.
+        """
+        loan_amount = np.atleast_1d(np.asarray(loan_amount, dtype=float))
+        n = max(len(self), len(loan_amount))
+        shape = (n, self.total_months)
+        amount = np.broadcast_to(loan_amount, n)
+        term = np.broadcast_to(self.term_months, n)
+        io = np.broadcast_to(self.io_months, n)
+        rates = np.broadcast_to(self.yearly_interest, shape)
+        extra = np.broadcast_to(self.extra_principal, shape)
+        recast = np.broadcast_to(self.recast, shape)
+
+        closed = ((io == 0) & (rates[:, 0] != 0) & np.all(rates == rates[:, :1], axis=1) & ~np.any(extra, axis=1)
+                  & ~np.any(recast, axis=1))
+        stepped = ~closed
+        parts = []
+        if closed.any():
+            parts.append((closed, _closed_form(amount[closed], rates[closed, 0], term[closed], self.total_months)))
+        if stepped.any():
+            parts.append((stepped, _step(amount[stepped], rates[stepped], term[stepped], io[stepped], extra[stepped], recast[stepped])))
+        if len(parts) == 1:
+            out = parts[0][1]
+        else:
+            out = {name: np.zeros(shape) for name in SCHEDULE_COLUMNS}
+            for rows, part in parts:
+                for name in SCHEDULE_COLUMNS:
+                    out[name][rows] = part[name]
+        out['Active'] = np.arange(self.total_months) < _payoff_month(out['Remaining Balance'], amount, term)[:, None]
+        return out
+
+def _monthly(values, total_months):
+    values = np.asarray(values, dtype=float)
+    if values.ndim < 2:
+        values = np.atleast_1d(values)[:, None]
+    return np.broadcast_to(values, (len(values), total_months))
+
+def _closed_form(amount, yearly_interest, term, total_months):
+    """ Level payment schedules of Mortgage.amortization_df for plain fixed rate loans """
+    payment_num = np.arange(1, total_months + 1)
+    col = lambda x: x[:, None]
+    monthly_PI = monthly_payment(yearly_interest, amount, term)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = remaining_balance(col(yearly_interest), col(amount), col(monthly_PI), payment_num)
+    due = payment_num <= col(term)
+    balance = np.where(due, balance, 0.)
+    interest = np.where(due, np.concatenate([col(amount), balance[:, :-1]], axis=1) * col(yearly_interest / yearly_months), 0.)
+    principal = np.where(due, col(monthly_PI) - interest, 0.)
+    return {'Payment': principal + interest, 'Principal': principal, 'Extra Principal': np.zeros_like(principal),
+            'Interest': interest, 'Remaining Balance': balance}
+
+def _step(amount, yearly_interest, term, io, extra, recast):
+    """
+    Amortization of loans whose rate, extra principal or interest-only status change over time. Those
+    only change at step boundaries (rate changes, recasts, ends of interest-only periods), and in
+    between every loan pays a level payment or interest only, so the balances of each segment between
+    two boundaries follow a closed form and are computed at once.
+    A repaid loan has zero balance, so its interest, principal and prepayment come out zero.
+    """
+    n, total_months = yearly_interest.shape
+    boundary = np.any(recast, axis=0)
+    boundary[0] = True
+    boundary[1:] |= np.any((yearly_interest[:, 1:] != yearly_interest[:, :-1]) | (extra[:, 1:] != extra[:, :-1]), axis=0)
+    boundary[io[(io > 0) & (io < total_months)]] = True
+    bounds = np.append(np.flatnonzero(boundary), total_months)
+
+    # month-major buffers, so each segment is a contiguous block of rows
+    cols = {name: np.zeros((total_months, n)) for name in SCHEDULE_COLUMNS}
+    balance = amount.copy()
+    payment = np.zeros(n)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        rate, prepay = yearly_interest[:, start], extra[:, start]
+        monthly_rate = rate / yearly_months
+        interest_only = start < io
+        relevel = recast[:, start] | (start == io) | (rate != yearly_interest[:, start - 1]) if start > 0 else np.ones(n, dtype=bool)
+        relevel = np.flatnonzero(relevel & ~interest_only)
+        if relevel.size:
+            payment[relevel] = _level_payment(balance[relevel], monthly_rate[relevel], np.maximum(term[relevel] - start, 1))
+
+        # balances after each month of the segment: the closed form of remaining_balance for a level
+        # payment plus extra principal, straight-line at a zero rate and only the extra principal while
+        # interest-only, then zero from the last payment of the term on
+        k = np.arange(1, stop - start + 1)[:, None]
+        after = cols['Remaining Balance'][start:stop]
+        paid = payment + prepay
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity = paid / monthly_rate
+            np.power(1 + monthly_rate, k, out=after)
+            after *= balance - annuity
+            after += annuity
+        straight = np.flatnonzero((monthly_rate == 0) | interest_only)
+        if straight.size:
+            paid[interest_only] = prepay[interest_only]
+            after[:, straight] = balance[straight] - k * paid[straight]
+        ended = np.flatnonzero(term <= stop)
+        if ended.size:
+            after[:, ended] = np.where(np.arange(start, stop)[:, None] >= term[ended] - 1, 0., after[:, ended])
+        np.maximum(after, 0., out=after)
+
+        before = np.concatenate([balance[None], after[:-1]])
+        interest = np.multiply(before, monthly_rate, out=cols['Interest'][start:stop])
+        principal = np.minimum(payment - interest, before, out=cols['Principal'][start:stop])
+        principal[:, interest_only] = 0.
+        # whatever is left at the end of the term is paid with the last payment
+        last = np.flatnonzero((term > start) & (term <= stop))
+        principal[term[last] - 1 - start, last] = before[term[last] - 1 - start, last]
+        prepaid = cols['Extra Principal'][start:stop]
+        if prepay.any():
+            np.clip(before - principal, 0., prepay, out=prepaid)
+        np.add(interest, principal, out=cols['Payment'][start:stop])
+        cols['Payment'][start:stop] += prepaid
+        balance = after[-1].copy()
+    return {name: values.T for name, values in cols.items()}
+
+def _level_payment(balance, monthly_rate, months):
+    """ Payment repaying balance in equal installments over months; straight-line at a zero rate """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        level = balance * monthly_rate / -np.expm1(-months * np.log1p(monthly_rate))
+    return np.where(monthly_rate > 0, level, balance / months)
+
+def _payoff_month(balance, amount, term):
+    """ Number of payments made on each loan: up to the term or the first month the balance reaches zero """
+    repaid = balance <= 1e-6 * np.maximum(amount, 1)[:, None]
+    first = np.where(repaid.any(axis=1), repaid.argmax(axis=1) + 1, balance.shape[1])
+    return np.minimum(first, term)
+
+def calendar(monthly, start_months, total_months):
+    """
+    Schedule columns shifted onto the calendar: loan i starts at month start_months[i], so calendar
+    month t holds its payment number t - start_months[i] + 1, and zero before the start or after the
+    end of the schedule.
+
+    Args:
+        monthly: (n_loans, schedule_months) column of LoanTerms.amortize.
+        start_months: Scalar or (n_loans,) origination months.
+        total_months: Number of calendar months.
+    """
+    index = np.arange(total_months) - np.asarray(start_months, dtype=int).reshape(-1, 1)
+    index = np.broadcast_to(index, (max(len(index), len(monthly)), total_months))
+    monthly = np.broadcast_to(monthly, (len(index), monthly.shape[1]))
+    valid = (index >= 0) & (index < monthly.shape[1])
+    return np.where(valid, np.take_along_axis(monthly, np.clip(index, 0, monthly.shape[1] - 1), axis=1), 0.)
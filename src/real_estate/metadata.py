@@ -3,7 +3,10 @@ from real_estate.mortgage import Mortgage
 from real_estate.constants import yearly_months
 
 class Acquisition():
-    """ Holds metadata associated with the acquisition phase of a real estate investment. This has a mortgage attribute """
+    """
+    Holds metadata associated with the acquisition phase of a real estate investment. This has a fixed rate
+    mortgage attribute; other loans go through batch_performance(acq_loan=loans.LoanTerms(...)).
+    """
     def __init__(self, purchase_price, downpayment, yearly_interest, value_appreciation, monthly_HOA=0, 
                  yearly_insurance=1250, yearly_taxes=0, monthly_utilities=200):
         self.time = {}
@@ -36,7 +39,7 @@ class Acquisition():
         self.price['monthly_taxes'] = self.price['yearly_taxes']/yearly_months
         self.price['monthly_insurance'] = self.price['yearly_insurance']/yearly_months
         self.mort = Mortgage(self.exponent['yearly_interest'], self.price['mortgage'], home_value=self.price['home_value'], loan_fees=self.price['loan_fees'])
-        self.price['monthly_PMI'] = self.mort.monthly_df.iloc[0]['Mortgage Insurance']
+        self.price['monthly_PMI'] = self.mort.monthly_PMI
         self.price['owning_expenses'] = self.sum_owning_expenses()
         self.price['monthly_PI'] = self.mort.monthly_PI
 
@@ -147,10 +150,20 @@ class PreReFi_Rent():
             f"NOI: ${self.price['NOI']:.2f}"
         )
 
+def refinance_mortgage(yearly_interest, home_value, loan_frac):
+    """ The refinance loan: loan_frac of home_value plus 1% fees, rolled into the loan """
+    mortgage = loan_frac * home_value
+    loan_fees = 0.01 * mortgage
+    return Mortgage(yearly_interest, mortgage + loan_fees, home_value=home_value, loan_fees=loan_fees)
+
 class Refinance():
-    """ Holds metadata associated with the refinance of a real estate investment. This has a mortgage attribute """
+    """
+    Holds metadata associated with the refinance of a real estate investment. This has a mortgage attribute,
+    built from home_value, loan_frac and yearly_interest unless an equal one is passed as mort. It is a fixed
+    rate mortgage; other loans go through batch_performance(refi_loan=loans.LoanTerms(...)).
+    """
     def __init__(self, monthly_rent, home_value, vacancy_frac, repairs_frac, capex_frac, refinance_months, yearly_interest, value_appreciation,
-                 rent_appreciation, opex_inflation, owning_expenses, loan_frac=0.8):
+                 rent_appreciation, opex_inflation, owning_expenses, loan_frac=0.8, mort=None):
         self.time =  {
             'total_months': refinance_months
         }
@@ -170,7 +183,7 @@ class Refinance():
             'yearly_rent_apprec': rent_appreciation,
             'yearly_opex_inflation': opex_inflation,
         }
-        self.mort = None
+        self.mort = mort
         self.derive_properties()
 
     def derive_properties(self):
@@ -178,11 +191,10 @@ class Refinance():
         self.price['monthly_repairs'] = self.price['monthly_rent']*self.price['repairs_frac']
         self.price['monthly_capex'] = self.price['monthly_rent']*self.price['capex_frac']
 
-        self.price['mortgage'] = self.price['loan_frac'] * self.price['home_value']
-        self.price['loan_fees'] = 0.01 * self.price['mortgage']
-        self.price['mortgage'] = self.price['mortgage'] + self.price['loan_fees']
-        
-        self.mort = Mortgage(self.exponent['yearly_interest'], self.price['mortgage'], home_value=self.price['home_value'], loan_fees=self.price['loan_fees'])
+        if self.mort is None:
+            self.mort = refinance_mortgage(self.exponent['yearly_interest'], self.price['home_value'], self.price['loan_frac'])
+        self.price['mortgage'] = self.mort.loan_amount
+        self.price['loan_fees'] = self.mort.loan_fees
         self.price['monthly_PI'] = self.mort.monthly_PI
         # self.price['monthly_PI'] = monthly_PI(self.exponent['yearly_interest'], 30, self.price['mortgage'])
         self.price['monthly_OpEx'] = self.sum_opex()
@@ -0,0 +1,231 @@
+import warnings
+
+import numpy as np
+
+from real_estate.batch import scenario_arrays, derive_scenarios
+from real_estate.mortgage import yearly_balance
+from real_estate.aggregate import contribution_factor, realestate_annual_columns, stocks_annual_columns
+from real_estate.constants import yearly_months
+
+# Growth drivers that are drawn per path and year. Their means are the property_performance parameters
+DRIVERS = ['value_appreciation', 'rent_appreciation', 'opex_inflation', 'stock_value_appreciation', 'yearly_pay_appreciation']
+
+# Yearly standard deviation of each driver
+DEFAULT_VOLATILITY = {
+    'value_appreciation': 0.05,
+    'rent_appreciation': 0.02,
+    'opex_inflation': 0.01,
+    'stock_value_appreciation': 0.16,
+    'yearly_pay_appreciation': 0.02,
+}
+
+# Correlation between the drivers, in DRIVERS order
+DEFAULT_CORRELATION = np.array([
+    [1.0, 0.6, 0.3, 0.1, 0.2],
+    [0.6, 1.0, 0.4, 0.0, 0.3],
+    [0.3, 0.4, 1.0, 0.0, 0.4],
+    [0.1, 0.0, 0.0, 1.0, 0.1],
+    [0.2, 0.3, 0.4, 0.1, 1.0],
+])
+
+DEFAULT_METRICS = ['Equity', 'Total Annual Cashflow', 'Return on Initial Investment']
+
+
+def simulate(n_paths=10_000, seed=0, percentiles=(5, 25, 50, 75, 95), volatility=None, correlation=None,
+             metrics=DEFAULT_METRICS, total_years=30, chunk_size=10_000, bins=4096, **params):
+    """
+    Monte Carlo version of property_performance for one scenario. The growth drivers in DRIVERS are
+    drawn as correlated normal yearly rates around their property_performance values; mortgage and
+    margin rates stay fixed since the loans lock them in at origination.
+
+    Paths are simulated in chunks and reduced to per-year histograms, so memory depends on
+    chunk_size and bins rather than n_paths. This takes two passes over the same seeded draws. The
+    first finds, for every metric and year, the lowest and highest requested percentile of every
+    chunk; the overall percentiles lie between the extremes of these, so the histograms of the second
+    pass only span that range, and paths outside it are counted in an underflow or overflow bin
+    rather than stretching the bins. Percentiles are exact to within 1/bins of that range, however
+    extreme the tails.
+
+    Args:
+        n_paths: Number of simulated paths.
+        seed: Seed of the random generator. Results are reproducible for a given seed and chunk_size.
+        percentiles: Percentiles (0-100) to report.
+        volatility: Dict of yearly standard deviations per driver, updating DEFAULT_VOLATILITY.
+        correlation: (5, 5) correlation matrix of the drivers in DRIVERS order.
+        metrics: Columns of the performance tables to summarize.
+        params: Scalar keyword parameters of property_performance.
+
+    Returns:
+        A dict with 'realestate' and 'stocks' entries. Each maps metric names to a dict holding
+        'mean' (total_years,) and 'bands' (len(percentiles), total_years) arrays.
+    """
+    p = scenario_arrays(params)
+    if p['purchase_price'].size != 1:
+        raise ValueError('simulate takes a single scenario; use scalar parameters')
+
+    def chunks():
+        for rates in draw_rates(p, n_paths, seed, volatility, correlation, total_years, chunk_size):
+            realestate, stocks = simulate_paths(p, rates, metrics)
+            yield {'realestate': realestate, 'stocks': stocks}
+
+    # first pass: mean of every metric per year and the range its percentiles fall in
+    keys = [(strategy, m) for strategy in ('realestate', 'stocks') for m in metrics]
+    lo = {k: np.full(total_years, np.inf) for k in keys}
+    hi = {k: np.full(total_years, -np.inf) for k in keys}
+    total = {k: np.zeros(total_years) for k in keys}
+    count = {k: np.zeros(total_years) for k in keys}
+    extremes = [min(percentiles), max(percentiles)]
+    for result in chunks():
+        for k in keys:
+            x = result[k[0]][k[1]]
+            with warnings.catch_warnings():
+                # all-nan years
+                warnings.simplefilter('ignore', RuntimeWarning)
+                chunk_lo, chunk_hi = np.nanpercentile(x, extremes, axis=0)
+            lo[k] = np.fmin(lo[k], chunk_lo)
+            hi[k] = np.fmax(hi[k], chunk_hi)
+            total[k] += np.nansum(x, axis=0)
+            count[k] += np.sum(~np.isnan(x), axis=0)
+
+    # second pass: histogram every metric per year on that range
+    hists = {k: StreamingQuantiles(lo[k], hi[k], bins) for k in keys}
+    for result in chunks():
+        for k in keys:
+            hists[k].update(result[k[0]][k[1]])
+
+    out = {'realestate': {}, 'stocks': {}}
+    for k in keys:
+        with np.errstate(invalid='ignore'):
+            out[k[0]][k[1]] = {'mean': total[k] / count[k], 'bands': hists[k].quantiles(np.asarray(percentiles) / 100)}
+    return out
+
+def draw_rates(p, n_paths, seed=0, volatility=None, correlation=None, total_years=30, chunk_size=10_000):
+    """
+    The driver rates of simulate, chunk_size paths at a time: dicts of DRIVERS names to
+    (paths, total_years) arrays of correlated normal yearly rates around the values in p.
+    """
+    vol = {**DEFAULT_VOLATILITY, **(volatility or {})}
+    correlation = DEFAULT_CORRELATION if correlation is None else np.asarray(correlation, dtype=float)
+    cholesky = np.linalg.cholesky(correlation)
+    mean = np.array([p[d].item() for d in DRIVERS])
+    std = np.array([vol[d] for d in DRIVERS])
+    n_chunks = -(-n_paths // chunk_size)
+    for chunk, chunk_seed in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+        size = min(chunk_size, n_paths - chunk * chunk_size)
+        z = np.random.default_rng(chunk_seed).standard_normal((size, total_years, len(DRIVERS)))
+        rates = mean + std * (z @ cholesky.T)
+        yield {d: rates[..., i] for i, d in enumerate(DRIVERS)}
+
+def simulate_paths(p, rates, metrics=None):
+    """
+    Real estate and stocks + rent columns for one scenario under per-path yearly driver rates.
+
+    Args:
+        p: Scenario arrays from batch.scenario_arrays, holding a single scenario or one per path.
+        rates: Dict of DRIVERS names to (paths, total_years) arrays of yearly rates.
+        metrics: Optional list of columns to keep.
+
+    Returns:
+        Two dicts (real estate, stocks + rent) of (paths, total_years) arrays.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = derive_scenarios(p)
+        total_years = rates[DRIVERS[0]].shape[-1]
+        opex_growth = _path_growth(1 + rates['opex_inflation'])
+        value_growth = _path_growth(1 + rates['value_appreciation'])
+        rent_growth = _path_growth(1 + rates['rent_appreciation'])
+        realestate = realestate_annual_columns(
+            monthly_rent=p['monthly_rent_income'],
+            rent_growth=rent_growth,
+            pre_refi_opex=d['monthly_OpEx'],
+            pre_refi_opex_growth=opex_growth,
+            refi_opex=d['monthly_OpEx'],
+            refi_opex_growth=opex_growth,
+            home_value=p['purchase_price'],
+            acq_value_growth=value_growth,
+            after_repair_value=p['after_repair_value'],
+            refi_value_growth=value_growth,
+            rehab_cost=p['rehab_cost'],
+            rehab_months=p['rehab_months'],
+            pre_refi_months=d['pre_refi_months'],
+            refinance_months=p['refinance_months'],
+            acq_PI=d['acq_PI'],
+            refi_PI=d['refi_PI'],
+            loan_balance=yearly_balance(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], total_years),
+            cash_required=d['cash_required'],
+        )
+
+        downpayment = d['cash_required']
+        monthly_income = d['job_monthly_income']
+        col = lambda x: x[..., None]
+
+        # Stock value follows the yearly recursion V_y = V_{y-1}(1+r)^12 + c_y F(r, g), where F is
+        # aggregate.contribution_factor over one year. With constant rates this is exactly
+        # FV_initial_and_monthly
+        r = rates['stock_value_appreciation'] / yearly_months
+        g = rates['yearly_pay_appreciation'] / yearly_months
+        stock_growth = np.cumprod((1 + r)**yearly_months, axis=-1)
+        contribution = col(monthly_income) * _path_growth((1 + g)**yearly_months) * contribution_factor(r, g, yearly_months)
+        stock_value = stock_growth * (col(d['margin_stock_value']) + np.cumsum(contribution / stock_growth, axis=-1))
+
+        monthly_opex_growth = 1 + rates['opex_inflation'] / yearly_months
+        opex_year_sum = (monthly_opex_growth[..., None]**np.arange(yearly_months)).sum(axis=-1)
+        stocks = stocks_annual_columns(
+            external_income=col(monthly_income) * _path_growth(1 + rates['yearly_pay_appreciation']) * yearly_months,
+            opex=col(p['renter_monthly_opex']) * _path_growth(monthly_opex_growth**yearly_months) * opex_year_sum,
+            rent_payment=col(p['monthly_rent_expense']) * rent_growth * yearly_months,
+            stock_value=stock_value,
+            loan_balance=yearly_balance(p['stock_yearly_interest'], d['margin_amount'], d['margin_PI'], total_years),
+            downpayment=downpayment,
+        )
+    if metrics is not None:
+        realestate = {m: realestate[m] for m in metrics}
+        stocks = {m: stocks[m] for m in metrics}
+    return realestate, stocks
+
+def _path_growth(yearly_factor):
+    """ Growth at the start of each year from (paths, years) yearly factors; year 0 is 1 """
+    growth = np.ones_like(yearly_factor)
+    np.cumprod(yearly_factor[..., :-1], axis=-1, out=growth[..., 1:])
+    return growth
+
+
+class StreamingQuantiles:
+    """
+    Fixed-range histogram per column, updated one (rows, columns) chunk at a time. Values below lo
+    or above hi are counted in an underflow or overflow bin, so they weigh in the ranks without
+    widening the bins; quantiles falling there are clipped to lo or hi.
+    """
+    def __init__(self, lo, hi, bins=4096):
+        lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+        self.lo = np.nan_to_num(lo)
+        self.span = np.where(hi > lo, hi - lo, 0.)
+        self.width = np.where(hi > lo, hi - lo, 1.)
+        self.bins = bins
+        # bin 0 is the underflow and bin bins + 1 the overflow
+        self.counts = np.zeros((self.lo.size, bins + 2), dtype=np.int64)
+
+    def update(self, x):
+        valid = ~np.isnan(x)
+        with np.errstate(invalid='ignore', over='ignore'):
+            idx = np.floor((np.where(valid, x, 0) - self.lo) / self.width * self.bins) + 1
+        idx = np.clip(np.nan_to_num(idx, posinf=self.bins + 1, neginf=0), 0, self.bins + 1).astype(np.int64)
+        flat = (idx + (self.bins + 2) * np.arange(self.lo.size))[valid]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def quantiles(self, q):
+        """ (len(q), columns) array, interpolating linearly inside a bin """
+        cdf = np.cumsum(self.counts, axis=1)
+        out = np.full((len(q), self.lo.size), np.nan)
+        for j in range(self.lo.size):
+            n = cdf[j, -1]
+            if n == 0:
+                continue
+            # rank q * (n - 1) from 0 as in np.percentile, each value at the middle of its share of its bin
+            target = np.asarray(q) * (n - 1) + 0.5
+            b = np.searchsorted(cdf[j], target, side='left')
+            below = np.where(b > 0, cdf[j, b - 1], 0)
+            frac = np.where(self.counts[j, b] > 0, (target - below) / np.maximum(self.counts[j, b], 1), 0)
+            position = np.clip(b - 1 + np.clip(frac, 0, 1), 0, self.bins)
+            out[:, j] = self.lo[j] + position / self.bins * self.span[j]
+        return out
@@ -0,0 +1,149 @@
+import numpy as np
+
+from real_estate.batch import scenario_arrays, derive_scenarios
+from real_estate.mortgage import balance_after, pmi_months
+from real_estate.aggregate import equity_accounting, growth_factors, contribution_factor
+from real_estate.constants import yearly_months
+
+# Columns that are levels at the end of a month rather than flows during it
+LEVELS = ['Property Value', 'Loan Balance', 'Equity', 'Stock Value']
+
+
+def monthly_performance(total_months=360, **params):
+    """
+    Month by month version of property_performance for many scenarios at once.
+
+    Phases switch at their exact month: rehab runs for rehab_months, the pre-refinance rental
+    period until refinance_months, and the refinance loan replaces the acquisition loan after that.
+    Unlike YearlySummary, which books the pre-refinance operating expenses from month 0 and carries
+    the acquisition PMI and loan balance for the whole horizon, owning expenses are charged in every
+    month, PMI stops at each loan's drop-off month and the loan balance switches to the refinance
+    loan. Rents, expenses and values step up once a year, as in the yearly model.
+
+    The stocks + rent strategy is the same as stocks_rent_performance at monthly resolution;
+    downsampling it to years reproduces that table.
+
+    Args:
+        total_months: Number of months to simulate.
+        params: Keyword parameters of property_performance, scalars or arrays.
+
+    Returns:
+        Two dicts (real estate, stocks + rent) of (n_scenarios, total_months) arrays.
+    """
+    p = scenario_arrays(params)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = derive_scenarios(p)
+        return monthly_realestate(p, d, total_months), _stocks(p, d, total_months)
+
+def downsample(columns, months_per_period=12, edges=None, initial_investment=None):
+    """
+    Reduces monthly columns to periods: flows are summed and levels take their last month.
+
+    Args:
+        columns: Dict of (..., total_months) arrays from monthly_performance.
+        months_per_period: Length of every period, e.g. 12 for years or 3 for quarters.
+        edges: Optional first month of every period, for periods of arbitrary length. Overrides
+            months_per_period.
+        initial_investment: If given, adds the profit and return columns of the yearly tables
+            ('Equity Gain', 'Annual Profit', 'Return on Equity', ...) per period.
+
+    Returns:
+        A dict of (..., n_periods) arrays.
+    """
+    total_months = next(iter(columns.values())).shape[-1]
+    if edges is None:
+        edges = np.arange(0, total_months, months_per_period)
+    edges = np.asarray(edges)
+    ends = np.append(edges[1:], total_months) - 1
+
+    out = {'Month': np.broadcast_to(edges, next(iter(columns.values())).shape[:-1] + edges.shape)}
+    for name, values in columns.items():
+        if name == 'Month':
+            continue
+        if name in LEVELS:
+            out[name] = values[..., ends]
+        else:
+            out[name] = np.add.reduceat(values, edges, axis=-1)
+    if initial_investment is not None:
+        out.update(equity_accounting(out['Total Cashflow'], out['Equity'], initial_investment))
+    return out
+
+def monthly_realestate(p, d, total_months=360):
+    """ Real estate columns of monthly_performance from scenario_arrays and derive_scenarios outputs """
+    col = lambda x: x[..., None]
+    month = np.arange(total_months)
+    year = month // yearly_months
+    rehab = month < col(p['rehab_months'])
+    acquired = month < col(p['refinance_months'])
+    renting = ~rehab
+
+    total_years = year[-1] + 1
+    rent_growth = growth_factors(p['rent_appreciation'], total_years)[..., year]
+    opex_growth = growth_factors(p['opex_inflation'], total_years)[..., year]
+    value_growth = growth_factors(p['value_appreciation'], total_years)[..., year]
+    rent = col(p['monthly_rent_income'])
+
+    # PMI of both loans is kept apart from the other owning expenses so it can stop at its drop-off month
+    holding = col(d['owning_expenses'] - d['monthly_PMI'])
+    rental_opex = rent * col(p['vacancy_frac'] + p['capex_frac'] + p['repairs_frac'])
+    opex = (holding + np.where(renting, rental_opex, 0)) * opex_growth
+
+    acq_pmi_months = pmi_months(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], p['purchase_price'], d['acq_loan_fees'])
+    refi_pmi_months = pmi_months(p['ref_yearly_interest'], d['refi_mortgage'], d['refi_PI'], p['after_repair_value'], d['refi_loan_fees'])
+    months_since_refi = month - col(p['refinance_months'])
+    insurance = np.where(acquired, np.where(month < col(acq_pmi_months), col(d['acq_mortgage']) * 0.01 / yearly_months, 0),
+                         np.where(months_since_refi < col(refi_pmi_months), col(d['refi_mortgage']) * 0.01 / yearly_months, 0))
+
+    mortgage_payment = np.where(acquired, col(d['acq_PI']), col(d['refi_PI']))
+    rehab_cost = np.where(rehab, col(p['rehab_cost'] / p['rehab_months']), 0)
+    income = np.where(renting, rent * rent_growth, 0)
+    expenses = opex + insurance + mortgage_payment + rehab_cost
+    property_value = np.where(acquired, col(p['purchase_price']) * value_growth + col(p['rehab_cost']),
+                              col(p['after_repair_value']) * value_growth)
+    loan_balance = np.where(acquired,
+                            balance_after(col(p['acq_yearly_interest']), col(d['acq_mortgage']), col(d['acq_PI']), month + 1),
+                            balance_after(col(p['ref_yearly_interest']), col(d['refi_mortgage']), col(d['refi_PI']), months_since_refi + 1))
+    cashflow = income - expenses
+    shape = cashflow.shape
+    return {
+        'Month': np.broadcast_to(month, shape),
+        'Total Income': income,
+        'Operating Expenses': opex,
+        'Mortgage Insurance': insurance,
+        'Mortgage Payment': np.broadcast_to(mortgage_payment, shape),
+        'Rehab Cost': np.broadcast_to(rehab_cost, shape),
+        'Total Expenses': expenses,
+        'Total Cashflow': cashflow,
+        'Property Value': property_value,
+        'Loan Balance': loan_balance,
+        'Equity': property_value - loan_balance,
+    }
+
+def _stocks(p, d, total_months):
+    col = lambda x: x[..., None]
+    month = np.arange(total_months)
+    year = month // yearly_months
+    downpayment = d['cash_required']
+    monthly_income = col(d['job_monthly_income'])
+
+    rate = col(p['stock_value_appreciation'] / yearly_months)
+    g = col(p['yearly_pay_appreciation'] / yearly_months)
+    stock_value = (col(d['margin_stock_value']) * (1 + rate)**(month + 1)
+                   + monthly_income * contribution_factor(rate, g, month + 1))
+    total_years = year[-1] + 1
+    income = monthly_income * growth_factors(p['yearly_pay_appreciation'], total_years)[..., year]
+    opex = col(p['renter_monthly_opex']) * (1 + col(p['opex_inflation'] / yearly_months))**month
+    rent = col(p['monthly_rent_expense']) * growth_factors(p['rent_appreciation'], total_years)[..., year]
+    loan_balance = balance_after(col(p['stock_yearly_interest']), col(d['margin_amount']), col(d['margin_PI']), month + 1)
+    shape = stock_value.shape
+    return {
+        'Month': np.broadcast_to(month, shape),
+        'Total Income': np.broadcast_to(income, shape),
+        'Operating Expenses': np.broadcast_to(opex, shape),
+        'Rent Payment': np.broadcast_to(rent, shape),
+        'Total Expenses': opex + rent,
+        'Total Cashflow': income - opex - rent,
+        'Stock Value': stock_value,
+        'Loan Balance': np.broadcast_to(loan_balance, shape),
+        'Equity': stock_value - loan_balance,
+    }
@@ -1,7 +1,88 @@
+from functools import lru_cache
+
 import numpy as np
-import pandas as pd
+
+from real_estate import profiling
+
+
+def monthly_payment(yearly_interest, loan_amount, num_payments=360):
+    """ Level monthly P&I payment. Broadcasts over array inputs """
+    monthly_interest = np.asarray(yearly_interest) / 12
+    growth = np.power(1 + monthly_interest, num_payments)
+    return loan_amount * (monthly_interest * growth) / (growth - 1)
+
+def remaining_balance(yearly_interest, loan_amount, monthly_PI, payment_num):
+    """ Balance left after `payment_num` payments. Broadcasts over array inputs """
+    monthly_interest = np.asarray(yearly_interest) / 12
+    interest_factor = np.power(1 + monthly_interest, payment_num)
+    return loan_amount * interest_factor - (monthly_PI / monthly_interest) * (interest_factor - 1)
+
+def balance_after(yearly_interest, loan_amount, monthly_PI, payment_num, num_payments=360):
+    """ remaining_balance that stays at zero once all num_payments are made """
+    balance = remaining_balance(yearly_interest, loan_amount, monthly_PI, np.minimum(payment_num, num_payments))
+    return np.where(payment_num <= num_payments, balance, 0.)
+
+def yearly_balance(yearly_interest, loan_amount, monthly_PI, total_years=30, num_payments=360):
+    """ Balance at the end of each year as a (..., total_years) array. Zero once the loan is paid off """
+    col = lambda x: np.asarray(x)[..., None]
+    return balance_after(col(yearly_interest), col(loan_amount), col(monthly_PI), 12 * np.arange(1, total_years + 1), num_payments)
+
+def pmi_months(yearly_interest, loan_amount, monthly_PI, home_value, loan_fees, num_payments=360):
+    """
+    Number of payments that carry mortgage insurance, i.e. while the equity implied by the paid
+    principal is below 20% of the home value. Closed form of the cumulative principal in
+    `Mortgage.amortization_df`. Broadcasts over array inputs
+    """
+    monthly_interest = np.asarray(yearly_interest) / 12
+    growth = 1 + monthly_interest
+    # principal paid on payment k is (monthly_PI - monthly_interest*loan_amount) * growth**k
+    first_principal = (monthly_PI - monthly_interest * loan_amount) * growth
+    insured_principal = loan_amount - loan_fees - 0.8 * home_value
+    with np.errstate(divide='ignore', invalid='ignore'):
+        last = np.log1p(np.maximum(insured_principal, 0) * monthly_interest / first_principal) / np.log(growth)
+    return np.clip(np.nan_to_num(np.ceil(last) - 1), 0, num_payments).astype(int)
+
+def first_month_PMI(yearly_interest, loan_amount, monthly_PI, home_value, loan_fees, mort_insur_frac=0.01):
+    """ Mortgage insurance charged on the first payment, matching `Mortgage.amortization_df` """
+    insured = pmi_months(yearly_interest, loan_amount, monthly_PI, home_value, loan_fees) > 0
+    return np.where(insured, loan_amount * mort_insur_frac / 12, 0.)
+
+@lru_cache(maxsize=256)
+def _monthly_schedule(yearly_interest, loan_amount, home_value, mort_insur_frac, loan_fees, total_years):
+    return Mortgage(yearly_interest, loan_amount, mort_insur_frac, home_value, loan_fees, total_years).amortization_df()
+
+@lru_cache(maxsize=256)
+def _yearly_schedule(yearly_interest, loan_amount, home_value, mort_insur_frac, loan_fees, total_years):
+    import pandas as pd
+    mort = Mortgage(yearly_interest, loan_amount, mort_insur_frac, home_value, loan_fees, total_years)
+    df = pd.DataFrame(mort.yearly_aggregates())
+    df.index.name = 'year'
+    return df
+
+def schedule_cache_info():
+    """ Hit/miss statistics of the shared monthly and yearly amortization schedule caches """
+    return {'monthly': _monthly_schedule.cache_info(), 'yearly': _yearly_schedule.cache_info()}
+
+def clear_schedule_cache():
+    _monthly_schedule.cache_clear()
+    _yearly_schedule.cache_clear()
+
+def _cached_schedule(schedule, key):
+    if not profiling.enabled():
+        return schedule(*key)
+    hits = schedule.cache_info().hits
+    with profiling.stage('mortgage schedule'):
+        out = schedule(*key)
+    profiling.count('schedule cache hits' if schedule.cache_info().hits > hits else 'schedule cache misses')
+    return out
+
 
 class Mortgage():
+    """
+    Fixed rate, level payment loan. The amortization schedules (`monthly_df` and the yearly `df`) are
+    only built when accessed and are shared between mortgages with the same terms, so treat them as
+    read-only. `balance_at`, `pmi_months` and `yearly_aggregates` are closed form and build no schedule.
+    """
     def __init__(self, yearly_interest, loan_amount, mort_insur_frac=0.01, home_value=None, loan_fees=None, total_years=30):
         self.yearly_interest = yearly_interest
         self.total_years = total_years
@@ -19,13 +100,43 @@ class Mortgage():
         self.monthly_interest = self.yearly_interest / 12
         self.num_payments = total_years * 12
         self.monthly_PI = self.calc_monthly_PI()
-        self.monthly_df = self.amortization_df()
-        self.df = self.monthly_df.groupby('year')[['Payment', 'Principal', 'Interest', 'Mortgage Insurance']].sum()
-        self.df['Remaining Balance'] = self.monthly_df.groupby('year')['Remaining Balance'].last()
-    
+        self.pmi_months = int(pmi_months(self.yearly_interest, self.loan_amount, self.monthly_PI, self.home_value,
+                                         self.loan_fees, self.num_payments))
+        self.monthly_PMI = self.loan_amount * self.mort_insur_frac / 12 if self.pmi_months > 0 else 0.
+        profiling.count('Mortgage built')
+
+    @property
+    def schedule_key(self):
+        return (self.yearly_interest, self.loan_amount, self.home_value, self.mort_insur_frac, self.loan_fees, self.total_years)
+
+    @property
+    def monthly_df(self):
+        return _cached_schedule(_monthly_schedule, self.schedule_key)
+
+    @property
+    def df(self):
+        return _cached_schedule(_yearly_schedule, self.schedule_key)
+
     def calc_monthly_PI(self):
-        monthly_PI = self.loan_amount * (self.monthly_interest * np.power(1 + self.monthly_interest, self.num_payments)) / (np.power(1 + self.monthly_interest, self.num_payments) - 1)
-        return monthly_PI
+        return monthly_payment(self.yearly_interest, self.loan_amount, self.num_payments)
+
+    def balance_at(self, month):
+        """ Remaining balance after `month` payments (0 once the loan is paid off). Accepts arrays """
+        return balance_after(self.yearly_interest, self.loan_amount, self.monthly_PI, np.asarray(month), self.num_payments)
+
+    def yearly_aggregates(self):
+        """ Closed form of the yearly sums of the amortization schedule, as a dict of arrays """
+        growth = 1 + self.monthly_interest
+        year_start = growth**(12 * np.arange(self.total_years))
+        principal = (self.monthly_PI - self.monthly_interest * self.loan_amount) * year_start * growth * (growth**12 - 1) / self.monthly_interest
+        insurance = self.loan_amount * self.mort_insur_frac / 12 * np.clip(self.pmi_months - 12 * np.arange(self.total_years), 0, 12)
+        return {
+            'Payment': 12 * self.monthly_PI + insurance,
+            'Principal': principal,
+            'Interest': 12 * self.monthly_PI - principal,
+            'Mortgage Insurance': insurance,
+            'Remaining Balance': yearly_balance(self.yearly_interest, self.loan_amount, self.monthly_PI, self.total_years, self.num_payments),
+        }
     
     def amortization_df(self):
 
@@ -48,7 +159,7 @@ class Mortgage():
         principal_payment = self.monthly_PI - interest_payment
 
         # Compute monthly mortgage insurance payment
-        mortgage_insurance_payment = np.where((self.home_value - np.cumsum(principal_payment) - self.downpayment) > 0.8 * self.home_value, self.loan_amount * self.mort_insur_frac / 12, 0)
+        mortgage_insurance_payment = np.where(payment_num <= self.pmi_months, self.loan_amount * self.mort_insur_frac / 12, 0)
         
         # Add mortgage insurance to monthly payment
         total_monthly_payment = self.monthly_PI + mortgage_insurance_payment
@@ -61,6 +172,7 @@ class Mortgage():
             'Mortgage Insurance': mortgage_insurance_payment,
             'Remaining Balance': remaining_balance
         }
+        import pandas as pd
         amortization_schedule = pd.DataFrame(data)
         amortization_schedule['year'] = amortization_schedule.index//12
         return amortization_schedule
\ No newline at end of file
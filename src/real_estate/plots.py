@@ -2,17 +2,27 @@ import numpy as np
 import math
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from IPython.display import display, Image
+
+from real_estate import profiling
+from real_estate.display import show_figure
 
 def plot_timeseries(column_pairs, df1, df2, title='', df_titles=[], colors=['blue', 'red'], dynamic=False, ncols=4):
     """
-    Function to plot pairs of time series on the same axes using Plotly.
+    Function to plot pairs of time series on the same axes using Plotly, and display the figure.
 
     Args:
         column_pairs: A list of tuples or strings. Each tuple represents a pair of column headers.
         df1: A pandas DataFrame containing the first set of time series.
         df2: A pandas DataFrame containing the second set of time series.
+        dynamic: Show an interactive figure instead of a static PNG.
     """
+    with profiling.stage('figure building'):
+        fig = timeseries_figure(column_pairs, df1, df2, title=title, df_titles=df_titles, colors=colors, ncols=ncols)
+    show_figure(fig, dynamic=dynamic)
+    return fig
+
+def timeseries_figure(column_pairs, df1, df2, title='', df_titles=[], colors=['blue', 'red'], ncols=4):
+    """ Builds the figure of plot_timeseries without rendering it """
     n = len(column_pairs)
     cols = ncols if n >= ncols else n
     rows = math.ceil(n / ncols)
@@ -23,14 +33,7 @@ def plot_timeseries(column_pairs, df1, df2, title='', df_titles=[], colors=['blu
         row = math.ceil(i / ncols)
         col = i % ncols if i % ncols != 0 else ncols
 
-        # Check if pair is a single string or a tuple of two strings
-        if isinstance(pair, tuple):
-            label, pair = pair
-            col1, col2 = pair
-        elif isinstance(pair, str):
-            label = col1 = col2 = pair
-        else:
-            raise ValueError('Each item in column_pairs must be either a string or a tuple of two strings.')
+        label, (col1, col2) = _label_and_columns(pair)
 
         # Add traces
         fig.add_trace(go.Scatter(
@@ -53,17 +56,161 @@ def plot_timeseries(column_pairs, df1, df2, title='', df_titles=[], colors=['blu
             marker=dict(color=colors[1])
         ), row=row, col=col)
 
-        if i == 1:
-            fig['layout']['yaxis'].update(title_text=label)
-            fig['layout']['xaxis'].update(title_text='Years')
-        else:
-            fig['layout'][f'yaxis{i}'].update(title_text=label)
-            fig['layout'][f'xaxis{i}'].update(title_text='Years')
+        _label_axes(fig, i, label)
     
     for i in range(1, len(fig['data'])//2):
         fig['data'][2*i]['showlegend']=False
         fig['data'][2*i +1]['showlegend']=False   
 
+    _style(fig, title, rows)
+
+    return fig
+
+def overlay_figure(column_pairs, tables, names=[], colors=['blue', 'red'], max_scenarios=1000, max_points=200,
+                   opacity=0.1, title='', ncols=4, seed=0):
+    """
+    Overlays many scenarios per subplot, e.g. the batch_performance results of a sweep.
+
+    Every table gets one WebGL trace per subplot, with its scenarios joined by gaps, so the figure
+    stays light however many scenarios it shows. Tables with more than max_scenarios scenarios are
+    subsampled and series longer than max_points are decimated (see decimate) before they reach
+    the figure.
+
+    Args:
+        column_pairs: As in plot_timeseries; column names are looked up in each table in turn.
+        tables: List of dicts of (n_scenarios, n_periods) arrays, e.g. the two dicts of batch_performance.
+        names: Legend name of each table.
+        colors: Line color of each table.
+        max_scenarios: Largest number of scenarios drawn per table.
+        max_points: Largest number of points drawn per scenario.
+        opacity: Line opacity; low values show where scenarios concentrate.
+        seed: Seed of the scenario subsample.
+    """
+    n = len(column_pairs)
+    rows = math.ceil(n / ncols)
+    fig = make_subplots(rows=rows, cols=min(n, ncols), horizontal_spacing=0.1)
+    rng = np.random.default_rng(seed)
+    picks = []
+    for table in tables:
+        n_scenarios = len(next(iter(table.values())))
+        picks.append(np.sort(rng.choice(n_scenarios, max_scenarios, replace=False)) if n_scenarios > max_scenarios else slice(None))
+
+    for i, pair in enumerate(column_pairs, start=1):
+        label, columns = _label_and_columns(pair, len(tables))
+        for t, (table, column, pick) in enumerate(zip(tables, columns, picks)):
+            y = np.asarray(table[column], dtype=float)[pick]
+            x, y = decimate(y, max_points)
+            # one polyline per scenario, separated by nan so a single trace draws them all
+            gap = np.full((len(y), 1), np.nan)
+            fig.add_trace(go.Scattergl(
+                x=np.hstack([x, gap]).ravel(),
+                y=np.hstack([y, gap]).ravel(),
+                mode='lines',
+                name=names[t] if t < len(names) else column,
+                showlegend=i == 1,
+                opacity=opacity,
+                line=dict(width=1, color=colors[t % len(colors)]),
+            ), row=math.ceil(i / ncols), col=(i - 1) % ncols + 1)
+        _label_axes(fig, i, label)
+    _style(fig, title, rows)
+    return fig
+
+def fan_figure(column_pairs, tables, names=[], colors=['blue', 'red'], percentiles=(5, 25, 50, 75, 95),
+               precomputed=False, title='', ncols=4):
+    """
+    Percentile fan per subplot: shaded bands between symmetric percentiles and a line at the middle one.
+
+    Args:
+        column_pairs: As in plot_timeseries.
+        tables: List of dicts of (n_scenarios, n_periods) arrays, whose percentiles are taken over
+            the scenarios.
+        names: Legend name of each table.
+        colors: Color of each table.
+        percentiles: Percentiles to draw, in increasing order. Pairs from the outside in become
+            bands; an odd one out in the middle becomes the line.
+        precomputed: The tables already hold (len(percentiles), n_periods) bands, such as the
+            'bands' of montecarlo.simulate.
+    """
+    n = len(column_pairs)
+    rows = math.ceil(n / ncols)
+    fig = make_subplots(rows=rows, cols=min(n, ncols), horizontal_spacing=0.1)
+    k = len(percentiles)
+    for i, pair in enumerate(column_pairs, start=1):
+        label, columns = _label_and_columns(pair, len(tables))
+        row, col = math.ceil(i / ncols), (i - 1) % ncols + 1
+        for t, (table, column) in enumerate(zip(tables, columns)):
+            bands = table[column] if precomputed else percentile_bands(table[column], percentiles)
+            x = np.arange(bands.shape[-1])
+            color = colors[t % len(colors)]
+            name = names[t] if t < len(names) else column
+            for j in range(k // 2):
+                fig.add_trace(go.Scattergl(x=x, y=bands[j], mode='lines', line=dict(width=0, color=color),
+                                           showlegend=False, hoverinfo='skip'), row=row, col=col)
+                # inner bands are drawn over the outer ones, so they come out darker
+                fig.add_trace(go.Scattergl(x=x, y=bands[k - 1 - j], mode='lines', line=dict(width=0, color=color),
+                                           fill='tonexty', fillcolor=color, opacity=0.2,
+                                           name=f'{name} {percentiles[j]}-{percentiles[k - 1 - j]}%',
+                                           showlegend=i == 1), row=row, col=col)
+            if k % 2:
+                fig.add_trace(go.Scattergl(x=x, y=bands[k // 2], mode='lines', line=dict(width=2, color=color),
+                                           name=f'{name} {percentiles[k // 2]}%', showlegend=i == 1), row=row, col=col)
+        _label_axes(fig, i, label)
+    _style(fig, title, rows)
+    return fig
+
+def percentile_bands(values, percentiles=(5, 25, 50, 75, 95)):
+    """ (len(percentiles), n_periods) percentiles over the scenarios of an (n_scenarios, n_periods) array """
+    values = np.asarray(values, dtype=float)
+    # nanpercentile is several times slower, so only pay for it when needed
+    percentile = np.nanpercentile if np.isnan(values).any() else np.percentile
+    return percentile(values, percentiles, axis=0)
+
+def decimate(y, max_points=200):
+    """
+    Min/max decimation of (n_series, n_points) arrays: the points are split into max_points/2
+    buckets and only the lowest and highest point of each bucket are kept, in their original
+    order, so peaks and troughs survive.
+
+    Returns:
+        x, y: (n_series, n_kept) arrays of the kept point indices and values.
+    """
+    y = np.atleast_2d(y)
+    n_series, n_points = y.shape
+    if n_points <= max_points:
+        return np.broadcast_to(np.arange(n_points), y.shape), y
+    buckets = max(max_points // 2, 1)
+    size = -(-n_points // buckets)
+    buckets = -(-n_points // size)
+    padded = np.full((n_series, buckets * size), np.nan)
+    padded[:, :n_points] = y
+    padded = padded.reshape(n_series, buckets, size)
+    missing = np.isnan(padded)
+    low = np.where(missing, np.inf, padded).argmin(axis=-1)
+    high = np.where(missing, -np.inf, padded).argmax(axis=-1)
+    start = size * np.arange(buckets)
+    x = np.stack([np.minimum(low, high), np.maximum(low, high)], axis=-1).reshape(n_series, -1)
+    x = x + np.repeat(start, 2)
+    return x, np.take_along_axis(y, np.minimum(x, n_points - 1), axis=-1)
+
+def _label_and_columns(pair, n_tables=2):
+    """ Subplot label and the column of each table for an item of column_pairs """
+    # Check if pair is a single string or a tuple of a label and column names
+    if isinstance(pair, tuple):
+        label, columns = pair
+        return label, tuple(columns)
+    elif isinstance(pair, str):
+        return pair, (pair,) * n_tables
+    raise ValueError('Each item in column_pairs must be either a string or a tuple of two strings.')
+
+def _label_axes(fig, i, label):
+    if i == 1:
+        fig['layout']['yaxis'].update(title_text=label)
+        fig['layout']['xaxis'].update(title_text='Years')
+    else:
+        fig['layout'][f'yaxis{i}'].update(title_text=label)
+        fig['layout'][f'xaxis{i}'].update(title_text='Years')
+
+def _style(fig, title, rows):
     # Set layout attributes
     fig.update_layout(
         title_text=title,
@@ -83,11 +230,3 @@ def plot_timeseries(column_pairs, df1, df2, title='', df_titles=[], colors=['blu
             x=0.01
         )
     )
-
-
-
-    if dynamic:
-        fig.show()
-    else:
-        image_bytes = fig.to_image(format='png')
-        display(Image(image_bytes))
\ No newline at end of file
@@ -0,0 +1,129 @@
+import numpy as np
+
+from real_estate.batch import scenario_arrays, derive_scenarios, PARAMETERS
+from real_estate.monthly import monthly_realestate
+
+
+class Portfolio():
+    """
+    Many BRRRR properties bought at different months, placed on one shared monthly calendar.
+
+    Properties are stored column-wise: one array per property_performance parameter plus the
+    purchase month, so the whole portfolio is evaluated with a single monthly_performance call.
+    """
+    def __init__(self, total_months=360):
+        self.total_months = total_months
+        self.start_month = np.zeros(0, dtype=int)
+        self.params = {}
+
+    def __len__(self):
+        return len(self.start_month)
+
+    def add(self, start_month=0, **params):
+        """ Adds properties bought at start_month. Parameters may be scalars or equal length arrays """
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+        start_month, *values = np.broadcast_arrays(np.asarray(start_month, dtype=int), *params.values())
+        start_month = np.atleast_1d(start_month)
+        values = dict(zip(params, values))
+        # parameters first given now are left as nan (meaning default) for the earlier properties
+        for name in set(self.params) | set(values):
+            old = self.params.get(name, np.full(len(self), np.nan))
+            new = np.broadcast_to(np.asarray(values.get(name, np.nan), dtype=float), start_month.shape)
+            self.params[name] = np.concatenate([old, new])
+        self.start_month = np.concatenate([self.start_month, start_month])
+        return self
+
+    def scenario_params(self):
+        """ Parameters of every property, with property_performance defaults where one was not given """
+        return {name: np.where(np.isnan(self.params[name]), default, self.params[name]) if name in self.params
+                else np.full(len(self), default) for name, default in PARAMETERS.items()}
+
+    def repeat(self, initial_cash, first_month=0, max_doors=10_000, **params):
+        """
+        The repeat part of BRRRR: buys copies of one property whenever initial_cash plus the
+        refinance cash-out of earlier copies covers its cash required, until the calendar ends.
+
+        When the cash-out exceeds the cash required, every copy pays for more than one new one and
+        the number of doors grows exponentially, so the purchases stop at max_doors with a ValueError.
+        params describe that one property, so they must be scalars.
+        """
+        arrays = sorted(name for name, value in params.items() if np.ndim(value) > 0)
+        if arrays:
+            raise ValueError(f'repeat takes scalar parameters for one property; got arrays for {arrays}')
+        p = scenario_arrays(params)
+        d = derive_scenarios(p)
+        cash_required = d['cash_required'][0]
+        refinance_month = int(p['refinance_months'][0])
+        cash_out = d['refi_cash_out'][0]
+        if cash_required <= 0 or (cash_out <= 0 and initial_cash < cash_required):
+            raise ValueError('Property needs no cash, or cannot be afforded and returns no cash to repeat')
+
+        inflow = np.zeros(self.total_months + refinance_month + 1)
+        inflow[first_month] = initial_cash
+        pool = 0.
+        bought = np.zeros(self.total_months, dtype=np.int64)
+        for month in range(first_month, self.total_months):
+            pool += inflow[month]
+            # as many copies as the pool covers, at once
+            bought[month] = pool // cash_required
+            if bought.sum() > max_doors:
+                raise ValueError(f'Repeating reaches more than max_doors={max_doors} doors by month {month}; '
+                                 'the cash-out of each door pays for more than one new one')
+            pool -= bought[month] * cash_required
+            inflow[month + refinance_month] += bought[month] * cash_out
+            if cash_out <= 0 and pool < cash_required:
+                break
+        return self.add(np.repeat(np.arange(self.total_months), bought), **params)
+
+    def evaluate(self, reinvest=False):
+        """
+        Sums every property's timeline over the calendar.
+
+        Args:
+            reinvest: Fund purchases with refinance cash-out received in earlier months before
+                asking for outside cash.
+
+        Returns:
+            A dict of (total_months,) arrays: 'Doors', 'Cashflow', 'Property Value', 'Loan Balance',
+            'Equity', 'Refinance Cash Out' and 'Cash Required' (outside cash put in that month).
+        """
+        T = self.total_months
+        p = scenario_arrays(self.scenario_params())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d = derive_scenarios(p)
+            realestate = monthly_realestate(p, d, T)
+
+        # ragged timelines (each property starts at its own month) shifted into padded (n, T) arrays
+        local = np.arange(T) - self.start_month[:, None]
+        active = local >= 0
+        on_calendar = lambda column: np.where(active, np.take_along_axis(column, np.clip(local, 0, None), axis=1), 0)
+
+        out = {'Doors': active.sum(axis=0)}
+        out['Cashflow'] = on_calendar(realestate['Total Cashflow']).sum(axis=0)
+        for name in ('Property Value', 'Loan Balance', 'Equity'):
+            out[name] = on_calendar(realestate[name]).sum(axis=0)
+
+        refinance_at = self.start_month + p['refinance_months'].astype(int)
+        out['Refinance Cash Out'] = _monthly_sum(refinance_at, d['refi_cash_out'], T)
+        purchases = _monthly_sum(self.start_month, d['cash_required'], T)
+        if reinvest:
+            out['Cash Required'] = _fund_from_pool(purchases, out['Refinance Cash Out'])
+        else:
+            out['Cash Required'] = purchases
+        return out
+
+def _monthly_sum(month, values, total_months):
+    inside = (month >= 0) & (month < total_months)
+    return np.bincount(month[inside], weights=values[inside], minlength=total_months)[:total_months]
+
+def _fund_from_pool(outflow, inflow):
+    """ Outside cash needed each month when inflows are pooled and spent on outflows first """
+    pool, external = 0., np.zeros_like(outflow)
+    for month in np.flatnonzero((outflow != 0) | (inflow != 0)):
+        pool += inflow[month] - outflow[month]
+        if pool < 0:
+            external[month] = -pool
+            pool = 0.
+    return external
@@ -0,0 +1,159 @@
+"""
+Per-stage wall time, allocation and counters for the model code, off unless asked for.
+
+    with profile() as prof:
+        property_performance(...)
+    prof.report()   # {'stages': {...}, 'counters': {...}, 'wall_seconds': ...}
+
+Setting the REAL_ESTATE_PROFILE environment variable profiles the whole process instead and
+writes the report as JSON at exit: to stderr when it is '1', into `profile_<pid>.json` when it is
+an existing directory, and to that file otherwise. Sweeps run with it set also write a report next
+to every shard; see sweep.sweep_profile.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import tracemalloc
+from contextlib import contextmanager
+
+ENV_FLAG = 'REAL_ESTATE_PROFILE'
+
+# Profiles currently recording, innermost last. Stages and counters go to all of them
+_active = []
+# Open stages, innermost last, as [start memory, running peak]
+_open = []
+
+
+class Profile():
+    """ Accumulated stage timings and counters; stages with the same name are summed """
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.counters = {}
+        self.wall_seconds = 0.
+
+    def add_stage(self, name, seconds, allocated=0, peak=0):
+        stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0., 'allocated_mb': 0., 'peak_mb': 0.})
+        stage['calls'] += 1
+        stage['seconds'] += seconds
+        stage['allocated_mb'] += allocated / 1e6
+        stage['peak_mb'] = max(stage['peak_mb'], peak / 1e6)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        """ JSON-serializable dict of the stages, counters and total wall time """
+        return {
+            'stages': {name: dict(stage) for name, stage in self.stages.items()},
+            'counters': dict(self.counters),
+            'wall_seconds': self.wall_seconds,
+        }
+
+def enabled():
+    return bool(_active)
+
+@contextmanager
+def profile(trace_memory=True):
+    """
+    Records every stage and counter hit inside the block into a new Profile.
+
+    Args:
+        trace_memory: Also record allocations with tracemalloc. Slows the profiled code down a few
+            times; turn it off when only the timings matter.
+    """
+    prof = Profile(trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active.append(prof)
+    start = time.perf_counter()
+    try:
+        yield prof
+    finally:
+        prof.wall_seconds += time.perf_counter() - start
+        _active.remove(prof)
+        if started_tracing:
+            tracemalloc.stop()
+
+@contextmanager
+def stage(name):
+    """
+    Times the block as one call of stage `name` in the active profiles. The allocation is the net
+    change of traced memory and the peak is relative to the traced memory at the start. Nested
+    stages are also counted in the enclosing ones.
+    """
+    if not _active:
+        yield
+        return
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, traced_peak = tracemalloc.get_traced_memory()
+        # the enclosing stage keeps the peak reached so far, which reset_peak is about to forget
+        if _open:
+            _open[-1][1] = max(_open[-1][1], traced_peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        _open.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        allocated = peak = 0
+        if tracing:
+            current, traced_peak = tracemalloc.get_traced_memory()
+            _open.pop()
+            top = max(frame[1], traced_peak)
+            if _open:
+                _open[-1][1] = max(_open[-1][1], top)
+            allocated, peak = current - frame[0], top - frame[0]
+        for prof in _active:
+            prof.add_stage(name, seconds, allocated if prof.trace_memory else 0, peak if prof.trace_memory else 0)
+
+def count(name, n=1):
+    """ Adds n to a counter of the active profiles """
+    for prof in _active:
+        prof.count(name, n)
+
+def merge_reports(reports):
+    """
+    Combines reports, e.g. from the workers of a sweep: times, allocations, calls and counters are
+    summed and peaks take their maximum.
+    """
+    out = Profile()
+    for report in reports:
+        out.wall_seconds += report['wall_seconds']
+        for name, n in report['counters'].items():
+            out.count(name, n)
+        for name, s in report['stages'].items():
+            stage = out.stages.setdefault(name, {'calls': 0, 'seconds': 0., 'allocated_mb': 0., 'peak_mb': 0.})
+            stage['calls'] += s['calls']
+            stage['seconds'] += s['seconds']
+            stage['allocated_mb'] += s['allocated_mb']
+            stage['peak_mb'] = max(stage['peak_mb'], s['peak_mb'])
+    return out.report()
+
+def write_report(report, target):
+    """ Writes a report as JSON to a file path, a directory (as profile_<pid>.json) or '1' for stderr """
+    if target == '1':
+        json.dump(report, sys.stderr, indent=1)
+        sys.stderr.write('\n')
+        return
+    if os.path.isdir(target):
+        target = os.path.join(target, f'profile_{os.getpid()}.json')
+    with open(target, 'w') as f:
+        json.dump(report, f, indent=1)
+
+def _profile_process(target):
+    context = profile()
+    prof = context.__enter__()
+    def finish():
+        context.__exit__(None, None, None)
+        write_report(prof.report(), target)
+    atexit.register(finish)
+
+if os.environ.get(ENV_FLAG):
+    _profile_process(os.environ[ENV_FLAG])
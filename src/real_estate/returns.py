@@ -0,0 +1,146 @@
+import numpy as np
+
+# Names of the columns of performance_metrics
+METRICS = ['IRR', 'MIRR', 'NPV', 'Equity Multiple']
+
+
+def cashflow_streams(columns, exit_year=-1):
+    """
+    Investor cashflows of a performance table: the initial investment going out at time 0, the
+    'Total Annual Cashflow' of every year up to exit_year, and the 'Equity' of exit_year added to
+    the last one as if the position were sold then.
+
+    Args:
+        columns: Real estate or stocks + rent table, as a dict of (..., total_years) arrays from
+            batch_performance or a DataFrame from YearlySummary.to_dataframe or stocks_rent_performance.
+        exit_year: Year in which the position is sold.
+
+    Returns:
+        A (..., exit_year + 2) array; entry t is the cashflow at the end of year t.
+    """
+    cashflow = np.asarray(columns['Total Annual Cashflow'], dtype=float)
+    equity = np.asarray(columns['Equity'], dtype=float)
+    exit_year = range(cashflow.shape[-1])[exit_year]
+    # equity_accounting measures year 0's equity gain against the initial investment
+    initial_investment = equity[..., 0] - np.asarray(columns['Equity Gain'], dtype=float)[..., 0]
+    streams = np.concatenate([-initial_investment[..., None], cashflow[..., :exit_year + 1]], axis=-1)
+    streams[..., -1] += equity[..., exit_year]
+    return streams
+
+def npv(rate, cashflows):
+    """ Net present value of (..., periods) cashflows at a rate per period (scalar or (...,)) """
+    periods = np.arange(np.shape(cashflows)[-1])
+    return (np.asarray(cashflows) / (1 + np.asarray(rate)[..., None])**periods).sum(axis=-1)
+
+def irr(cashflows, lo=-0.99, hi=100., tol=1e-10, max_iter=100, chunk_size=1 << 17):
+    """
+    Internal rate of return of many cashflow streams at once: the rate where npv is zero.
+
+    Every stream is solved simultaneously by Newton's method safeguarded with bisection: each
+    stream keeps a bracket [lo, hi] on which its npv changes sign, and a Newton step that leaves
+    the bracket, or is more than half the step before last (as in Numerical Recipes' rtsafe), is
+    replaced by the midpoint, so the bracket keeps shrinking where Newton stalls. Streams are
+    processed chunk_size at a time to bound the (streams x periods) temporaries.
+
+    Args:
+        cashflows: (..., periods) array of cashflows per period.
+        lo, hi: Initial bracket of rates.
+        tol: Tolerance on the rate.
+        max_iter: Iterations after which streams that have not converged are given up.
+
+    Returns:
+        A (...) array of rates, nan where npv does not change sign on [lo, hi] or the rate has not
+        converged within max_iter iterations.
+    """
+    cashflows = np.asarray(cashflows, dtype=float)
+    flat = cashflows.reshape(-1, cashflows.shape[-1])
+    out = np.empty(len(flat))
+    for start in range(0, len(flat), chunk_size):
+        out[start:start + chunk_size] = _irr(flat[start:start + chunk_size], lo, hi, tol, max_iter)
+    return out.reshape(cashflows.shape[:-1])
+
+def _irr(cashflows, lo, hi, tol, max_iter):
+    n = len(cashflows)
+    # period-major, so Horner's rule runs over contiguous rows
+    by_period = np.ascontiguousarray(cashflows.T)
+    lo, hi = np.full(n, lo, dtype=float), np.full(n, hi, dtype=float)
+    f_lo = _npv_and_slope(lo, by_period)[0]
+    bracketed = np.sign(f_lo) * np.sign(_npv_and_slope(hi, by_period)[0]) <= 0
+    rate = np.full(n, 0.1)
+    # sizes of the last two steps; a Newton step must be at most half the older one
+    last_step, older_step = hi - lo, hi - lo
+    active = bracketed.copy()
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            idx = np.flatnonzero(active)
+            if idx.size == 0:
+                break
+            r = rate[idx]
+            f, df = _npv_and_slope(r, by_period[:, idx] if idx.size < n else by_period)
+            # shrink the bracket to the side where npv has the sign of f(lo)
+            below = np.sign(f) == np.sign(f_lo[idx])
+            lo[idx] = np.where(below, r, lo[idx])
+            f_lo[idx] = np.where(below, f, f_lo[idx])
+            hi[idx] = np.where(below, hi[idx], r)
+            step = r - f / df
+            newton = (np.isfinite(step) & (step >= lo[idx]) & (step <= hi[idx])
+                      & (np.abs(step - r) <= older_step[idx] / 2))
+            step = np.where(f == 0, r, np.where(newton, step, (lo[idx] + hi[idx]) / 2))
+            rate[idx] = step
+            older_step[idx] = last_step[idx]
+            last_step[idx] = np.abs(step - r)
+            done = last_step[idx] < tol * (1 + np.abs(r))
+            active[idx[done]] = False
+    return np.where(bracketed & ~active, rate, np.nan)
+
+def _npv_and_slope(rate, by_period):
+    """ npv and its derivative in the rate of (periods, n) cashflows, by Horner's rule in 1/(1+rate) """
+    v = 1 / (1 + rate)
+    f = by_period[-1].copy()
+    df = np.zeros_like(f)
+    for c in by_period[-2::-1]:
+        df = df * v + f
+        f = f * v + c
+    return f, -df * v**2
+
+def mirr(cashflows, finance_rate, reinvest_rate):
+    """
+    Modified internal rate of return: negative cashflows are discounted to time 0 at finance_rate,
+    positive ones compounded to the last period at reinvest_rate. nan without both signs.
+    """
+    cashflows = np.asarray(cashflows, dtype=float)
+    n = cashflows.shape[-1] - 1
+    periods = np.arange(n + 1)
+    outflows = (np.minimum(cashflows, 0) / (1 + np.asarray(finance_rate)[..., None])**periods).sum(axis=-1)
+    inflows = (np.maximum(cashflows, 0) * (1 + np.asarray(reinvest_rate)[..., None])**(n - periods)).sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((outflows < 0) & (inflows > 0), (inflows / -outflows)**(1 / n) - 1, np.nan)
+
+def equity_multiple(cashflows):
+    """ Total cash returned over total cash invested """
+    cashflows = np.asarray(cashflows, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.maximum(cashflows, 0).sum(axis=-1) / -np.minimum(cashflows, 0).sum(axis=-1)
+
+def performance_metrics(columns, discount_rate=0.08, finance_rate=None, reinvest_rate=None, exit_year=-1):
+    """
+    Time-value-of-money metrics of a performance table, selling at exit_year.
+
+    Args:
+        columns: Real estate or stocks + rent table (see cashflow_streams).
+        discount_rate: Yearly rate for NPV.
+        finance_rate, reinvest_rate: Yearly rates for MIRR; both default to discount_rate.
+        exit_year: Year in which the position is sold.
+
+    Returns:
+        A dict of (...) arrays keyed by METRICS, e.g. one value per scenario of batch_performance.
+    """
+    streams = cashflow_streams(columns, exit_year)
+    finance_rate = discount_rate if finance_rate is None else finance_rate
+    reinvest_rate = discount_rate if reinvest_rate is None else reinvest_rate
+    return {
+        'IRR': irr(streams),
+        'MIRR': mirr(streams, finance_rate, reinvest_rate),
+        'NPV': npv(discount_rate, streams),
+        'Equity Multiple': equity_multiple(streams),
+    }
@@ -0,0 +1,273 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from real_estate.batch import scenario_arrays, derive_scenarios, MONTHLY_HOA, MONTHLY_UTILITIES
+from real_estate.mortgage import Mortgage
+from real_estate.metadata import Acquisition, Rehab, PreReFi_Rent, Refinance, Margin, Renter, Employment
+
+# Phases of a scenario in the order compute_performance builds them, under its model names
+PHASES = ['acq', 'rehab', 'pre_refi', 'refi', 'margi', 'renter', 'job']
+
+
+class PhaseColumns():
+    """
+    Columnar counterpart of one metadata class: `time`, `price` and `exponent` hold the same keys as
+    the metadata object, but every value is an (n_scenarios,) float64 array.
+    """
+    __slots__ = ('time', 'price', 'exponent')
+    metadata = None
+
+    def __init__(self, time, price, exponent):
+        self.time = _columns(time)
+        self.price = _columns(price)
+        self.exponent = _columns(exponent)
+
+    def mortgage(self, index):
+        """ Mortgage of one scenario, for the phases that have one """
+        return None
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for table in (self.time, self.price, self.exponent) for v in table.values())
+
+class AcquisitionColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = Acquisition
+
+    def mortgage(self, index):
+        return Mortgage(self.exponent['yearly_interest'][index], self.price['mortgage'][index],
+                        home_value=self.price['home_value'][index], loan_fees=self.price['loan_fees'][index])
+
+class RehabColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = Rehab
+
+class PreReFiRentColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = PreReFi_Rent
+
+class RefinanceColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = Refinance
+
+    def mortgage(self, index):
+        return Mortgage(self.exponent['yearly_interest'][index], self.price['mortgage'][index],
+                        home_value=self.price['home_value'][index], loan_fees=self.price['loan_fees'][index])
+
+class MarginColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = Margin
+
+    def mortgage(self, index):
+        return Mortgage(self.exponent['yearly_interest'][index], self.price['margin_amount'][index],
+                        mort_insur_frac=0., home_value=self.price['stock_value'][index])
+
+class RenterColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = Renter
+
+class EmploymentColumns(PhaseColumns):
+    __slots__ = ()
+    metadata = Employment
+
+def _columns(table):
+    return {name: np.ascontiguousarray(value, dtype=np.float64) for name, value in table.items()}
+
+
+class ScenarioBatch():
+    """
+    Many scenarios stored as a struct of arrays: one PhaseColumns per phase of compute_performance,
+    each holding one float64 array per field. Indexing gives a ScenarioView with the attribute and
+    dict access of the metadata objects, without building them. The derived fields come from
+    batch.derive_scenarios, so they are the values batch_performance works with.
+
+        batch = ScenarioBatch(purchase_price=np.linspace(1e5, 5e5, 1000))
+        batch.acq.price['monthly_PI']        # (1000,) array
+        batch[3].acq.price['monthly_PI']     # float
+        print(batch[3].refi)                 # Refinance.__str__ layout, with float fields
+    """
+    __slots__ = ('params',) + tuple(PHASES) + ('cash_required', 'monthly_required')
+
+    def __init__(self, **params):
+        p = self.params = {name: values.ravel() for name, values in scenario_arrays(params).items()}
+        n = p['purchase_price'].size
+        constant = lambda value: np.full(n, value, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d = derive_scenarios(p)
+        self.cash_required = d['cash_required']
+        self.monthly_required = d['monthly_required']
+
+        self.acq = AcquisitionColumns({}, {
+            'home_value': p['purchase_price'],
+            'downpayment': p['downpayment'],
+            'yearly_taxes': d['yearly_taxes'],
+            'monthly_HOA': constant(MONTHLY_HOA),
+            'yearly_insurance': p['yearly_insurance'],
+            'monthly_utilities': constant(MONTHLY_UTILITIES),
+            'loan_fees': d['acq_loan_fees'],
+            'mortgage': d['acq_mortgage'],
+            'closing': d['closing'],
+            'monthly_taxes': d['monthly_taxes'],
+            'monthly_insurance': d['monthly_insurance'],
+            'monthly_PI': d['acq_PI'],
+            'monthly_PMI': d['monthly_PMI'],
+            'owning_expenses': d['owning_expenses'],
+        }, {
+            'yearly_interest': p['acq_yearly_interest'],
+            'yearly_val_apprec': p['value_appreciation'],
+        })
+        self.rehab = RehabColumns({'total_months': p['rehab_months']}, {
+            'total_cost': p['rehab_cost'],
+            'monthly_insurance': constant(0),
+            'other': constant(0),
+            'monthly_PI': d['acq_PI'],
+            'owning_expenses': d['owning_expenses'],
+            'monthly_rehab': d['monthly_rehab'],
+            'holding_cost': d['holding_cost'],
+            'monthly_total': d['monthly_total'],
+        }, {})
+        rental = {
+            'monthly_rent': p['monthly_rent_income'],
+            'vacancy_frac': p['vacancy_frac'],
+            'repairs_frac': p['repairs_frac'],
+            'capex_frac': p['capex_frac'],
+            'owning_expenses': d['owning_expenses'],
+            'monthly_vacancy': d['monthly_vacancy'],
+            'monthly_repairs': d['monthly_repairs'],
+            'monthly_capex': d['monthly_capex'],
+            'monthly_OpEx': d['monthly_OpEx'],
+        }
+        growth = {
+            'yearly_rent_apprec': p['rent_appreciation'],
+            'yearly_opex_inflation': p['opex_inflation'],
+        }
+        self.pre_refi = PreReFiRentColumns({'total_months': d['pre_refi_months']}, {
+            **rental,
+            'monthly_PI': d['acq_PI'],
+            'monthly_expenses': d['pre_refi_expenses'],
+            'monthly_cashflow': d['pre_refi_cashflow'],
+            'NOI': d['pre_refi_NOI'],
+        }, growth)
+        self.refi = RefinanceColumns({'total_months': p['refinance_months']}, {
+            **rental,
+            'home_value': p['after_repair_value'],
+            'loan_frac': p['refi_loan_frac'],
+            'loan_fees': d['refi_loan_fees'],
+            'mortgage': d['refi_mortgage'],
+            'monthly_PI': d['refi_PI'],
+            'monthly_expenses': d['refi_expenses'],
+            'monthly_cashflow': d['refi_cashflow'],
+            'NOI': d['refi_NOI'],
+        }, {'yearly_interest': p['ref_yearly_interest'], 'yearly_val_apprec': p['value_appreciation'], **growth})
+
+        # the stocks + rent strategy invests what the real estate strategy needs, as in YearlySummary
+        self.margi = MarginColumns({}, {
+            'stock_value': d['margin_stock_value'],
+            'downpayment': d['cash_required'],
+            'monthly_fees': constant(0),
+            'loan_fees': constant(0),
+            'margin_amount': d['margin_amount'],
+            'owning_expenses': constant(0),
+            'monthly_PI': d['margin_PI'],
+        }, {
+            'yearly_interest': p['stock_yearly_interest'],
+            'yearly_val_apprec': p['stock_value_appreciation'],
+        })
+        self.renter = RenterColumns({}, {
+            'monthly_rent': p['monthly_rent_expense'],
+            'monthly_opex': p['renter_monthly_opex'],
+        }, {
+            'rent_appreciation': p['rent_appreciation'],
+            'opex_inflation': p['opex_inflation'],
+        })
+        self.job = EmploymentColumns({}, {'monthly_income': d['job_monthly_income']},
+                                     {'yearly_pay_appreciation': p['yearly_pay_appreciation']})
+
+    def __len__(self):
+        return self.cash_required.size
+
+    def __getitem__(self, index):
+        index = range(len(self))[index]
+        return ScenarioView(self, index)
+
+    def __iter__(self):
+        return (ScenarioView(self, i) for i in range(len(self)))
+
+    @property
+    def nbytes(self):
+        """ Memory held by the phase columns, counting arrays shared between phases once """
+        arrays = {id(v): v for phase in PHASES for table in ('time', 'price', 'exponent')
+                  for v in getattr(getattr(self, phase), table).values()}
+        return sum(v.nbytes for v in arrays.values())
+
+
+class ScenarioView():
+    """ One scenario of a ScenarioBatch. Phases are reached as attributes (view.acq) or keys (view['acq']) """
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __getattr__(self, name):
+        if name in PHASES:
+            return PhaseView(getattr(self.batch, name), self.index)
+        raise AttributeError(name)
+
+    def __getitem__(self, name):
+        if name not in PHASES:
+            raise KeyError(name)
+        return PhaseView(getattr(self.batch, name), self.index)
+
+    def models(self):
+        """ Dict of the phase views under the model names of compute_performance """
+        return {name: self[name] for name in PHASES}
+
+class PhaseView():
+    """
+    One scenario of a PhaseColumns, standing in for the metadata object: `time`, `price` and
+    `exponent` are read-only mappings of floats, `mort` builds the Mortgage when asked for and str()
+    uses the layout of the metadata class (fields print as floats, e.g. "6.0 months").
+    """
+    __slots__ = ('columns', 'index')
+
+    def __init__(self, columns, index):
+        self.columns = columns
+        self.index = index
+
+    @property
+    def time(self):
+        return RowView(self.columns.time, self.index)
+
+    @property
+    def price(self):
+        return RowView(self.columns.price, self.index)
+
+    @property
+    def exponent(self):
+        return RowView(self.columns.exponent, self.index)
+
+    @property
+    def mort(self):
+        return self.columns.mortgage(self.index)
+
+    def __str__(self):
+        return self.columns.metadata.__str__(self)
+
+class RowView(Mapping):
+    """ Read-only mapping of field names to the floats of one row of a dict of columns """
+    __slots__ = ('columns', 'index')
+
+    def __init__(self, columns, index):
+        self.columns = columns
+        self.index = index
+
+    def __getitem__(self, name):
+        return float(self.columns[name][self.index])
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
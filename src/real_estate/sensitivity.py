@@ -0,0 +1,139 @@
+import numpy as np
+
+from real_estate.batch import batch_performance, PARAMETERS
+
+# Parameters counted in whole months; their perturbations and samples are rounded
+INTEGER_PARAMETERS = ['rehab_months', 'refinance_months']
+# Parameters of property_performance that the model does not read; tornado skips them by default
+UNUSED_PARAMETERS = ['mortgage_years', 'job_monthly_cashflow']
+
+def tornado(metric='Equity', year=9, table='realestate', parameters=None, rel_step=0.1, steps=None, **params):
+    """
+    One-at-a-time sensitivity of a metric around one scenario, as a tornado table.
+
+    Every parameter is moved down and up by rel_step of its value (or by its entry in steps) with
+    the others held at the scenario's values; all 2 * n_parameters + 1 scenarios are evaluated in a
+    single batch_performance call.
+
+    Args:
+        metric: Column of the performance table, read at year, or a function of the real estate and
+            stocks column dicts of batch_performance returning an (n,) array (e.g. an IRR).
+        table: 'realestate' or 'stocks', the table holding a metric column.
+        parameters: Names of the parameters to perturb. Defaults to every parameter with a nonzero
+            value or an entry in steps, except UNUSED_PARAMETERS.
+        rel_step: Relative perturbation, rounded to at least a whole month for INTEGER_PARAMETERS.
+        steps: Optional dict of absolute perturbations, e.g. for parameters that are zero.
+        params: Scalar keyword parameters of property_performance.
+
+    Returns:
+        A DataFrame indexed by parameter, largest 'swing' (high minus low result, in absolute value)
+        first, with the 'low_value' and 'high_value' of each parameter and the 'low' and 'high'
+        results next to the 'base' result.
+    """
+    import pandas as pd
+
+    unknown = set(params) - set(PARAMETERS)
+    if unknown:
+        raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+    base = {**PARAMETERS, **params}
+    steps = steps or {}
+    if parameters is None:
+        parameters = [name for name in PARAMETERS if (base[name] != 0 or name in steps) and name not in UNUSED_PARAMETERS]
+    delta = np.array([steps.get(name, abs(base[name]) * rel_step) for name in parameters], dtype=float)
+    integer = np.isin(parameters, INTEGER_PARAMETERS)
+    delta[integer] = np.maximum(np.round(delta[integer]), 1)
+    values = np.array([base[name] for name in parameters], dtype=float)
+
+    # scenario 0 is the base, then every parameter low and high
+    batch = {name: np.full(2 * len(parameters) + 1, base[name], dtype=float) for name in PARAMETERS}
+    for i, name in enumerate(parameters):
+        batch[name][1 + 2 * i] = values[i] - delta[i]
+        batch[name][2 + 2 * i] = values[i] + delta[i]
+    results = _evaluate(metric, year, table, batch)
+
+    df = pd.DataFrame({
+        'low_value': values - delta,
+        'high_value': values + delta,
+        'low': results[1::2],
+        'high': results[2::2],
+        'base': results[0],
+    }, index=pd.Index(parameters, name='parameter'))
+    df['swing'] = df['high'] - df['low']
+    return df.iloc[np.argsort(-np.abs(df['swing'].to_numpy()), kind='stable')]
+
+def sobol_indices(bounds, metric='Equity', year=9, table='realestate', n_samples=4096, seed=0, n_bootstrap=100,
+                  chunk_size=100_000, **params):
+    """
+    Variance-based (Sobol) sensitivity of a metric to parameters drawn uniformly within bounds.
+
+    Uses Saltelli's sampling scheme: two independent (n_samples, k) matrices A and B, and for every
+    parameter i the matrix AB_i, which is A with column i taken from B. The n_samples * (k + 2)
+    scenarios are evaluated in batch_performance calls of chunk_size. First order indices use
+    the estimator of Saltelli et al. (2010) and total order indices Jansen's.
+
+    Args:
+        bounds: Dict of parameter names to (low, high) ranges. INTEGER_PARAMETERS are rounded.
+        metric, year, table: As for tornado.
+        n_samples: Rows of A and B; the cost is n_samples * (len(bounds) + 2) evaluations.
+        seed: Seed of the random generator.
+        n_bootstrap: Bootstrap resamples for the confidence intervals; 0 skips them.
+        params: Scalar keyword parameters of property_performance for the parameters not in bounds.
+
+    Returns:
+        A DataFrame indexed by parameter with the first order 'S1' and total order 'ST' indices, and
+        the half widths 'S1_conf' and 'ST_conf' of their 95% bootstrap intervals, largest ST first.
+    """
+    import pandas as pd
+
+    unknown = (set(params) | set(bounds)) - set(PARAMETERS)
+    if unknown:
+        raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+    names = list(bounds)
+    k = len(names)
+    low, high = np.array([bounds[name] for name in names], dtype=float).T
+    rng = np.random.default_rng(seed)
+    A = low + (high - low) * rng.random((n_samples, k))
+    B = low + (high - low) * rng.random((n_samples, k))
+    integer = np.isin(names, INTEGER_PARAMETERS)
+    A[:, integer], B[:, integer] = np.round(A[:, integer]), np.round(B[:, integer])
+
+    # rows: A, B, then AB_i for every parameter
+    samples = np.concatenate([A, B] + [np.where(np.arange(k) == i, B, A) for i in range(k)])
+    batch = {**params, **{name: samples[:, i] for i, name in enumerate(names)}}
+    f = _evaluate(metric, year, table, batch, chunk_size).reshape(k + 2, n_samples)
+    f_A, f_B, f_AB = f[0], f[1], f[2:]
+
+    S1, ST = _sobol(f_A, f_B, f_AB)
+    out = pd.DataFrame({'S1': S1, 'ST': ST}, index=pd.Index(names, name='parameter'))
+    if n_bootstrap:
+        resamples = rng.integers(0, n_samples, (n_bootstrap, n_samples))
+        boot = np.array([_sobol(f_A[r], f_B[r], f_AB[:, r]) for r in resamples])
+        out['S1_conf'] = 1.96 * boot[:, 0].std(axis=0)
+        out['ST_conf'] = 1.96 * boot[:, 1].std(axis=0)
+    return out.sort_values('ST', ascending=False)
+
+def _sobol(f_A, f_B, f_AB):
+    """ First and total order indices from the outputs of Saltelli's A, B and AB_i matrices """
+    # centering leaves the estimators unbiased but removes the noise a large mean adds to S1
+    mean = np.mean(np.concatenate([f_A, f_B]))
+    f_A, f_B, f_AB = f_A - mean, f_B - mean, f_AB - mean
+    variance = np.var(np.concatenate([f_A, f_B]))
+    S1 = np.mean(f_B * (f_AB - f_A), axis=-1) / variance
+    ST = 0.5 * np.mean((f_A - f_AB)**2, axis=-1) / variance
+    return S1, ST
+
+def _evaluate(metric, year, table, batch, chunk_size=100_000):
+    """ The metric for every scenario of a dict of parameter arrays, chunk_size scenarios per batch_performance call """
+    n = max(np.size(v) for v in batch.values())
+    # a column read at year needs no later years; a function of the tables may look at any year
+    total_years = year + 1 if isinstance(metric, str) and year >= 0 else 30
+    out = np.empty(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, n, chunk_size):
+            chunk = {name: v[start:start + chunk_size] if np.ndim(v) else v for name, v in batch.items()}
+            realestate, stocks = batch_performance(total_years=total_years, **chunk)
+            if callable(metric):
+                out[start:start + chunk_size] = metric(realestate, stocks)
+            else:
+                out[start:start + chunk_size] = (realestate if table == 'realestate' else stocks)[metric][:, year]
+    return out
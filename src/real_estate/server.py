@@ -0,0 +1,305 @@
+"""
+Serves scenario evaluations over HTTP on localhost, keeping the model warm between requests.
+
+    real-estate-server --port 8765
+    curl -d '{"purchase_price": 250000, "downpayment": 50000}' localhost:8765/evaluate
+    curl localhost:8765/stats
+
+POST /evaluate takes a JSON object of property_performance parameters (others take their defaults),
+or a list of them, and answers with the yearly 'realestate' and 'stocks' columns of
+batch_performance for each. Concurrent requests are collected into micro-batches, each evaluated by
+one batch_performance call; scenarios already evaluated are answered from an in-memory LRU cache, and
+identical scenarios in flight are evaluated once. Values that are not finite (e.g. the Cash on Cash ROI of
+a scenario needing no cash) are sent as null. GET /stats reports latency percentiles, throughput,
+batch sizes and cache hits.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from real_estate.batch import batch_performance, PARAMETERS
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class ScenarioService():
+    """
+    Micro-batching evaluator behind the HTTP server.
+
+    Requests wait at most max_delay seconds for others to join their batch, and while a batch is
+    evaluated (in a worker thread, so the event loop keeps accepting requests) the next one fills up,
+    so batches grow with the load and a lone request is not held back.
+
+        service = ScenarioService()
+        server = await service.start('127.0.0.1', 8765)
+        result = json.loads(await service.evaluate({'purchase_price': 250e3}))
+
+    Args:
+        total_years: Number of years evaluated.
+        columns: Columns to return; all by default. Encoding the results to JSON costs more than
+            evaluating them, so fewer columns mean more throughput.
+        decimals: Decimals results are rounded to; shorter numbers also encode faster. Exact by default.
+        max_batch_size: Most scenarios per batch_performance call.
+        max_delay: Seconds the first request of a batch waits for more.
+        cache_size: Number of results kept in the LRU cache.
+        window: Number of recent requests the latency and throughput statistics cover.
+    """
+    def __init__(self, total_years=30, columns=None, decimals=None, max_batch_size=4096, max_delay=0.002, cache_size=100_000, window=10_000):
+        self.total_years = total_years
+        self.columns = columns
+        self.decimals = decimals
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._queue = None
+        self._batcher = None
+        self._latencies = deque(maxlen=window)
+        self._finished = deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.counts = dict.fromkeys(['requests', 'errors', 'scenarios', 'cache_hits', 'coalesced', 'evaluated', 'batches'], 0)
+        # evaluating once up front loads every module and allocator the requests will need
+        self._evaluate_batch([{}])
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """ Starts serving HTTP on host:port; returns the asyncio.Server """
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def evaluate(self, params):
+        """
+        Result of one scenario, a dict of parameters, as JSON bytes of {'realestate': {column: list}, 'stocks': {...}}.
+        Results are encoded once, in the worker thread, and cached encoded.
+        """
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+        key = tuple(float(params.get(name, default)) for name, default in PARAMETERS.items())
+        self.counts['scenarios'] += 1
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.counts['cache_hits'] += 1
+            return self._cache[key]
+        if key in self._in_flight:
+            self.counts['coalesced'] += 1
+            return await asyncio.shield(self._in_flight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        await self._queue.put((key, params))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        """ Counters, latency percentiles (ms) and throughput (requests/s) of the recent window and since start """
+        latencies = np.array(self._latencies) * 1e3
+        percentiles = np.percentile(latencies, [50, 90, 99]) if latencies.size else [np.nan] * 3
+        span = self._finished[-1] - self._finished[0] if len(self._finished) > 1 else 0.
+        return {
+            **self.counts,
+            'cache_entries': len(self._cache),
+            'mean_batch_size': self.counts['evaluated'] / max(self.counts['batches'], 1),
+            'latency_p50_ms': float(percentiles[0]),
+            'latency_p90_ms': float(percentiles[1]),
+            'latency_p99_ms': float(percentiles[2]),
+            'throughput': (len(self._finished) - 1) / span if span > 0 else 0.,
+            'mean_throughput': self.counts['requests'] / (time.perf_counter() - self.started),
+        }
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+            results = await loop.run_in_executor(None, self._evaluate_rows, [params for _, params in batch])
+            self.counts['batches'] += 1
+            self.counts['evaluated'] += len(batch)
+            for (key, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self._in_flight.pop(key).set_exception(result)
+                    continue
+                self._cache[key] = result
+                self._in_flight.pop(key).set_result(result)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _evaluate_rows(self, rows):
+        """
+        Results of _evaluate_batch; if the batch fails, every row is evaluated on its own so that one
+        bad scenario fails only its own request. Failed rows hold their exception.
+        """
+        try:
+            return self._evaluate_batch(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                return [e]
+        return [self._evaluate_rows([row])[0] for row in rows]
+
+    def _evaluate_batch(self, rows):
+        """ JSON encoded results of a list of parameter dicts from one batch_performance call """
+        n = len(rows)
+        params = {name: np.array([row.get(name, PARAMETERS[name]) for row in rows], dtype=float)
+                  for name in set().union(*rows)}
+        params['purchase_price'] = np.broadcast_to(params.get('purchase_price', PARAMETERS['purchase_price']), n)
+        realestate, stocks = batch_performance(total_years=self.total_years, **params)
+        tables = {'realestate': realestate, 'stocks': stocks}
+        columns = {label: {name: _to_list(values if self.decimals is None else np.round(values, self.decimals))
+                           for name, values in table.items() if self.columns is None or name in self.columns}
+                   for label, table in tables.items()}
+        return [json.dumps({label: {name: values[i] for name, values in table.items()} for label, table in columns.items()},
+                           allow_nan=False).encode()
+                for i in range(n)]
+
+    async def _handle(self, reader, writer):
+        """ Serves the requests of one (keep-alive) connection """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, version = line.decode('latin-1').split()
+                headers = {}
+                while (header := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                start = time.perf_counter()
+                status, data = await self._route(method, path, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(data)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + data)
+                await writer.drain()
+                if path == '/evaluate':
+                    end = time.perf_counter()
+                    self._latencies.append(end - start)
+                    self._finished.append(end)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        """ Status and JSON body of a request """
+        if path == '/evaluate':
+            if method != 'POST':
+                return 405, _error('Use POST')
+            self.counts['requests'] += 1
+            try:
+                request = json.loads(body or b'{}')
+                if isinstance(request, list):
+                    return 200, b'[' + b','.join(await asyncio.gather(*(self.evaluate(params) for params in request))) + b']'
+                return 200, await self.evaluate(request)
+            except (TypeError, ValueError, AttributeError) as e:
+                self.counts['errors'] += 1
+                return 400, _error(str(e))
+            except Exception as e:
+                self.counts['errors'] += 1
+                return 500, _error(f'{type(e).__name__}: {e}')
+        elif path == '/stats':
+            stats = {name: None if isinstance(value, float) and not np.isfinite(value) else value
+                     for name, value in self.stats().items()}
+            return 200, json.dumps(stats, allow_nan=False).encode()
+        elif path == '/health':
+            return 200, b'{"status": "ok"}'
+        return 404, _error(f'No route {path}; use /evaluate, /stats or /health')
+
+def _error(message):
+    return json.dumps({'error': message}).encode()
+
+def _to_list(values):
+    """ Nested lists of an array's values, with None (JSON null) for nan and infinities """
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    return np.where(finite, values, None).tolist()
+
+async def serve(host='127.0.0.1', port=8765, **kwargs):
+    """ Runs a ScenarioService until cancelled; kwargs go to ScenarioService """
+    service = ScenarioService(**kwargs)
+    server = await service.start(host, port)
+    async with server:
+        await server.serve_forever()
+
+async def load_test(scenarios, host='127.0.0.1', port=8765, concurrency=64):
+    """
+    Posts every scenario of a list of parameter dicts to a running server, over concurrency
+    keep-alive connections, and measures it from the client side.
+
+    Returns:
+        A dict of 'requests', 'errors', 'seconds', 'throughput' (requests/s) and latency
+        percentiles in ms.
+    """
+    pending = deque(scenarios)
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while pending:
+                body = json.dumps(pending.popleft()).encode()
+                start = time.perf_counter()
+                writer.write(f'POST /evaluate HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+                headers = {}
+                while (header := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers['content-length']))
+                latencies.append(time.perf_counter() - start)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, len(pending)))))
+    seconds = time.perf_counter() - start
+    p50, p90, p99 = np.percentile(np.array(latencies) * 1e3, [50, 90, 99])
+    return {'requests': len(latencies), 'errors': errors, 'seconds': seconds, 'throughput': len(latencies) / seconds,
+            'latency_p50_ms': p50, 'latency_p90_ms': p90, 'latency_p99_ms': p99}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='real-estate-server', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--total-years', type=int, default=30, help='Years to evaluate')
+    parser.add_argument('--columns', help='Comma separated columns to return; all by default')
+    parser.add_argument('--decimals', type=int, help='Decimals to round results to; exact by default')
+    parser.add_argument('--max-batch-size', type=int, default=4096, help='Most scenarios per batch')
+    parser.add_argument('--max-delay-ms', type=float, default=2., help='Milliseconds a request waits for others to batch with')
+    parser.add_argument('--cache-size', type=int, default=100_000, help='Results kept in memory')
+    args = parser.parse_args(argv)
+
+    print(f'Serving on http://{args.host}:{args.port}', file=sys.stderr)
+    try:
+        asyncio.run(serve(args.host, args.port, total_years=args.total_years,
+                          columns=args.columns.split(',') if args.columns else None, decimals=args.decimals,
+                          max_batch_size=args.max_batch_size,
+                          max_delay=args.max_delay_ms / 1e3, cache_size=args.cache_size))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import numpy as np
+
+from real_estate.batch import batch_performance, scenario_arrays, derive_scenarios, derive_acquisition, derive_refinance, _realestate
+from real_estate.returns import cashflow_streams, irr, npv
+from real_estate.mortgage import yearly_balance, balance_after
+from real_estate.constants import yearly_months
+
+
+def bisect(residual, lo, hi, xtol=0.01, max_iter=100):
+    """
+    Bisection on many independent problems at once.
+
+    Args:
+        residual: Function of an (n,) array of inputs returning an (n,) array of residuals.
+        lo, hi: (n,) arrays bracketing the roots.
+        xtol: Absolute tolerance on the inputs.
+
+    Returns:
+        An (n,) array of roots, nan where residual does not change sign between lo and hi.
+    """
+    lo, hi = np.broadcast_arrays(np.asarray(lo, dtype=float), np.asarray(hi, dtype=float))
+    lo, hi = lo.copy(), hi.copy()
+    f_lo, f_hi = residual(lo), residual(hi)
+    bracketed = np.sign(f_lo) * np.sign(f_hi) <= 0
+    for _ in range(max_iter):
+        if np.all(hi - lo < xtol):
+            break
+        mid = (lo + hi) / 2
+        f_mid = residual(mid)
+        same_side = np.sign(f_mid) == np.sign(f_lo)
+        lo = np.where(same_side, mid, lo)
+        f_lo = np.where(same_side, f_mid, f_lo)
+        hi = np.where(same_side, hi, mid)
+    return np.where(bracketed, (lo + hi) / 2, np.nan)
+
+def secant(residual, x0, x1, xtol=0.01, max_iter=50):
+    """
+    Secant iteration on many independent problems at once. Exact after one step when the residual
+    is affine in the input.
+
+    Returns:
+        An (n,) array of roots, nan where the iteration did not converge.
+    """
+    x0, x1 = np.broadcast_arrays(np.asarray(x0, dtype=float), np.asarray(x1, dtype=float))
+    f0, f1 = residual(x0), residual(x1)
+    converged = np.zeros(x1.shape, dtype=bool)
+    for _ in range(max_iter):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x2 = np.where(converged, x1, x1 - f1 * (x1 - x0) / (f1 - f0))
+        converged |= np.abs(x2 - x1) < xtol
+        if np.all(converged | ~np.isfinite(x2)):
+            x1 = x2
+            break
+        x0, f0 = x1, f1
+        x1, f1 = x2, np.where(converged, f1, residual(x2))
+    return np.where(converged & np.isfinite(x1), x1, np.nan)
+
+def solve_for(param, residual, lo, hi, method='bisect', xtol=0.01, total_years=30, **params):
+    """
+    Finds, for every scenario, the value of one property_performance parameter at which
+    residual(realestate, stocks) is zero.
+
+    Args:
+        param: Name of the parameter to solve for.
+        residual: Function of the two column dicts of batch_performance returning an (n,) array.
+        lo, hi: Bracket for bisection, or the two starting points for the secant method.
+        method: 'bisect' or 'secant'.
+        total_years: Years to simulate per evaluation; no more than the residual looks at.
+        params: The other property_performance parameters, scalars or arrays.
+
+    Returns:
+        An (n_scenarios,) array of solutions (nan where none was found).
+    """
+    shape = np.broadcast_shapes(*[np.shape(v) for v in params.values()], np.shape(lo), np.shape(hi))
+    shape = shape or (1,)
+    f = lambda x: residual(*batch_performance(total_years=total_years, **{**params, param: x}))
+    lo, hi = np.broadcast_to(lo, shape), np.broadcast_to(hi, shape)
+    if method == 'bisect':
+        return bisect(f, lo, hi, xtol=xtol)
+    elif method == 'secant':
+        return secant(f, lo, hi, xtol=xtol)
+    raise ValueError(f"Unknown method {method}; use 'bisect' or 'secant'")
+
+def break_even_rent(year=0, **params):
+    """ Monthly rent at which the real estate 'Total Annual Cashflow' of a year is zero """
+    residual = lambda realestate, stocks: realestate['Total Annual Cashflow'][:, year]
+    return solve_for('monthly_rent_income', residual, 0., 5e3, method='secant', total_years=year+1, **params)
+
+def max_purchase_price(year=10, metric='Equity', lo=None, hi=None, xtol=1., **params):
+    """
+    Highest purchase price at which the real estate strategy still matches the stocks + rent
+    strategy on a metric at a year. Assumes the real estate advantage falls as the price rises;
+    nan where it does not cross between lo (default: the downpayment) and hi (default: 10x the
+    largest purchase_price given, or of its default).
+    """
+    p = scenario_arrays(params)
+    lo = p['downpayment'] if lo is None else lo
+    hi = 10 * p['purchase_price'].max() if hi is None else hi
+    residual = lambda realestate, stocks: realestate[metric][:, year] - stocks[metric][:, year]
+    return solve_for('purchase_price', residual, lo, hi, xtol=xtol, total_years=year+1, **params)
+
+def min_after_repair_value(**params):
+    """
+    Lowest after repair value at which the refinance cash-out returns all the cash required. This is
+    closed form since neither the acquisition payoff nor the cash required depend on it.
+    """
+    p = scenario_arrays(params)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = derive_scenarios(p)
+        # refi_cash_out = 1.01*loan_frac*arv - 0.01*loan_frac*arv - payoff
+        return (d['cash_required'] + d['acq_payoff']) / p['refi_loan_frac']
+
+def best_refinance(candidate_months=np.arange(1, 37), refi_rates=None, refi_loan_fracs=None, objective='IRR',
+                   year=-1, discount_rate=0.08, total_years=30, chunk_size=2048, **params):
+    """
+    Best refinance month of every scenario, with every candidate evaluated as one extra array axis.
+
+    The acquisition quantities (loan, PMI, owning and operating expenses) are derived once per
+    scenario and broadcast against the candidates; only the refinance dependent quantities and the
+    real estate table are computed over the (scenarios x candidates) grid, chunk_size scenarios at
+    a time. Candidates before the end of the rehab are skipped.
+
+    Unlike the batch_performance table, the loan balance switches to the refinance loan from the
+    refinance month on, and the refinance cash-out ('refi_cash_out' of derive_scenarios) is
+    received in the year of the refinance, so a larger loan is weighed against the cash it frees.
+
+    Args:
+        candidate_months: (n_candidates,) candidate refinance months.
+        refi_rates: Optional rate of the refinance loan for each candidate, (n_candidates,) or
+            (n_scenarios, n_candidates), e.g. an expected rate path. Defaults to ref_yearly_interest.
+        refi_loan_fracs: Optional loan to value for each candidate, shaped like refi_rates.
+            Defaults to refi_loan_frac.
+        objective: What to maximize: 'IRR', 'NPV' at discount_rate (both selling at year), 'Total
+            Cashflow' (the sum of 'Total Annual Cashflow' and the cash-out through year) or any
+            column of the real estate table at year.
+        year: Year at which the objective is read.
+        params: The other property_performance parameters, scalars or arrays. refinance_months,
+            if given, is ignored.
+
+    Returns:
+        A dict of (n_scenarios,) arrays: the best 'refinance_months' with its 'ref_yearly_interest'
+        and 'refi_loan_frac', and its 'objective'; plus 'values', the (n_scenarios, n_candidates)
+        objective of every candidate (nan where skipped).
+    """
+    params.pop('refinance_months', None)
+    p = {name: values.ravel() for name, values in scenario_arrays(params).items()}
+    n = p['purchase_price'].size
+    months = np.asarray(candidate_months, dtype=float)
+    if months.ndim != 1 or months.max() >= total_years * yearly_months:
+        raise ValueError(f'candidate_months must be a 1d array of months below {total_years * yearly_months}')
+    candidates = {'refinance_months': np.broadcast_to(months, (n, months.size))}
+    for name, values in (('ref_yearly_interest', refi_rates), ('refi_loan_frac', refi_loan_fracs)):
+        candidates[name] = np.broadcast_to(p[name][:, None] if values is None else np.asarray(values, dtype=float),
+                                           (n, months.size))
+
+    values = np.empty((n, months.size))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acquisition = derive_acquisition(p)
+        for start in range(0, n, chunk_size):
+            rows = slice(start, start + chunk_size)
+            pc = {name: v[rows, None] for name, v in p.items()}
+            pc.update({name: v[rows] for name, v in candidates.items()})
+            d = derive_refinance(pc, {name: v[rows, None] for name, v in acquisition.items()})
+            realestate = _realestate(pc, d, total_years, loan_balance=_refinanced_balance(pc, d, total_years))
+            values[rows] = _refinance_objective(realestate, _cash_out(pc, d, total_years), objective, year, discount_rate)
+    values[candidates['refinance_months'] < p['rehab_months'][:, None]] = np.nan
+
+    valid = ~np.all(np.isnan(values), axis=1)
+    best = np.nanargmax(np.where(valid[:, None], values, 0.), axis=1)
+    pick = lambda x: np.where(valid, x[np.arange(n), best], np.nan)
+    out = {name: pick(v) for name, v in candidates.items()}
+    out['objective'] = pick(values)
+    out['values'] = values
+    return out
+
+def _refinanced_balance(p, d, total_years):
+    """ Yearly balance of the acquisition loan until the refinance month and of the refinance loan after """
+    col = lambda x: np.asarray(x)[..., None]
+    refi_payments = yearly_months * np.arange(1, total_years + 1) - col(p['refinance_months'])
+    acq = yearly_balance(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], total_years)
+    refi = balance_after(col(p['ref_yearly_interest']), col(d['refi_mortgage']), col(d['refi_PI']), refi_payments)
+    return np.where(refi_payments > 0, refi, acq)
+
+def _cash_out(p, d, total_years):
+    """ (..., total_years) cash received from the refinance, in the year of the refinance month """
+    refinance_year = np.asarray(p['refinance_months'] // yearly_months)[..., None]
+    return np.where(np.arange(total_years) == refinance_year, np.asarray(d['refi_cash_out'])[..., None], 0.)
+
+def _refinance_objective(realestate, cash_out, objective, year, discount_rate):
+    year = range(realestate['Total Annual Cashflow'].shape[-1])[year]
+    if objective in ('IRR', 'NPV'):
+        streams = cashflow_streams(realestate, year)
+        streams[..., 1:] += cash_out[..., :year + 1]
+        return irr(streams) if objective == 'IRR' else npv(discount_rate, streams)
+    if objective == 'Total Cashflow':
+        return (realestate['Total Annual Cashflow'] + cash_out)[..., :year + 1].sum(axis=-1)
+    if objective not in realestate:
+        raise ValueError(f"Unknown objective {objective}; use 'IRR', 'NPV', 'Total Cashflow' or a real estate column")
+    return realestate[objective][..., year]
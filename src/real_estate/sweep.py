@@ -0,0 +1,183 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from real_estate import profiling
+from real_estate.batch import batch_performance, PARAMETERS
+
+
+def run_sweep(out_dir, grid, chunk_size=100_000, max_workers=None, total_years=30, columns=None, progress=True, **params):
+    """
+    Evaluates batch_performance over a parameter grid in chunks spread across processes. Each chunk
+    is written to its own shard in out_dir as soon as it finishes, so rerunning the same sweep after
+    an interruption only computes the missing chunks.
+
+    Args:
+        out_dir: Directory for the manifest and the result shards.
+        grid: Dict of property_performance parameter names to the values to sweep. The grid is never
+            materialized; each chunk decodes its own slice of the cartesian product.
+        chunk_size: Number of scenarios per chunk (and shard).
+        max_workers: Number of worker processes. Defaults to the number of cores; 1 runs in-process.
+        total_years: Number of years to simulate.
+        columns: Optional list of column names to keep. Defaults to every column.
+        progress: Print a line after each finished chunk.
+        params: Other property_performance parameters, either scalars or arrays with one entry
+            per grid scenario.
+
+    Returns:
+        The number of scenarios in the sweep. Use load_sweep to read the results.
+    """
+    unknown = (set(grid) | set(params)) - set(PARAMETERS)
+    if unknown:
+        raise TypeError(f'Unknown scenario parameters: {sorted(unknown)}')
+    grid = {name: np.atleast_1d(values).astype(float).tolist() for name, values in grid.items()}
+    n_scenarios = int(np.prod([len(v) for v in grid.values()]))
+    manifest = {
+        'grid': grid,
+        'params': {name: np.asarray(v, dtype=float).tolist() for name, v in params.items()},
+        'n_scenarios': n_scenarios,
+        'chunk_size': chunk_size,
+        'total_years': total_years,
+        'columns': columns,
+    }
+    # as read back from disk, so a rerun with e.g. a tuple of columns matches
+    manifest = json.loads(json.dumps(manifest))
+    _write_manifest(out_dir, manifest)
+
+    n_chunks = -(-n_scenarios // chunk_size)
+    todo = [chunk for chunk in range(n_chunks) if not os.path.exists(shard_path(out_dir, chunk))]
+    if progress and len(todo) < n_chunks:
+        print(f'Resuming sweep: {n_chunks - len(todo)}/{n_chunks} chunks already done')
+
+    start_time = time.time()
+    if max_workers == 1:
+        for done, chunk in enumerate(todo, start=1):
+            _run_chunk(out_dir, chunk, *_chunk_job(manifest, chunk))
+            _report(progress, done, len(todo), start_time)
+    else:
+        # each worker gets only its chunk's parameters, not the per-scenario arrays of the whole sweep;
+        # chunks are submitted as others finish, so at most two per worker are decoded at a time
+        max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+        chunks = iter(todo)
+        done = 0
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pending = set()
+            while True:
+                for chunk in chunks:
+                    pending.add(pool.submit(_run_chunk, out_dir, chunk, *_chunk_job(manifest, chunk)))
+                    if len(pending) >= max_in_flight:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done += 1
+                    _report(progress, done, len(todo), start_time)
+    return n_scenarios
+
+def load_sweep(out_dir, columns=None):
+    """
+    Reads a finished sweep back into memory.
+
+    Returns:
+        Three dicts: the parameters of every scenario, and the real estate and stocks + rent columns
+        as (n_scenarios, total_years) arrays, all in grid order.
+    """
+    manifest = read_manifest(out_dir)
+    n_chunks = -(-manifest['n_scenarios'] // manifest['chunk_size'])
+    missing = [chunk for chunk in range(n_chunks) if not os.path.exists(shard_path(out_dir, chunk))]
+    if missing:
+        raise FileNotFoundError(f'Sweep in {out_dir} is incomplete: {len(missing)}/{n_chunks} chunks missing')
+
+    tables = {'realestate': {}, 'stocks': {}}
+    for chunk in range(n_chunks):
+        with np.load(shard_path(out_dir, chunk)) as shard:
+            for key in shard.files:
+                table, name = key.split(':', 1)
+                if columns is None or name in columns:
+                    tables[table].setdefault(name, []).append(shard[key])
+    tables = {t: {name: np.concatenate(parts) for name, parts in cols.items()} for t, cols in tables.items()}
+    params = chunk_params(manifest, 0, manifest['n_scenarios'])
+    return params, tables['realestate'], tables['stocks']
+
+def read_manifest(out_dir):
+    with open(os.path.join(out_dir, 'manifest.json')) as f:
+        return json.load(f)
+
+def shard_path(out_dir, chunk):
+    """ Path of the result shard of one chunk of a sweep """
+    return os.path.join(out_dir, f'shard_{chunk:06d}.npz')
+
+def chunk_params(manifest, start, stop):
+    """ Parameters of the scenarios start:stop of a sweep as 1-d arrays """
+    grid = manifest['grid']
+    index = np.unravel_index(np.arange(start, stop), [len(v) for v in grid.values()])
+    params = {name: np.asarray(values)[i] for (name, values), i in zip(grid.items(), index)}
+    for name, value in manifest['params'].items():
+        value = np.asarray(value)
+        params[name] = value[start:stop] if value.ndim else value
+    return params
+
+def sweep_profile(out_dir):
+    """ Merged profiling report of the chunks of a sweep run with REAL_ESTATE_PROFILE set, or None """
+    paths = sorted(f for f in os.listdir(out_dir) if f.startswith('shard_') and f.endswith('.profile.json'))
+    if not paths:
+        return None
+    reports = []
+    for path in paths:
+        with open(os.path.join(out_dir, path)) as f:
+            reports.append(json.load(f))
+    return profiling.merge_reports(reports)
+
+def _chunk_job(manifest, chunk):
+    """ Arguments of _run_chunk after out_dir and chunk: the chunk's parameters, total_years and columns """
+    start = chunk * manifest['chunk_size']
+    stop = min(start + manifest['chunk_size'], manifest['n_scenarios'])
+    return chunk_params(manifest, start, stop), manifest['total_years'], manifest['columns']
+
+def _run_chunk(out_dir, chunk, params, total_years, columns):
+    if not profiling.enabled():
+        return _compute_chunk(out_dir, chunk, params, total_years, columns)
+    with profiling.profile() as prof:
+        _compute_chunk(out_dir, chunk, params, total_years, columns)
+    profiling.write_report(prof.report(), shard_path(out_dir, chunk)[:-len('.npz')] + '.profile.json')
+    return chunk
+
+def _compute_chunk(out_dir, chunk, params, total_years, columns):
+    profiling.count('scenarios', max((np.size(v) for v in params.values()), default=1))
+    with profiling.stage('batch_performance'):
+        realestate, stocks = batch_performance(total_years=total_years, **params)
+    arrays = {
+        f'{table}:{name}': np.ascontiguousarray(values)
+        for table, cols in (('realestate', realestate), ('stocks', stocks))
+        for name, values in cols.items() if columns is None or name in columns
+    }
+    # write under a temporary name so an interrupted run never leaves a truncated shard behind
+    path = shard_path(out_dir, chunk)
+    tmp_path = path + '.tmp'
+    with profiling.stage('shard write'):
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    return chunk
+
+def _write_manifest(out_dir, manifest):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, 'manifest.json')
+    if os.path.exists(path):
+        # compared as JSON text, where NaN equals NaN
+        if json.dumps(read_manifest(out_dir), sort_keys=True) != json.dumps(manifest, sort_keys=True):
+            raise ValueError(f'{out_dir} holds a different sweep; use a new directory or delete it')
+        return
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+
+def _report(progress, done, total, start_time):
+    if progress:
+        elapsed = time.time() - start_time
+        eta = elapsed / done * (total - done)
+        print(f'{done}/{total} chunks done, {elapsed:.1f}s elapsed, ~{eta:.1f}s left', flush=True)
@@ -0,0 +1,17 @@
+import inspect
+
+import pandas as pd
+
+from real_estate.analysis import compute_performance, property_performance
+
+
+def test_property_performance_takes_the_compute_performance_parameters_in_order():
+    compute = inspect.signature(compute_performance).parameters
+    wrapper = inspect.signature(property_performance).parameters
+    assert list(wrapper)[:len(compute)] == list(compute)
+    assert all(wrapper[name].kind is inspect.Parameter.KEYWORD_ONLY for name in ('title', 'verbose', 'plot', 'cache'))
+
+    realestate, stocks, _ = property_performance(250e3, 30e3, verbose=False, plot=False)
+    expected_realestate, expected_stocks, _ = compute_performance(purchase_price=250e3, downpayment=30e3)
+    pd.testing.assert_frame_equal(realestate, expected_realestate)
+    pd.testing.assert_frame_equal(stocks, expected_stocks)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from real_estate.backtest import backtest, load_history
+from real_estate.batch import scenario_arrays, derive_scenarios
+from real_estate.constants import yearly_months
+
+
+def _history(stock_returns):
+    months = np.arange(yearly_months * len(stock_returns) + 1)
+    monthly_returns = np.repeat((1 + np.asarray(stock_returns))**(1 / yearly_months), yearly_months)
+    return {
+        'month': np.datetime64('1990-01') + months,
+        'home_price': 1.03**(months / yearly_months),
+        'rent': 1.02**(months / yearly_months),
+        'mortgage_rate': np.full(months.size, 0.05),
+        'stock_total_return': np.concatenate([[1.], np.cumprod(monthly_returns)]),
+        'wages': 1.04**(months / yearly_months),
+    }
+
+def test_negative_return_years_match_a_monthly_recursion():
+    # with 4% wage growth, a -4% year puts r = -g, the pole of the old (r + g) contribution factor
+    returns = [-0.4, -0.2, 0.15, -0.35, 0.3, -0.04, 0.1, -0.04]
+    total_years = 5
+    history = _history(returns)
+    params = dict(purchase_price=250e3, refinance_months=9)
+    months, realestate, stocks = backtest(history, total_years=total_years, **params)
+    assert np.all(np.isfinite(stocks['Stock Value']))
+
+    d = derive_scenarios(scenario_arrays({**params, 'acq_yearly_interest': 0.05, 'ref_yearly_interest': 0.05}))
+    index = history['stock_total_return']
+    for start in range(len(months)):
+        value = d['margin_stock_value'][0]
+        for month in range(yearly_months * total_years):
+            year_start = start + month // yearly_months * yearly_months
+            r = (index[year_start + yearly_months] / index[year_start])**(1 / yearly_months) - 1
+            value = value * (1 + r) + d['job_monthly_income'][0] * (1 + 0.04 / yearly_months)**month
+        np.testing.assert_allclose(stocks['Stock Value'][start, -1], value, rtol=1e-9)
+
+def test_load_history_keeps_the_longest_unbroken_run(tmp_path):
+    months = pd.date_range('2000-01-01', periods=48, freq='MS')
+    df = pd.DataFrame({'date': months, 'home_price': np.arange(48.) + 100, 'rent': 1., 'mortgage_rate': 5.,
+                       'stock_total_return': 1.})
+    df.loc[10, 'rent'] = np.nan
+    df.to_csv(tmp_path / 'market.csv', index=False)
+    history = load_history(str(tmp_path / 'market.csv'))
+    assert history['month'][0] == np.datetime64('2000-12') and len(history['month']) == 37
+    np.testing.assert_array_equal(np.diff(history['month']).astype(int), 1)
+    assert history['mortgage_rate'][0] == pytest.approx(0.05)
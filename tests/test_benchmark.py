@@ -0,0 +1,11 @@
+from real_estate.benchmark import differential_check, DEFAULT_BASELINE, GOLDEN_REALESTATE
+
+
+def test_fast_paths_match_golden_outputs():
+    assert differential_check(n=20) == []
+
+def test_benchmark_files_do_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert DEFAULT_BASELINE.endswith('baseline.json') and GOLDEN_REALESTATE.endswith('.npz')
+    with open(DEFAULT_BASELINE), open(GOLDEN_REALESTATE, 'rb'):
+        pass
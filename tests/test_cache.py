@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+
+from real_estate import cache
+from real_estate.cache import ResultCache, scenario_key
+
+
+def test_numpy_scalars_share_keys():
+    key = scenario_key('compute_performance', {'purchase_price': 250e3, 'rehab_months': 6})
+    assert scenario_key('compute_performance', {'purchase_price': np.float64(250e3), 'rehab_months': np.int64(6)}) == key
+    assert scenario_key('compute_performance', {'purchase_price': 250000, 'rehab_months': 6.}) == key
+    assert scenario_key('compute_performance', {'purchase_price': 250e3, 'rehab_months': 7}) != key
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    results = ResultCache(tmp_path, max_bytes=2500)
+    def get(name):
+        return results.get_or_compute('test', {'name': name}, lambda: name.encode() * 1000)
+    get('a'), get('b')
+    for t, name in enumerate('ab'):
+        os.utime(results._path(scenario_key('test', {'name': name})), (t, t))
+    assert get('a') == b'a' * 1000
+    get('c')
+    stats = results.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (1, 3, 1, 2)
+    assert stats['bytes'] <= 0.9 * 2500
+    get('a'), get('c'), get('b')
+    assert (results.hits, results.misses) == (3, 4)
+
+def test_model_changes_invalidate_entries(tmp_path, monkeypatch):
+    results = ResultCache(tmp_path)
+    monkeypatch.setattr(cache, '_model_version', 'old')
+    results.get_or_compute('test', {}, lambda: 'old result')
+    assert results.get_or_compute('test', {}, lambda: 'unused') == 'old result'
+    monkeypatch.setattr(cache, '_model_version', 'new')
+    assert results.get_or_compute('test', {}, lambda: 'new result') == 'new result'
+    assert (results.hits, results.misses) == (1, 2)
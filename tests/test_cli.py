@@ -0,0 +1,50 @@
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from real_estate import cli
+
+
+def test_later_batches_keep_first_schema(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    writer = cli.ResultWriter(path, 'csv')
+    writer.write(pd.DataFrame({'id': [1, 2], 'note': ['a', 'b'], 'Equity': [1.5, 2.5]}))
+    writer.write(pd.DataFrame({'Equity': [3.5], 'id': [3.0]}))
+    with pytest.raises(ValueError, match="'id'"):
+        writer.write(pd.DataFrame({'id': [np.nan], 'note': ['c'], 'Equity': [4.5]}))
+    with pytest.raises(ValueError, match='first batch'):
+        writer.write(pd.DataFrame({'id': [4], 'note': ['d'], 'Equity': [5.5], 'extra': [0]}))
+    writer.close()
+    df = pd.read_csv(path)
+    assert list(df.columns) == ['id', 'note', 'Equity']
+    assert df['id'].tolist() == [1, 2, 3] and df['note'].isna().tolist() == [False, False, True]
+
+@pytest.mark.skipif(importlib.util.find_spec('pyarrow') is not None, reason='pyarrow is installed')
+def test_missing_pyarrow_is_a_usage_error(tmp_path, capsys):
+    (tmp_path / 'in.csv').write_text('purchase_price\n250000\n')
+    with pytest.raises(SystemExit) as exit:
+        cli.main([str(tmp_path / 'in.csv'), '-o', str(tmp_path / 'out.parquet')])
+    assert exit.value.code == 2
+    assert 'pip install pyarrow' in capsys.readouterr().err
+
+def test_unknown_metric_is_a_usage_error(tmp_path, capsys):
+    (tmp_path / 'in.csv').write_text('purchase_price\n250000\n')
+    with pytest.raises(SystemExit) as exit:
+        cli.main([str(tmp_path / 'in.csv'), '--metrics', 'Equity,Stock Value'])
+    assert exit.value.code == 2
+    assert "['Stock Value']" in capsys.readouterr().err
+
+def test_model_errors_are_not_usage_errors(tmp_path, monkeypatch):
+    (tmp_path / 'in.csv').write_text('purchase_price\n250000\n')
+    batch_performance = cli.batch_performance
+    def failing_batch_performance(total_years=30, **params):
+        if total_years > 1:
+            raise ValueError('model failure')
+        return batch_performance(total_years=total_years, **params)
+    monkeypatch.setattr(cli, 'batch_performance', failing_batch_performance)
+    with pytest.raises(ValueError, match='model failure'):
+        cli.main([str(tmp_path / 'in.csv'), '-o', str(tmp_path / 'out.csv')])
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path / 'missing.csv')])
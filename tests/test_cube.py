@@ -0,0 +1,24 @@
+import numpy as np
+
+from real_estate.cube import ResultCube, cube_from_sweep
+from real_estate.sweep import run_sweep, load_sweep
+
+
+def test_cube_from_sweep_matches_load_sweep(tmp_path):
+    grid = {'purchase_price': [150e3, 200e3, 250e3], 'downpayment': [20e3, 40e3, 60e3]}
+    run_sweep(tmp_path / 'sweep', grid, chunk_size=4, max_workers=1, total_years=5, progress=False, vacancy_frac=0.05)
+    params, realestate, stocks = load_sweep(tmp_path / 'sweep')
+    cube_from_sweep(tmp_path / 'sweep', tmp_path / 'cube')
+    cube = ResultCube(tmp_path / 'cube')
+    assert len(cube) == 9 and cube.total_years == 5
+
+    rich = cube.where(downpayment=(None, 50e3), purchase_price=lambda v: v > 150e3)
+    expected = np.flatnonzero((params['downpayment'] < 50e3) & (params['purchase_price'] > 150e3))
+    np.testing.assert_array_equal(rich, expected)
+    np.testing.assert_array_equal(cube.where(purchase_price=200e3), np.flatnonzero(params['purchase_price'] == 200e3))
+    np.testing.assert_array_equal(cube.param('vacancy_frac'), np.full(9, 0.05))
+
+    np.testing.assert_array_equal(cube.get('Equity', year=3, scenarios=rich), realestate['Equity'][rich, 3])
+    np.testing.assert_array_equal(cube.get('Equity', year=[0, 4], scenarios=rich), realestate['Equity'][rich][:, [0, 4]])
+    np.testing.assert_array_equal(cube.get('stocks:Stock Value'), stocks['Stock Value'])
+    np.testing.assert_array_equal(cube.data[:, :, cube.metrics.index('realestate:Equity')], realestate['Equity'])
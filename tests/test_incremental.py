@@ -0,0 +1,36 @@
+import numpy as np
+
+from real_estate.analysis import compute_performance
+from real_estate.incremental import Scenario
+
+
+def test_rent_update_keeps_loans():
+    s = Scenario(purchase_price=250e3)
+    s.performance()
+    refi_mort = s['refi_mort']
+    s.update(monthly_rent_income=3.3e3)
+    realestate_df, stocks_df, models = s.performance()
+    assert s['refi_mort'] is refi_mort and models['refi'].mort is refi_mort
+    assert s.computed['refi_mort'] == 1 and s.computed['acq'] == 1 and s.computed['refi'] == 2
+
+    expected_realestate, expected_stocks, _ = compute_performance(purchase_price=250e3, monthly_rent_income=3.3e3)
+    np.testing.assert_allclose(realestate_df.to_numpy(float), expected_realestate.to_numpy(float))
+    np.testing.assert_allclose(stocks_df.to_numpy(float), expected_stocks.to_numpy(float))
+
+def test_updates_of_every_parameter_match_compute_performance():
+    s = Scenario()
+    s.performance()
+    params = dict(s.params)
+    for name, value in s.params.copy().items():
+        params[name] = value + 1 if name in ('rehab_months', 'refinance_months', 'mortgage_years') else value * 1.1
+        s.update(**{name: params[name]})
+        realestate_df, stocks_df, _ = s.performance()
+        expected_realestate, expected_stocks, _ = compute_performance(**params)
+        np.testing.assert_allclose(realestate_df.to_numpy(float), expected_realestate.to_numpy(float), err_msg=name)
+        np.testing.assert_allclose(stocks_df.to_numpy(float), expected_stocks.to_numpy(float), err_msg=name)
+
+def test_array_updates_compare_by_value():
+    s = Scenario()
+    s.update(monthly_rent_income=np.array([3e3, 3.2e3]))
+    s.update(monthly_rent_income=np.array([3e3, 3.2e3]))
+    assert s.version['monthly_rent_income'] == 1
@@ -0,0 +1,30 @@
+import numpy as np
+
+from real_estate.batch import batch_performance, derive_scenarios, scenario_arrays
+from real_estate.leverage import margin_call_risk, stocks_with_margin_risk, RISK_COLUMNS
+
+
+def test_drawdown_sells_down_to_the_liquidation_margin():
+    # no contributions and a steady 4% monthly fall: every path is called in the same month
+    d = derive_scenarios(scenario_arrays({}))
+    params = dict(stock_value_appreciation=-0.48, volatility=0., monthly_rent_expense=d['monthly_required'][0])
+    risk = margin_call_risk(n_paths=4, maintenance_margin=0.25, liquidation_margin=0.4, total_months=24, monthly=True, **params)
+    called = np.flatnonzero(risk['Margin Call Probability'])
+    assert called.size and risk['Margin Call Probability'][called[0]] == 1
+    assert risk['Cumulative Margin Call Probability'][called[0] - 1] == 0
+    np.testing.assert_allclose(risk['Equity'][called] / risk['Stock Value'][called], 0.4)
+    assert np.all(risk['Forced Sales'][called] > 0) and risk['Wipeout Probability'][-1] == 0
+
+def test_zero_leverage_is_the_unlevered_stock_value():
+    params = dict(margin_multiplier=1., yearly_pay_appreciation=0.)
+    risk = margin_call_risk(n_paths=2, volatility=0., total_months=120, **params)
+    _, stocks = batch_performance(total_years=10, **params)
+    np.testing.assert_allclose(risk['Stock Value'], stocks['Stock Value'][0], rtol=1e-9)
+    assert not risk['Loan Balance'].any() and not risk['Cumulative Margin Call Probability'].any()
+
+def test_risk_columns_sit_next_to_the_stocks_table():
+    columns = stocks_with_margin_risk(total_years=5, n_paths=100, purchase_price=250e3)
+    _, stocks = batch_performance(total_years=5, purchase_price=250e3)
+    for name, values in stocks.items():
+        np.testing.assert_array_equal(columns[name], values[0])
+    assert all(columns[name].shape == (5,) for name in RISK_COLUMNS + ['Simulated Equity'])
@@ -0,0 +1,63 @@
+import numpy as np
+
+from real_estate.loans import LoanTerms, SCHEDULE_COLUMNS, arm_rates, _level_payment
+from real_estate.mortgage import Mortgage
+
+
+def test_stepped_matches_closed_form():
+    rates = np.array([0.03, 0.045, 0.06, 0.09])
+    terms = np.array([360, 180, 360, 240])
+    amounts = np.array([150e3, 250e3, 200e3, 400e3])
+    closed = LoanTerms(rates, term_months=terms).amortize(amounts)
+    # a recast in the first month re-levels to the same payment, but sends every loan through _step
+    stepped = LoanTerms(rates, term_months=terms, recast_months=[0]).amortize(amounts)
+    for name in SCHEDULE_COLUMNS:
+        np.testing.assert_allclose(stepped[name], closed[name], rtol=1e-9, atol=1e-6, err_msg=name)
+    np.testing.assert_array_equal(stepped['Active'], closed['Active'])
+    np.testing.assert_array_equal(closed['Active'].sum(axis=1), terms)
+
+    mortgage = Mortgage(0.06, 200e3)
+    np.testing.assert_allclose(closed['Remaining Balance'][2], mortgage.monthly_df['Remaining Balance'], rtol=1e-9, atol=1e-6)
+
+def test_extra_principal_shortens_the_loan():
+    plain = LoanTerms(0.06).amortize(200e3)
+    extra = LoanTerms(0.06, extra_principal=200.).amortize(200e3)
+    np.testing.assert_allclose(extra['Payment'][0, 0], plain['Payment'][0, 0] + 200.)
+    assert extra['Active'].sum() < plain['Active'].sum()
+    np.testing.assert_allclose((extra['Principal'] + extra['Extra Principal']).sum(), 200e3)
+
+def _month_by_month(amount, yearly_interest, term, io, extra, recast):
+    """ Reference amortization advancing every loan one month at a time """
+    n, total_months = yearly_interest.shape
+    cols = {name: np.zeros((n, total_months)) for name in SCHEDULE_COLUMNS}
+    balance, payment = amount.astype(float), np.zeros(n)
+    for month in range(total_months):
+        rate = yearly_interest[:, month] / 12
+        interest = balance * rate
+        interest_only = month < io
+        relevel = recast[:, month] | (month == io) | (rate != yearly_interest[:, month - 1] / 12) if month else np.ones(n, dtype=bool)
+        relevel &= ~interest_only
+        payment[relevel] = _level_payment(balance[relevel], rate[relevel], np.maximum(term[relevel] - month, 1))
+        principal = np.where(interest_only, 0., np.minimum(payment - interest, balance))
+        principal = np.where(term == month + 1, balance, principal)
+        prepaid = np.minimum(extra[:, month], balance - principal)
+        balance = balance - principal - prepaid
+        for name, values in zip(SCHEDULE_COLUMNS, (interest + principal + prepaid, principal, prepaid, interest, balance)):
+            cols[name][:, month] = values
+    return cols
+
+def test_segments_match_month_by_month_amortization():
+    rates = np.vstack([arm_rates([0.055, 0.04], index_rates=np.linspace(0.03, 0.07, 360), margin=0.0275),
+                       np.full((2, 360), 0.065), np.zeros((1, 360))])
+    extra = np.zeros((5, 360))
+    extra[2, 24:] = 500.
+    extra[4] = 100.
+    recast = np.zeros((5, 360), dtype=bool)
+    recast[2, 120] = True
+    terms = LoanTerms(rates, term_months=[360, 300, 360, 240, 180], io_months=[0, 60, 0, 120, 0],
+                      extra_principal=extra, recast_months=recast)
+    amounts = np.array([250e3, 400e3, 300e3, 200e3, 50e3])
+    schedule = terms.amortize(amounts)
+    expected = _month_by_month(amounts, rates, terms.term_months, terms.io_months, extra, recast)
+    for name in SCHEDULE_COLUMNS:
+        np.testing.assert_allclose(schedule[name], expected[name], rtol=1e-9, atol=1e-6, err_msg=name)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from real_estate.aggregate import contribution_factor
+from real_estate.batch import scenario_arrays, batch_performance
+from real_estate.montecarlo import simulate, simulate_paths, draw_rates, DRIVERS
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@pytest.mark.parametrize('rate, g', [(0.1 / 12, 0.05 / 12), (-0.05 / 12, 0.05 / 12), (0.004, 0.004),
+                                     (0.004, 0.004 + 1e-12), (-0.3 / 12, 0.02 / 12), (0., 0.)])
+def test_contribution_factor_is_the_pole_free_sum(rate, g):
+    for months in (1, 12, 360):
+        expected = sum((1 + rate)**(months - 1 - k) * (1 + g)**k for k in range(months))
+        assert contribution_factor(rate, g, months) == pytest.approx(expected, rel=1e-12)
+
+def test_constant_rates_match_batch_performance():
+    p = scenario_arrays({})
+    realestate, stocks = simulate_paths(p, {d: np.full((1, 30), p[d][0]) for d in DRIVERS})
+    expected_realestate, expected_stocks = batch_performance()
+    for name in expected_stocks:
+        np.testing.assert_allclose(stocks[name], expected_stocks[name], rtol=1e-9)
+    np.testing.assert_allclose(realestate['Equity'], expected_realestate['Equity'], rtol=1e-9)
+
+def test_percentiles_match_numpy_on_the_same_draws():
+    n_paths, seed, chunk_size, bins = 20_000, 1, 8_000, 4096
+    out = simulate(n_paths, seed, PERCENTILES, chunk_size=chunk_size, bins=bins)
+    p = scenario_arrays({})
+    paths = [simulate_paths(p, rates) for rates in draw_rates(p, n_paths, seed, chunk_size=chunk_size)]
+    for strategy, table in (('realestate', 0), ('stocks', 1)):
+        for metric, summary in out[strategy].items():
+            x = np.concatenate([chunk[table][metric] for chunk in paths])
+            expected = np.nanpercentile(x, PERCENTILES, axis=0)
+            # the histograms only span the requested percentiles, however far out the tails are
+            tolerance = (expected[-1] - expected[0]) / bins + 1e-9 * np.abs(expected)
+            assert np.all(np.abs(summary['bands'] - expected) <= tolerance), (strategy, metric)
+            np.testing.assert_allclose(summary['mean'], np.nanmean(x, axis=0), rtol=1e-9)
+
+def test_outlier_does_not_widen_the_bins():
+    from real_estate.montecarlo import StreamingQuantiles
+    x = np.concatenate([np.linspace(0, 1, 10_001), [1e12, -1e12]])[:, None]
+    sketch = StreamingQuantiles([0.], [1.], bins=1000)
+    sketch.update(x)
+    np.testing.assert_allclose(sketch.quantiles([0.25, 0.5, 0.75])[:, 0], np.percentile(x, [25, 50, 75]), atol=2e-3)
@@ -0,0 +1,52 @@
+import numpy as np
+
+from real_estate.batch import batch_performance, derive_scenarios, scenario_arrays
+from real_estate.monthly import monthly_performance, downsample
+from real_estate.mortgage import balance_after
+
+PARAMS = dict(purchase_price=np.array([150e3, 200e3, 300e3]), yearly_pay_appreciation=np.array([0., 0.05, 0.1]))
+# monthly stocks + rent columns and their yearly counterparts
+STOCK_COLUMNS = {'Total Income': 'Total Annual Income', 'Operating Expenses': 'Operating Expenses',
+                 'Rent Payment': 'Rent Payment', 'Total Expenses': 'Total Annual Expenses',
+                 'Total Cashflow': 'Total Annual Cashflow', 'Stock Value': 'Stock Value',
+                 'Loan Balance': 'Loan Balance', 'Equity': 'Equity'}
+
+
+def test_downsampled_stocks_match_batch_performance():
+    _, monthly = monthly_performance(total_months=120, **PARAMS)
+    _, yearly = batch_performance(total_years=10, **PARAMS)
+    d = derive_scenarios(scenario_arrays(PARAMS))
+    years = downsample(monthly, initial_investment=d['cash_required'])
+    for name, yearly_name in STOCK_COLUMNS.items():
+        np.testing.assert_allclose(years[name], yearly[yearly_name], rtol=1e-9, err_msg=name)
+    for name in ('Equity Gain', 'Annual Profit', 'Return on Initial Investment'):
+        np.testing.assert_allclose(years[name], yearly[name], rtol=1e-9, atol=1e-6, err_msg=name)
+
+def test_documented_differences_from_the_yearly_model():
+    realestate, _ = monthly_performance(total_months=24, **PARAMS)
+    yearly, _ = batch_performance(total_years=2, **PARAMS)
+    p = scenario_arrays(PARAMS)
+    d = derive_scenarios(p)
+    col = lambda x: x[:, None]
+    cashflow = realestate['Total Cashflow']
+    # rehab months carry the owning expenses (PMI included), the P&I and the rehab cost, with no rent
+    np.testing.assert_allclose(cashflow[:, :6], -col(d['owning_expenses'] + d['acq_PI'] + p['rehab_cost'] / p['rehab_months']) * np.ones(6))
+    # then the pre-refinance cashflow; after the refinance the PMI of the acquisition loan is gone
+    np.testing.assert_allclose(cashflow[:, 6:9], col(d['pre_refi_cashflow']) * np.ones(3))
+    np.testing.assert_allclose(cashflow[:, 9:12], col(d['refi_cashflow'] + d['monthly_PMI']) * np.ones(3))
+
+    years = downsample(realestate)
+    # income and loan payments agree with YearlySummary; operating expenses are booked by phase instead
+    np.testing.assert_allclose(years['Total Income'], yearly['Total Annual Income'])
+    np.testing.assert_allclose(years['Mortgage Payment'], yearly['Mortgage Payment'])
+    # the value is the level at the end of the year, where year 0 of the yearly table weighs both phases by month
+    np.testing.assert_allclose(years['Property Value'][:, 0], p['after_repair_value'])
+    np.testing.assert_allclose(yearly['Property Value'][:, 0], (p['purchase_price'] + p['rehab_cost']) * 9 / 12
+                               + p['after_repair_value'] * 3 / 12)
+    np.testing.assert_allclose(years['Property Value'][:, 1:], yearly['Property Value'][:, 1:])
+    assert not np.allclose(years['Operating Expenses'], yearly['Operating Expenses'])
+    # the balance is the refinance loan's after month 9, where the yearly table keeps the acquisition loan's
+    refi_balance = balance_after(p['ref_yearly_interest'], d['refi_mortgage'], d['refi_PI'], 12 - 9)
+    np.testing.assert_allclose(years['Loan Balance'][:, 0], refi_balance)
+    acq_balance = balance_after(p['acq_yearly_interest'], d['acq_mortgage'], d['acq_PI'], 12)
+    np.testing.assert_allclose(yearly['Loan Balance'][:, 0], acq_balance)
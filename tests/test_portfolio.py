@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from real_estate.batch import scenario_arrays, derive_scenarios
+from real_estate.portfolio import Portfolio
+from real_estate.monthly import monthly_performance
+
+
+def test_repeat_buys_as_cash_allows():
+    params = dict(after_repair_value=260e3)
+    d = derive_scenarios(scenario_arrays(params))
+    cash_required, cash_out = d['cash_required'][0], d['refi_cash_out'][0]
+    assert 0 < cash_out < cash_required
+    portfolio = Portfolio(total_months=120).repeat(2.5 * cash_required, **params)
+    # the two first copies are bought at once, then every purchase is funded by earlier cash-outs
+    assert list(portfolio.start_month[:2]) == [0, 0]
+    assert np.all(np.diff(portfolio.start_month) >= 0)
+    spent = len(portfolio) * cash_required
+    received = cash_out * np.sum(portfolio.start_month + 9 < 120)
+    assert spent <= 2.5 * cash_required + received
+
+def test_repeat_stops_at_max_doors():
+    # the cash-out of each door covers more than a new one: exponential growth
+    with pytest.raises(ValueError, match='max_doors'):
+        Portfolio(total_months=360).repeat(100e3, after_repair_value=400e3)
+    portfolio = Portfolio(total_months=24).repeat(100e3, after_repair_value=400e3, max_doors=1_000_000)
+    assert 0 < len(portfolio) <= 1_000_000
+
+def test_repeat_takes_one_property():
+    with pytest.raises(ValueError, match='after_repair_value'):
+        Portfolio().repeat(100e3, after_repair_value=[260e3, 300e3])
+
+def test_evaluate_sums_monthly_performance():
+    portfolio = Portfolio(total_months=60).add([0, 12], purchase_price=[200e3, 250e3])
+    realestate, _ = monthly_performance(total_months=60, purchase_price=np.array([200e3, 250e3]))
+    out = portfolio.evaluate()
+    np.testing.assert_allclose(out['Equity'][12:], realestate['Equity'][0, 12:] + realestate['Equity'][1, :48])
+    np.testing.assert_array_equal(out['Doors'][[0, 11, 12]], [1, 1, 2])
@@ -0,0 +1,28 @@
+import numpy as np
+
+from real_estate import profiling
+
+
+def test_nested_stage_keeps_the_outer_peak():
+    with profiling.profile() as prof:
+        with profiling.stage('outer'):
+            big = np.ones(4_000_000)  # 32 MB
+            del big
+            with profiling.stage('inner'):
+                small = np.ones(100_000)
+                del small
+    stages = prof.report()['stages']
+    assert stages['outer']['peak_mb'] >= 32
+    assert stages['inner']['peak_mb'] < 2
+
+def test_sibling_stages_fold_into_the_parent():
+    with profiling.profile() as prof:
+        with profiling.stage('outer'):
+            with profiling.stage('first'):
+                big = np.ones(4_000_000)
+                del big
+            with profiling.stage('second'):
+                pass
+    stages = prof.report()['stages']
+    assert stages['outer']['peak_mb'] >= 32
+    assert stages['second']['peak_mb'] < 1
@@ -0,0 +1,32 @@
+import numpy as np
+
+from real_estate.returns import irr, npv
+
+# stocks + rent streams of benchmark.random_scenarios on which undamped Newton steps used to cycle
+STALLING_STREAMS = np.array([
+    [
+        -132088.95, -28972.54, -29929.25, -30919.04, -31943.11, -33002.72, -34099.18, -35233.85, -36408.14,
+        -37623.51, -38881.50, -40183.68, -41531.71, -42927.30, -44372.23, -45868.36, -47417.61, -49022.00, -50683.60,
+        -52404.58, -54187.21, -56033.84, -57946.91, -59928.96, -61982.65, -64110.73, -66316.07, -68601.66, -70970.62,
+        -73426.18, 2512949.59,
+    ],
+    [
+        -92893.77, -26249.06, -27069.60, -27916.40, -28790.34, -29692.32, -30623.26, -31584.13, -32575.93, -33599.70,
+        -34656.49, -35747.43, -36873.64, -38036.33, -39236.71, -40476.06, -41755.70, -43076.99, -44441.34, -45850.21,
+        -47305.12, -48807.65, -50359.40, -51962.08, -53617.42, -55327.24, -57093.41, -58917.87, -60802.64, -62749.80,
+        2195042.04,
+    ],
+])
+
+
+def test_irr_converges_where_newton_stalls():
+    rates = irr(STALLING_STREAMS)
+    assert np.all(np.isfinite(rates))
+    # npv changes sign within a hair of the rate
+    step = 1e-9 * (1 + np.abs(rates))
+    assert np.all(npv(rates - step, STALLING_STREAMS) * npv(rates + step, STALLING_STREAMS) <= 0)
+
+def test_irr_is_nan_when_not_converged():
+    assert np.all(np.isnan(irr(STALLING_STREAMS, max_iter=3)))
+    assert np.isnan(irr([-100., -10., -5.]))
+    np.testing.assert_allclose(irr([-100., 0., 121.]), 0.1)
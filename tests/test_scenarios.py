@@ -0,0 +1,18 @@
+import numpy as np
+
+from real_estate.analysis import compute_performance
+from real_estate.scenarios import ScenarioBatch, PHASES
+
+
+def test_batch_matches_metadata_objects():
+    purchase_price = np.array([150e3, 250e3, 400e3])
+    batch = ScenarioBatch(purchase_price=purchase_price, yearly_taxes=np.array([0., 3e3, 0.]), rehab_months=5)
+    for i, view in enumerate(batch):
+        _, _, models = compute_performance(purchase_price=purchase_price[i], yearly_taxes=[0., 3e3, 0.][i], rehab_months=5)
+        for name in PHASES:
+            for table in ('time', 'price', 'exponent'):
+                expected = getattr(models[name], table)
+                row = getattr(view[name], table)
+                assert set(row) == set(expected), (name, table)
+                np.testing.assert_allclose([row[k] for k in expected], list(expected.values()), rtol=1e-12, err_msg=name)
+        assert str(view.refi).splitlines()[0] == str(models['refi']).splitlines()[0]
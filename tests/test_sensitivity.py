@@ -0,0 +1,27 @@
+import numpy as np
+
+from real_estate.batch import batch_performance
+from real_estate.sensitivity import tornado, sobol_indices, UNUSED_PARAMETERS
+
+
+def test_sobol_indices_of_an_additive_metric():
+    # year 0 'Property Value' is linear in these three parameters, so S1 = ST = c_i^2 var_i / sum_j c_j^2 var_j
+    bounds = {'purchase_price': (1e5, 2e5), 'rehab_cost': (0., 5e4), 'after_repair_value': (1.5e5, 3.5e5)}
+    base, _ = batch_performance(total_years=1)
+    share = {}
+    for name, (low, high) in bounds.items():
+        moved, _ = batch_performance(total_years=1, **{name: low + 1.})
+        slope = moved['Property Value'][0, 0] - batch_performance(total_years=1, **{name: low})[0]['Property Value'][0, 0]
+        share[name] = slope**2 * (high - low)**2 / 12
+    expected = np.array([share[name] for name in bounds]) / sum(share.values())
+
+    indices = sobol_indices(bounds, metric='Property Value', year=0, n_samples=8192, n_bootstrap=0).loc[list(bounds)]
+    np.testing.assert_allclose(indices['S1'], expected, atol=0.03)
+    np.testing.assert_allclose(indices['ST'], expected, atol=0.03)
+
+def test_only_month_parameters_are_rounded():
+    df = tornado(yearly_taxes=2145, rehab_months=6, refinance_months=9)
+    assert df.loc['yearly_taxes', 'low_value'] == 2145 - 214.5
+    assert df.loc['renter_monthly_opex', 'high_value'] == 55.
+    assert (df.loc['rehab_months', 'low_value'], df.loc['rehab_months', 'high_value']) == (5, 7)
+    assert not set(UNUSED_PARAMETERS) & set(df.index)
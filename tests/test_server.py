@@ -0,0 +1,60 @@
+import json
+import asyncio
+
+import numpy as np
+
+from real_estate import server
+from real_estate.batch import batch_performance
+
+
+async def _post(port, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode()
+    writer.write(f'POST /evaluate HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), payload
+
+def _strict_json(payload):
+    def reject(constant):
+        raise ValueError(f'{constant} is not valid JSON')
+    return json.loads(payload, parse_constant=reject)
+
+def _serve(requests, **kwargs):
+    async def run():
+        service = server.ScenarioService(max_delay=0.05, **kwargs)
+        listener = await service.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.gather(*(_post(port, body) for body in requests))
+        finally:
+            listener.close()
+            service._batcher.cancel()
+    return asyncio.run(run())
+
+def test_round_trip_with_non_finite_values():
+    (status, payload), (list_status, list_payload), (bad_status, _) = _serve(
+        [{'rehab_months': 0}, [{'purchase_price': 200e3}, {}], {'not_a_parameter': 1}])
+    assert status == 200 and list_status == 200 and bad_status == 400
+    # zero rehab months divide the rehab cost by zero
+    result = _strict_json(payload)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        realestate, _ = batch_performance(rehab_months=0)
+    for name, values in result['realestate'].items():
+        expected = realestate[name][0]
+        assert [v is None for v in values] == list(~np.isfinite(expected)), name
+        np.testing.assert_allclose([v for v in values if v is not None], expected[np.isfinite(expected)])
+    assert result['realestate']['Total Annual Cashflow'][0] is None
+    assert len(_strict_json(list_payload)) == 2
+
+def test_failing_scenario_does_not_fail_its_batch(monkeypatch):
+    def failing(**params):
+        if np.any(params['purchase_price'] == 13.):
+            raise RuntimeError('boom')
+        return batch_performance(**params)
+    monkeypatch.setattr(server, 'batch_performance', failing)
+    (good, payload), (bad, error) = _serve([{'purchase_price': 250e3}, {'purchase_price': 13.}])
+    assert good == 200 and 'realestate' in _strict_json(payload)
+    assert bad == 500 and 'boom' in _strict_json(error)['error']
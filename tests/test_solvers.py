@@ -0,0 +1,47 @@
+import numpy as np
+
+from real_estate.batch import batch_performance, derive_scenarios, scenario_arrays
+from real_estate.metadata import refinance_mortgage
+from real_estate.solvers import best_refinance, break_even_rent, max_purchase_price, min_after_repair_value
+
+PARAMS = dict(purchase_price=200e3, after_repair_value=260e3)
+
+
+def test_higher_loan_to_value_can_win():
+    # same rate, more cash out: leverage raises the IRR although the equity left in the house falls
+    kwargs = dict(candidate_months=[12, 12, 12], refi_loan_fracs=[0.5, 0.65, 0.8], refi_rates=[0.04] * 3, year=9, **PARAMS)
+    irr = best_refinance(objective='IRR', **kwargs)
+    assert np.all(np.diff(irr['values']) > 0) and irr['refi_loan_frac'][0] == 0.8
+    equity = best_refinance(objective='Equity', **kwargs)
+    assert np.all(np.diff(equity['values']) < 0) and equity['refi_loan_frac'][0] == 0.5
+
+def test_equity_and_cash_out_follow_the_refinance_loan():
+    refi = best_refinance(candidate_months=[12], refi_loan_fracs=[0.8], refi_rates=[0.04], objective='Equity', year=9, **PARAMS)
+    realestate, _ = batch_performance(refinance_months=12, refi_loan_frac=0.8, ref_yearly_interest=0.04, **PARAMS)
+    loan = refinance_mortgage(0.04, PARAMS['after_repair_value'], 0.8)
+    np.testing.assert_allclose(refi['objective'], realestate['Property Value'][:, 9] - loan.balance_at(120 - 12))
+
+    total = best_refinance(candidate_months=[12], refi_loan_fracs=[0.8], refi_rates=[0.04], objective='Total Cashflow', year=9, **PARAMS)
+    cash_out = loan.loan_amount - loan.loan_fees - realestate['Loan Balance'][:, 0]
+    np.testing.assert_allclose(total['objective'], realestate['Total Annual Cashflow'][:, :10].sum() + cash_out)
+
+def test_break_even_rent_zeroes_the_cashflow():
+    purchase_price = np.array([150e3, 250e3, 400e3])
+    rent = break_even_rent(year=2, purchase_price=purchase_price)
+    realestate, _ = batch_performance(total_years=3, purchase_price=purchase_price, monthly_rent_income=rent)
+    np.testing.assert_allclose(realestate['Total Annual Cashflow'][:, 2], 0., atol=1e-6)
+
+def test_max_purchase_price_equates_the_strategies():
+    value_appreciation = np.array([0.03, 0.06])
+    price = max_purchase_price(year=10, value_appreciation=value_appreciation)
+    assert np.all(np.isfinite(price))
+    realestate, stocks = batch_performance(total_years=11, purchase_price=price, value_appreciation=value_appreciation)
+    # within the bisection tolerance of one dollar of price
+    np.testing.assert_allclose(realestate['Equity'][:, 10], stocks['Equity'][:, 10], atol=5.)
+    assert np.isnan(max_purchase_price(year=10, lo=1e6, hi=2e6))
+
+def test_min_after_repair_value_returns_the_cash_required():
+    params = dict(purchase_price=np.array([150e3, 250e3]), refi_loan_frac=np.array([0.7, 0.8]))
+    arv = min_after_repair_value(**params)
+    d = derive_scenarios(scenario_arrays({**params, 'after_repair_value': arv}))
+    np.testing.assert_allclose(d['refi_cash_out'], d['cash_required'])
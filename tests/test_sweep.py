@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from real_estate.sweep import run_sweep, load_sweep
+from real_estate.batch import batch_performance
+
+
+def test_resume_with_equivalent_arguments(tmp_path):
+    grid = {'purchase_price': [150e3, 200e3, 250e3], 'downpayment': [20e3, 40e3]}
+    kwargs = dict(chunk_size=4, max_workers=1, total_years=5, progress=False, vacancy_frac=np.nan)
+    run_sweep(tmp_path, grid, columns=['Equity'], **kwargs)
+    (tmp_path / 'shard_000001.npz').unlink()
+    # a tuple of columns and a NaN parameter describe the same sweep as the manifest on disk
+    assert run_sweep(tmp_path, grid, columns=('Equity',), **kwargs) == 6
+    params, realestate, _ = load_sweep(tmp_path)
+    assert realestate['Equity'].shape == (6, 5)
+
+def test_resume_rejects_a_different_sweep(tmp_path):
+    grid = {'purchase_price': [150e3, 200e3]}
+    run_sweep(tmp_path, grid, max_workers=1, total_years=5, progress=False)
+    with pytest.raises(ValueError, match='different sweep'):
+        run_sweep(tmp_path, grid, max_workers=1, total_years=6, progress=False)
+
+def test_chunks_match_batch_performance(tmp_path):
+    grid = {'purchase_price': [150e3, 200e3, 250e3], 'value_appreciation': [0.02, 0.06]}
+    rent = np.linspace(2000, 3000, 6)
+    run_sweep(tmp_path, grid, chunk_size=4, max_workers=2, total_years=5, progress=False, monthly_rent_income=rent)
+    params, realestate, stocks = load_sweep(tmp_path)
+    expected, _ = batch_performance(total_years=5, **params)
+    np.testing.assert_array_equal(params['monthly_rent_income'], rent)
+    np.testing.assert_allclose(realestate['Total Annual Cashflow'], expected['Total Annual Cashflow'])
+
+def test_chunks_are_decoded_as_workers_free_up(tmp_path, monkeypatch):
+    from real_estate import sweep
+    decoded, finished = [], []
+    chunk_job, report = sweep._chunk_job, sweep._report
+    def counting_chunk_job(manifest, chunk):
+        decoded.append(len(decoded) - len(finished))
+        return chunk_job(manifest, chunk)
+    def counting_report(progress, done, total, start_time):
+        finished.append(done)
+        return report(progress, done, total, start_time)
+    monkeypatch.setattr(sweep, '_chunk_job', counting_chunk_job)
+    monkeypatch.setattr(sweep, '_report', counting_report)
+    run_sweep(tmp_path, {'purchase_price': np.linspace(1e5, 5e5, 40)}, chunk_size=2, max_workers=2, total_years=2,
+              progress=False)
+    assert len(decoded) == len(finished) == 20
+    # chunks decoded but not yet finished never exceed two per worker
+    assert max(decoded) < 4